@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de statements preparados (PREPARE/EXECUTE)
+
+Executa cada statement de STATEMENTS_PREPARADOS (core/database.py) N vezes
+na mesma conexão, primeiro como SQL direto (parse + planejamento a cada
+execução) e depois pelo nome, e compara a latência por query.
+
+O registrar_envio roda dentro de uma transação desfeita no final; nenhum
+dado é gravado. Precisa de ao menos um cliente e um template no banco.
+
+Uso:
+    python backend/benchmarks/bench_prepared.py --repeticoes 2000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+import psycopg2
+
+from core.config import POSTGRES_CONNECTION_STRING
+from core.database import STATEMENTS_PREPARADOS, sql_execute, sql_prepare
+
+
+def parametros(cursor) -> Dict[str, Tuple]:
+    cursor.execute('SELECT id FROM clientes ORDER BY id LIMIT 1')
+    cliente = cursor.fetchone()
+    cursor.execute('SELECT nome FROM message_templates ORDER BY id LIMIT 1')
+    template = cursor.fetchone()
+    if not cliente or not template:
+        sys.exit('[ERRO] O banco precisa de ao menos um cliente e um template')
+
+    cliente_id, nome_template = cliente[0], template[0]
+    return {
+        'cliente_por_id': (cliente_id,),
+        'template_por_nome': (nome_template,),
+        'registrar_envio': (cliente_id, 'financeira', 'bench', 'Mensagem de benchmark', None, None,
+                            'erro', 1, 'bench', None, None, None, None, None),
+        'historico_cliente': (cliente_id, 50),
+        'estatisticas_envios': (30,),
+        'dashboard_periodo_total': (1, 2026),
+        'dashboard_periodo_por_tipo': (1, 2026),
+        'dashboard_periodo_taxa': (1, 2026),
+    }
+
+
+def medir(cursor, sql: str, params: Tuple, repeticoes: int) -> List[float]:
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def resumo(tempos: List[float]) -> Tuple[float, float]:
+    ordenados = sorted(tempos)
+    return statistics.median(ordenados), ordenados[int(len(ordenados) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de statements preparados')
+    parser.add_argument('--dsn', default=POSTGRES_CONNECTION_STRING)
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    cursor = conn.cursor()
+    params = parametros(cursor)
+
+    print(f"[INFO] {args.repeticoes} execuções por statement, mesma conexão\n")
+    print(f"{'statement':<30} {'direto p50':>11} {'prep. p50':>10} {'direto p95':>11} {'prep. p95':>10} {'ganho':>7}")
+
+    ganhos = []
+    try:
+        for nome, (_, sql) in STATEMENTS_PREPARADOS.items():
+            valores = params.get(nome, ())
+            direto = medir(cursor, sql, valores, args.repeticoes)
+
+            cursor.execute(sql_prepare(nome))
+            preparado = medir(cursor, sql_execute(nome), valores, args.repeticoes)
+
+            d50, d95 = resumo(direto)
+            p50, p95 = resumo(preparado)
+            ganho = (d50 - p50) / d50 * 100 if d50 else 0.0
+            ganhos.append(ganho)
+            print(f"{nome:<30} {d50:>9.3f}ms {p50:>8.3f}ms {d95:>9.3f}ms {p95:>8.3f}ms {ganho:>6.1f}%")
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"\n[INFO] Ganho mediano no p50: {statistics.median(ganhos):.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de serialização de listagens (páginas de 500 linhas)
+
+Compara o caminho antigo (modelo Pydantic por linha + revalidação do
+response_model + jsonable_encoder + json da stdlib, como o FastAPI faz)
+com o caminho rápido de api/respostas.py (tuplas do cursor -> dicts -> orjson).
+
+Uso:
+    python backend/benchmarks/bench_serializacao.py --linhas 500 --repeticoes 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from api.models import ClienteResponse, TemplateResponse
+from api.respostas import dumps, linhas_para_dicts, orjson
+
+COLUNAS_CLIENTE = ('id', 'nome', 'digisac_contact_id', 'telefone', 'email', 'created_at', 'status')
+COLUNAS_TEMPLATE = ('id', 'nome', 'template_text', 'variaveis', 'ativo', 'created_at')
+
+
+def linhas_clientes(quantidade: int) -> List[tuple]:
+    base = datetime(2025, 1, 1, 8, 30)
+    return [
+        (i, f'Cliente Benchmark {i} Comércio LTDA', f'bench-{i}', f'5511999{i:06d}',
+         f'cliente{i}@exemplo.com.br', base + timedelta(minutes=i), 'ativo')
+        for i in range(quantidade)
+    ]
+
+
+def linhas_templates(quantidade: int) -> List[tuple]:
+    base = datetime(2025, 1, 1, 8, 30)
+    texto = 'Olá ${nome}!\n\nSegue a cobrança referente a ${mes_ano}.\n\nAtt,\n${empresa}' * 3
+    return [
+        (i, f'Template {i}', texto, 'nome,mes_ano,empresa', True, base + timedelta(hours=i))
+        for i in range(quantidade)
+    ]
+
+
+def caminho_pydantic(modelo, colunas, linhas) -> bytes:
+    """Reproduz o caminho do FastAPI com response_model=List[modelo]"""
+    objetos = [modelo(**dict(zip(colunas, linha))) for linha in linhas]
+    validados = TypeAdapter(List[modelo]).validate_python(objetos, from_attributes=True)
+    return json.dumps(jsonable_encoder(validados), ensure_ascii=False).encode('utf-8')
+
+
+def caminho_rapido(modelo, colunas, linhas) -> bytes:
+    return dumps(linhas_para_dicts(colunas, linhas))
+
+
+def medir(funcao, repeticoes: int, *args) -> float:
+    funcao(*args)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(*args)
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialização de listagens')
+    parser.add_argument('--linhas', type=int, default=500)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"[INFO] Encoder rápido: {'orjson' if orjson else 'json (stdlib, orjson não instalado)'}")
+    print(f"[INFO] {args.linhas} linhas por página, {args.repeticoes} repetições\n")
+
+    cenarios = [
+        ('clientes', ClienteResponse, COLUNAS_CLIENTE, linhas_clientes(args.linhas)),
+        ('templates', TemplateResponse, COLUNAS_TEMPLATE, linhas_templates(args.linhas)),
+    ]
+
+    for nome, modelo, colunas, linhas in cenarios:
+        lento = medir(caminho_pydantic, args.repeticoes, modelo, colunas, linhas)
+        rapido = medir(caminho_rapido, args.repeticoes, modelo, colunas, linhas)
+        print(f"  {nome:<10} pydantic+json={lento:8.3f}ms  rápido={rapido:8.3f}ms  "
+              f"ganho={lento / rapido:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
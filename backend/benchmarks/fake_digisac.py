@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Simulador local da API Digisac para benchmarks
+
+Responde aos endpoints usados pelo sistema (/messages e /contacts) com
+latência, taxa de erro e comportamento de 429 configuráveis.
+
+Uso:
+    python backend/benchmarks/fake_digisac.py --porta 8900 --latencia-ms 80 --taxa-erro 0.02
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+
+
+class SimuladorConfig:
+    """Parâmetros de comportamento do simulador"""
+
+    def __init__(self, latencia_ms: float = 50.0, jitter_ms: float = 20.0,
+                 taxa_erro: float = 0.0, taxa_429: float = 0.0,
+                 limite_por_segundo: int = 0, retry_after: int = 1,
+                 total_contatos: int = 1000, seed: int = 42):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.limite_por_segundo = limite_por_segundo
+        self.retry_after = retry_after
+        self.total_contatos = total_contatos
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.contadores: Dict[str, int] = {
+            'mensagens_ok': 0,
+            'mensagens_erro': 0,
+            'mensagens_429': 0,
+            'contatos': 0
+        }
+        self._janela_inicio = time.monotonic()
+        self._janela_contagem = 0
+
+    def sortear(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+    def atraso(self) -> float:
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latencia_ms + jitter) / 1000
+
+    def excedeu_limite(self) -> bool:
+        """Janela fixa de 1s para simular o rate limit do provedor"""
+        if not self.limite_por_segundo:
+            return False
+        with self.lock:
+            agora = time.monotonic()
+            if agora - self._janela_inicio >= 1:
+                self._janela_inicio = agora
+                self._janela_contagem = 0
+            self._janela_contagem += 1
+            return self._janela_contagem > self.limite_por_segundo
+
+    def incrementar(self, chave: str):
+        with self.lock:
+            self.contadores[chave] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.contadores)
+
+
+def criar_handler(config: SimuladorConfig):
+    class DigisacHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _responder(self, status: int, corpo: Dict[str, Any], headers: Dict[str, str] = None):
+            dados = json.dumps(corpo).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(dados)))
+            for chave, valor in (headers or {}).items():
+                self.send_header(chave, valor)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _ler_corpo(self) -> Dict[str, Any]:
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            if not tamanho:
+                return {}
+            try:
+                return json.loads(self.rfile.read(tamanho))
+            except ValueError:
+                return {}
+
+        def do_POST(self):
+            caminho = self.path.split('?')[0].rstrip('/')
+            if not caminho.endswith('/messages'):
+                self._responder(404, {'error': 'not found'})
+                return
+
+            payload = self._ler_corpo()
+            time.sleep(config.atraso())
+
+            if config.excedeu_limite() or config.sortear() < config.taxa_429:
+                config.incrementar('mensagens_429')
+                self._responder(429, {'error': 'Too Many Requests'},
+                                {'Retry-After': str(config.retry_after)})
+                return
+
+            if config.sortear() < config.taxa_erro:
+                config.incrementar('mensagens_erro')
+                self._responder(500, {'error': 'Internal Server Error'})
+                return
+
+            config.incrementar('mensagens_ok')
+            self._responder(200, {
+                'id': str(uuid.uuid4()),
+                'contactId': payload.get('contactId'),
+                'text': payload.get('text'),
+                'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            })
+
+        def do_GET(self):
+            caminho, _, query = self.path.partition('?')
+            caminho = caminho.rstrip('/')
+
+            if caminho.endswith('/_stats'):
+                self._responder(200, config.snapshot())
+                return
+
+            contato = re.search(r'/contacts/([^/]+)$', caminho)
+            if contato:
+                time.sleep(config.atraso())
+                config.incrementar('contatos')
+                contact_id = contato.group(1)
+                if not contact_id.startswith('bench-'):
+                    self._responder(404, {'error': 'Contact not found'})
+                    return
+                self._responder(200, self._contato(contact_id))
+                return
+
+            if caminho.endswith('/contacts'):
+                time.sleep(config.atraso())
+                config.incrementar('contatos')
+                params = dict(p.split('=', 1) for p in query.split('&') if '=' in p)
+                page = int(params.get('page', 1))
+                per_page = int(params.get('perPage', 200))
+                inicio = (page - 1) * per_page
+                fim = min(inicio + per_page, config.total_contatos)
+                ultima = max(1, -(-config.total_contatos // per_page))
+                self._responder(200, {
+                    'data': [self._contato(f'bench-{i}') for i in range(inicio, fim)],
+                    'lastPage': ultima,
+                    'currentPage': page
+                })
+                return
+
+            self._responder(404, {'error': 'not found'})
+
+        def _contato(self, contact_id: str) -> Dict[str, Any]:
+            sufixo = ''.join(filter(str.isdigit, contact_id)) or '0'
+            return {
+                'id': contact_id,
+                'name': f'Cliente Benchmark {sufixo}',
+                'data': {'number': f'55119{int(sufixo):08d}'}
+            }
+
+    return DigisacHandler
+
+
+class FakeDigisacServer:
+    """Servidor HTTP do simulador, executável em thread para uso embutido"""
+
+    def __init__(self, host: str = '127.0.0.1', porta: int = 8900, config: SimuladorConfig = None):
+        self.config = config or SimuladorConfig()
+        self.httpd = ThreadingHTTPServer((host, porta), criar_handler(self.config))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self.httpd.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador local da API Digisac')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8900)
+    parser.add_argument('--latencia-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de respostas 500 (0-1)')
+    parser.add_argument('--taxa-429', type=float, default=0.0, help='Fração de respostas 429 aleatórias (0-1)')
+    parser.add_argument('--limite-por-segundo', type=int, default=0, help='Responde 429 acima deste ritmo (0 = sem limite)')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--total-contatos', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    config = SimuladorConfig(
+        latencia_ms=args.latencia_ms,
+        jitter_ms=args.jitter_ms,
+        taxa_erro=args.taxa_erro,
+        taxa_429=args.taxa_429,
+        limite_por_segundo=args.limite_por_segundo,
+        retry_after=args.retry_after,
+        total_contatos=args.total_contatos,
+        seed=args.seed
+    )
+    servidor = FakeDigisacServer(args.host, args.porta, config)
+    print(f"[INFO] Simulador Digisac ouvindo em {servidor.url}")
+
+    try:
+        servidor.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Simulador encerrado")
+        print(json.dumps(config.snapshot(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
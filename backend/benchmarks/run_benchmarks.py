@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Suíte de benchmarks ponta a ponta da API
+
+Executa cenários contra /api/cobrancas/enviar-lote, /api/clientes/ e
+/api/dashboard/* usando um PostgreSQL local e o simulador Digisac
+(fake_digisac.py). Mede mensagens/s, latência p50/p95/p99 e queries
+por requisição (via pg_stat_statements) e salva o resultado em JSON.
+
+Uso:
+    python backend/benchmarks/run_benchmarks.py --iniciar-simulador --iniciar-api
+    python backend/benchmarks/run_benchmarks.py --comparar resultados/anterior.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent.parent
+SRC_DIR = ROOT_DIR / 'src'
+
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(ROOT_DIR / 'backend' / 'scripts'))
+
+from fake_digisac import FakeDigisacServer, SimuladorConfig
+
+
+# ========== MÉTRICAS ==========
+
+def percentis(latencias: List[float]) -> Dict[str, float]:
+    """Resumo de latências em milissegundos"""
+    if not latencias:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'media': 0.0, 'max': 0.0}
+
+    ordenadas = sorted(latencias)
+    if len(ordenadas) > 1:
+        cortes = statistics.quantiles(ordenadas, n=100, method='inclusive')
+        p50, p95, p99 = cortes[49], cortes[94], cortes[98]
+    else:
+        p50 = p95 = p99 = ordenadas[0]
+
+    return {
+        'p50': round(p50, 2),
+        'p95': round(p95, 2),
+        'p99': round(p99, 2),
+        'media': round(statistics.fmean(ordenadas), 2),
+        'max': round(ordenadas[-1], 2)
+    }
+
+
+class ContadorQueries:
+    """Conta statements executados no banco via pg_stat_statements"""
+
+    def __init__(self, dsn: Optional[str]):
+        self.conn = None
+        if not dsn:
+            return
+        try:
+            import psycopg2
+            self.conn = psycopg2.connect(dsn)
+            self.conn.autocommit = True
+            with self.conn.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_stat_statements')
+                cursor.execute('SELECT 1 FROM pg_stat_statements LIMIT 1')
+        except Exception as e:
+            print(f"[WARN] pg_stat_statements indisponível, queries/requisição não será medido: {e}")
+            if self.conn:
+                self.conn.close()
+            self.conn = None
+
+    def total(self) -> Optional[int]:
+        if not self.conn:
+            return None
+        with self.conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT COALESCE(SUM(calls), 0)
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+            ''')
+            return int(cursor.fetchone()[0])
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+
+# ========== EXECUÇÃO ==========
+
+class BenchmarkRunner:
+    def __init__(self, api_url: str, concorrencia: int, contador: ContadorQueries):
+        self.api_url = api_url.rstrip('/')
+        self.concorrencia = concorrencia
+        self.contador = contador
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(concorrencia, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def aguardar_api(self, timeout: float = 60):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            try:
+                if self.session.get(f"{self.api_url}/health", timeout=2).status_code == 200:
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"API não respondeu em {self.api_url}/health")
+
+    def preparar_clientes(self, quantidade: int) -> List[int]:
+        """Garante clientes de benchmark (contact_id bench-N) e retorna seus IDs"""
+        ids = []
+        for i in range(quantidade):
+            response = self.session.post(f"{self.api_url}/api/clientes/", json={
+                'nome': f'Cliente Benchmark {i}',
+                'digisac_contact_id': f'bench-{i}',
+                'telefone': f'55119{i:08d}'
+            }, timeout=30)
+            response.raise_for_status()
+            ids.append(response.json()['id'])
+        return ids
+
+    def executar(self, nome: str, requisicao: Callable[[], requests.Response], repeticoes: int,
+                 mensagens: Optional[Callable[[requests.Response], int]] = None) -> Dict[str, Any]:
+        """
+        Executa um cenário com a concorrência configurada
+
+        mensagens extrai da resposta quantas mensagens foram de fato enviadas
+        (base do mensagens_por_s)
+        """
+        latencias: List[float] = []
+        erros = 0
+        mensagens_enviadas = 0
+
+        def uma():
+            inicio = time.perf_counter()
+            enviadas = 0
+            try:
+                response = requisicao()
+                ok = response.status_code < 400
+                if ok and mensagens:
+                    enviadas = mensagens(response)
+            except (requests.exceptions.RequestException, ValueError, KeyError):
+                ok = False
+            return (time.perf_counter() - inicio) * 1000, ok, enviadas
+
+        queries_antes = self.contador.total()
+        inicio = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            for latencia, ok, enviadas in executor.map(lambda _: uma(), range(repeticoes)):
+                latencias.append(latencia)
+                mensagens_enviadas += enviadas
+                if not ok:
+                    erros += 1
+
+        duracao = time.perf_counter() - inicio
+        queries_depois = self.contador.total()
+
+        resultado = {
+            'requisicoes': repeticoes,
+            'erros': erros,
+            'duracao_s': round(duracao, 3),
+            'req_por_s': round(repeticoes / duracao, 2) if duracao else 0.0,
+            'latencia_ms': percentis(latencias),
+            'queries_por_requisicao': None
+        }
+
+        if queries_antes is not None and queries_depois is not None:
+            # Desconta a própria consulta de medição
+            resultado['queries_por_requisicao'] = round(
+                max(0, queries_depois - queries_antes - 1) / repeticoes, 2
+            )
+
+        if mensagens:
+            resultado['mensagens_enviadas'] = mensagens_enviadas
+            resultado['mensagens_por_s'] = round(
+                mensagens_enviadas / duracao, 2
+            ) if duracao else 0.0
+
+        lat = resultado['latencia_ms']
+        print(f"  {nome:<24} {resultado['req_por_s']:>9.2f} req/s  "
+              f"p50={lat['p50']:.1f}ms p95={lat['p95']:.1f}ms p99={lat['p99']:.1f}ms  "
+              f"erros={erros}  queries/req={resultado['queries_por_requisicao']}")
+        return resultado
+
+    def cenarios(self, ids: List[int], repeticoes: int, lotes: int, tamanho_lote: int) -> Dict[str, Any]:
+        api = self.api_url
+        agora = datetime.now()
+        resultados = {}
+
+        resultados['clientes_listar'] = self.executar(
+            'clientes_listar',
+            lambda: self.session.get(f"{api}/api/clientes/", params={'limit': 200}, timeout=60),
+            repeticoes
+        )
+        resultados['clientes_busca'] = self.executar(
+            'clientes_busca',
+            lambda: self.session.get(f"{api}/api/clientes/", params={'nome': 'benchmark', 'limit': 50}, timeout=60),
+            repeticoes
+        )
+        resultados['dashboard_stats'] = self.executar(
+            'dashboard_stats',
+            lambda: self.session.get(f"{api}/api/dashboard/stats", timeout=60),
+            repeticoes
+        )
+        resultados['dashboard_periodo'] = self.executar(
+            'dashboard_periodo',
+            lambda: self.session.get(f"{api}/api/dashboard/stats/periodo",
+                                     params={'mes': agora.month, 'ano': agora.year}, timeout=60),
+            repeticoes
+        )
+        resultados['dashboard_atividades'] = self.executar(
+            'dashboard_atividades',
+            lambda: self.session.get(f"{api}/api/dashboard/atividades-recentes",
+                                     params={'limit': 20}, timeout=60),
+            repeticoes
+        )
+
+        # Toda repetição reenvia ao mesmo público: o limite de frequência
+        # (FREQ_CAP_MAX_ENVIOS) ignoraria todos a partir da segunda
+        lote_ids = ids[:tamanho_lote]
+        resultados['enviar_lote'] = self.executar(
+            'enviar_lote',
+            lambda: self.session.post(f"{api}/api/cobrancas/enviar-lote", json={
+                'clientes_ids': lote_ids,
+                'tipo': 'financeira',
+                'mensagem_padrao': 'Olá ${nome}! Mensagem de benchmark.',
+                'enviar_agora': True,
+                'ignorar_limite_frequencia': True
+            }, timeout=600),
+            lotes,
+            mensagens=lambda response: response.json()['enviados']
+        )
+        return resultados
+
+
+# ========== COMPARAÇÃO ==========
+
+def comparar(atual: Dict[str, Any], anterior: Dict[str, Any], tolerancia: float) -> bool:
+    """Imprime variação entre execuções; retorna False se houver regressão"""
+    print(f"\n[COMPARAÇÃO] {anterior.get('versao')} -> {atual.get('versao')} (tolerância {tolerancia:.0%})\n")
+    sem_regressao = True
+
+    for nome, dados in atual['cenarios'].items():
+        base = anterior.get('cenarios', {}).get(nome)
+        if not base:
+            continue
+
+        metricas = [
+            ('p95', dados['latencia_ms']['p95'], base['latencia_ms']['p95'], True),
+            ('req/s', dados['req_por_s'], base['req_por_s'], False),
+        ]
+        if 'mensagens_por_s' in dados and 'mensagens_por_s' in base:
+            metricas.append(('msg/s', dados['mensagens_por_s'], base['mensagens_por_s'], False))
+        if dados.get('queries_por_requisicao') is not None and base.get('queries_por_requisicao') is not None:
+            metricas.append(('queries/req', dados['queries_por_requisicao'], base['queries_por_requisicao'], True))
+
+        for rotulo, novo, velho, menor_melhor in metricas:
+            if not velho:
+                continue
+            variacao = (novo - velho) / velho
+            piorou = variacao > tolerancia if menor_melhor else variacao < -tolerancia
+            marca = 'REGRESSÃO' if piorou else 'ok'
+            sem_regressao = sem_regressao and not piorou
+            print(f"  {nome:<24} {rotulo:<12} {velho:>10} -> {novo:<10} ({variacao:+.1%}) {marca}")
+
+    return sem_regressao
+
+
+def versao_atual() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT_DIR, text=True
+        ).strip()
+    except Exception:
+        return 'desconhecida'
+
+
+def iniciar_api(porta: int, digisac_url: str) -> subprocess.Popen:
+    env = dict(os.environ, DIGISAC_API_URL=digisac_url, DIGISAC_API_TOKEN='benchmark')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--port', str(porta), '--log-level', 'warning'],
+        cwd=SRC_DIR, env=env
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks ponta a ponta da API')
+    parser.add_argument('--api-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--dsn', default=None, help='DSN do PostgreSQL (padrão: core.config)')
+    parser.add_argument('--clientes', type=int, default=200, help='Clientes de benchmark a garantir')
+    parser.add_argument('--repeticoes', type=int, default=200, help='Requisições por cenário de leitura')
+    parser.add_argument('--lotes', type=int, default=5, help='Quantidade de envios em lote')
+    parser.add_argument('--tamanho-lote', type=int, default=100)
+    parser.add_argument('--concorrencia', type=int, default=4)
+    parser.add_argument('--saida', default=str(BENCH_DIR / 'resultados'))
+    parser.add_argument('--comparar', default=None, help='JSON de execução anterior para comparação')
+    parser.add_argument('--tolerancia', type=float, default=0.10)
+    parser.add_argument('--iniciar-simulador', action='store_true')
+    parser.add_argument('--porta-simulador', type=int, default=8900)
+    parser.add_argument('--latencia-ms', type=float, default=50.0)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--taxa-429', type=float, default=0.0)
+    parser.add_argument('--iniciar-api', action='store_true', help='Sobe uvicorn apontando para o simulador')
+    parser.add_argument('--gerar-dataset', action='store_true',
+                        help='Popula o banco com dataset sintético (gerar_dataset.py) antes dos cenários')
+    parser.add_argument('--dataset-clientes', type=int, default=100000)
+    parser.add_argument('--dataset-historico-medio', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    dsn = args.dsn
+    if dsn is None:
+        from core.config import POSTGRES_CONNECTION_STRING
+        dsn = POSTGRES_CONNECTION_STRING
+
+    simulador = None
+    api_proc = None
+    dataset = None
+
+    if args.gerar_dataset:
+        from gerar_dataset import gerar
+        print(f"[INFO] Gerando dataset sintético ({args.dataset_clientes} clientes)...")
+        dataset = gerar(
+            dsn=dsn,
+            clientes=args.dataset_clientes,
+            historico_medio=args.dataset_historico_medio,
+            seed=args.seed,
+            limpar=True
+        )
+
+    contador = ContadorQueries(dsn)
+
+    try:
+        if args.iniciar_simulador:
+            simulador = FakeDigisacServer(porta=args.porta_simulador, config=SimuladorConfig(
+                latencia_ms=args.latencia_ms,
+                taxa_erro=args.taxa_erro,
+                taxa_429=args.taxa_429,
+                total_contatos=args.clientes
+            )).iniciar()
+            print(f"[INFO] Simulador Digisac em {simulador.url}")
+
+        if args.iniciar_api:
+            digisac_url = simulador.url if simulador else os.getenv('DIGISAC_API_URL', '')
+            porta = int(args.api_url.rsplit(':', 1)[-1].split('/')[0])
+            api_proc = iniciar_api(porta, digisac_url)
+
+        runner = BenchmarkRunner(args.api_url, args.concorrencia, contador)
+        runner.aguardar_api()
+
+        print(f"[INFO] Preparando {args.clientes} clientes de benchmark...")
+        ids = runner.preparar_clientes(args.clientes)
+
+        print("\n[BENCHMARK] Cenários:\n")
+        resultado = {
+            'versao': versao_atual(),
+            'timestamp': datetime.now().isoformat(),
+            'parametros': {
+                'clientes': args.clientes,
+                'repeticoes': args.repeticoes,
+                'lotes': args.lotes,
+                'tamanho_lote': min(args.tamanho_lote, len(ids)),
+                'concorrencia': args.concorrencia,
+                'latencia_simulador_ms': args.latencia_ms if simulador else None,
+                'taxa_erro_simulador': args.taxa_erro if simulador else None,
+                'taxa_429_simulador': args.taxa_429 if simulador else None,
+                'dataset': dataset
+            },
+            'cenarios': runner.cenarios(ids, args.repeticoes, args.lotes, args.tamanho_lote)
+        }
+        if simulador:
+            resultado['simulador'] = simulador.config.snapshot()
+
+        saida = Path(args.saida)
+        saida.mkdir(parents=True, exist_ok=True)
+        arquivo = saida / f"bench_{datetime.now():%Y%m%d_%H%M%S}_{resultado['versao']}.json"
+        arquivo.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n[SUCCESS] Resultados salvos em {arquivo}")
+
+        if args.comparar:
+            anterior = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+            if not comparar(resultado, anterior, args.tolerancia):
+                sys.exit(1)
+
+    finally:
+        contador.close()
+        if api_proc:
+            api_proc.terminate()
+            api_proc.wait(timeout=10)
+        if simulador:
+            simulador.parar()
+
+
+if __name__ == '__main__':
+    main()
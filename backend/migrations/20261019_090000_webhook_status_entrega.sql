@@ -0,0 +1,41 @@
+-- Migration: Status de entrega via webhook Digisac
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS digisac_message_id TEXT;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS status_entrega TEXT
+CHECK (status_entrega IN ('enviado', 'entregue', 'lido', 'falhou'));
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS status_entrega_em TIMESTAMP;
+
+-- @etapa indice_message_id sem-transacao
+-- Busca do webhook por digisac_message_id (sem bloquear escritas em historico_envios)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_message_id
+ON historico_envios(digisac_message_id) WHERE digisac_message_id IS NOT NULL;
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'historico_envios'
+        AND column_name = 'digisac_message_id'
+    ) THEN
+        RAISE EXCEPTION 'Coluna digisac_message_id não foi criada corretamente';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_message_id' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_message_id ausente ou inválido';
+    END IF;
+END $$;
@@ -0,0 +1,99 @@
+-- Migration: Histórico compacto (versão do template + variáveis)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS template_versoes (
+    id SERIAL PRIMARY KEY,
+    template_id INTEGER REFERENCES message_templates(id) ON DELETE CASCADE,
+    template_text TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_template_versoes_hash
+ON template_versoes((COALESCE(template_id, 0)), hash);
+
+CREATE OR REPLACE FUNCTION renderizar_template(texto TEXT, variaveis JSONB)
+RETURNS TEXT LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    v RECORD;
+    resultado TEXT := texto;
+BEGIN
+    IF variaveis IS NULL THEN
+        RETURN resultado;
+    END IF;
+    FOR v IN SELECT key, value FROM jsonb_each_text(variaveis) LOOP
+        resultado := replace(resultado, '${' || v.key || '}', COALESCE(v.value, ''));
+    END LOOP;
+    RETURN resultado;
+END
+$$;
+
+ALTER TABLE historico_envios ALTER COLUMN mensagem DROP NOT NULL;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS template_versao_id INTEGER REFERENCES template_versoes(id);
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS variaveis JSONB;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'historico_envios_mensagem_ou_versao'
+    ) THEN
+        ALTER TABLE historico_envios ADD CONSTRAINT historico_envios_mensagem_ou_versao
+        CHECK (mensagem IS NOT NULL OR template_versao_id IS NOT NULL);
+    END IF;
+END $$;
+
+-- Versão inicial de cada template atual (mesmo hash usado pela aplicação: sha256 hex)
+INSERT INTO template_versoes (template_id, template_text, hash)
+SELECT id, template_text, encode(sha256(convert_to(template_text, 'UTF8')), 'hex')
+FROM message_templates
+ON CONFLICT ((COALESCE(template_id, 0)), hash) DO NOTHING;
+
+-- Backfill: só compacta envios cuja mensagem é reproduzida exatamente pela
+-- versão atual do template com a variável ${nome}. Envios feitos com outro
+-- texto (template editado depois) ou com variáveis de data permanecem intactos.
+UPDATE historico_envios he
+SET template_versao_id = tv.id,
+    variaveis = jsonb_build_object('nome', c.nome),
+    mensagem = NULL
+FROM message_templates mt
+JOIN template_versoes tv
+  ON tv.template_id = mt.id
+ AND tv.hash = encode(sha256(convert_to(mt.template_text, 'UTF8')), 'hex'),
+     clientes c
+WHERE he.template_usado = mt.nome
+  AND c.id = he.cliente_id
+  AND he.mensagem IS NOT NULL
+  AND he.template_versao_id IS NULL
+  AND he.mensagem = renderizar_template(tv.template_text, jsonb_build_object('nome', c.nome));
+
+-- O espaço só é devolvido ao sistema após reescrever a tabela, fora do
+-- horário de pico: VACUUM FULL historico_envios; (ou pg_repack, sem lock exclusivo)
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'historico_envios'
+        AND column_name = 'template_versao_id'
+    ) THEN
+        RAISE EXCEPTION 'Coluna template_versao_id não foi criada corretamente';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM historico_envios he
+        JOIN template_versoes tv ON tv.id = he.template_versao_id
+        JOIN clientes c ON c.id = he.cliente_id
+        WHERE he.mensagem IS NULL
+        AND renderizar_template(tv.template_text, he.variaveis) LIKE '%${nome}%'
+    ) THEN
+        RAISE EXCEPTION 'Mensagens compactadas não podem ser reconstruídas';
+    END IF;
+END $$;
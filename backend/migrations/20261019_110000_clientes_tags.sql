@@ -0,0 +1,49 @@
+-- Migration: Tags de clientes e filtro de audiência no envio em lote
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+ALTER TABLE clientes ADD COLUMN IF NOT EXISTS tags TEXT[] NOT NULL DEFAULT '{}';
+
+-- @etapa indices_audiencia sem-transacao
+-- Índices construídos sem bloquear escritas em clientes e historico_envios
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_tags ON clientes USING GIN(tags);
+
+-- "Sem contato há N dias": NOT EXISTS por cliente resolvido pelo índice composto
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_cliente_data
+ON historico_envios(cliente_id, data_envio DESC);
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'clientes'
+        AND column_name = 'tags'
+    ) THEN
+        RAISE EXCEPTION 'Coluna tags não foi criada corretamente';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_clientes_tags' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_clientes_tags ausente ou inválido';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_cliente_data' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_cliente_data ausente ou inválido';
+    END IF;
+END $$;
@@ -0,0 +1,51 @@
+-- Migration: Lote e classe de erro para reenvio em massa
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS lote_id TEXT;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS erro_classe TEXT;
+
+-- @etapa indices_reenvio sem-transacao
+-- Índices construídos sem bloquear escritas em historico_envios
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_lote
+ON historico_envios(lote_id) WHERE lote_id IS NOT NULL;
+
+-- Seleção de reenvios por período: só as linhas com falha entram no índice
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_falhas
+ON historico_envios(data_envio) WHERE status IN ('erro', 'pendente');
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'historico_envios'
+        AND column_name = 'erro_classe'
+    ) THEN
+        RAISE EXCEPTION 'Coluna erro_classe não foi criada corretamente';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_lote' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_lote ausente ou inválido';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_falhas' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_falhas ausente ou inválido';
+    END IF;
+END $$;
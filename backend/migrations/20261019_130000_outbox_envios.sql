@@ -0,0 +1,58 @@
+-- Migration: Outbox de envios (lotes retomáveis e idempotentes)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Novo status 'processando': linha reivindicada por um sender
+ALTER TABLE historico_envios DROP CONSTRAINT IF EXISTS historico_envios_status_check;
+ALTER TABLE historico_envios ADD CONSTRAINT historico_envios_status_check
+CHECK (status IN ('enviado', 'erro', 'pendente', 'processando'));
+
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS chave_idempotencia TEXT;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS reivindicacao TEXT;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS reivindicado_em TIMESTAMP;
+
+-- @etapa indices_outbox sem-transacao
+-- Índices construídos sem bloquear escritas em historico_envios
+-- lote_id:cliente_id; NULL (envios antigos) não conflita
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_idempotencia
+ON historico_envios(chave_idempotencia);
+
+-- Fila do outbox: só linhas pendentes/em processamento entram no índice
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_outbox
+ON historico_envios(lote_id, id) WHERE status IN ('pendente', 'processando');
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'historico_envios'
+        AND column_name = 'chave_idempotencia'
+    ) THEN
+        RAISE EXCEPTION 'Coluna chave_idempotencia não foi criada corretamente';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_idempotencia' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_idempotencia ausente ou inválido';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_outbox' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_outbox ausente ou inválido';
+    END IF;
+END $$;
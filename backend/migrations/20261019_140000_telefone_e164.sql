@@ -0,0 +1,63 @@
+-- Migration: Telefone normalizado em E.164 (busca e deduplicação por índice)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Telefone em E.164 (+5511999999999); sem DDI assume o Brasil. NULL se não der para normalizar
+CREATE OR REPLACE FUNCTION normalizar_telefone(telefone TEXT, ddi_padrao TEXT DEFAULT '55')
+RETURNS TEXT LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    digitos TEXT := regexp_replace(COALESCE(telefone, ''), '[^0-9]', '', 'g');
+BEGIN
+    IF btrim(COALESCE(telefone, '')) LIKE '+%' THEN
+        NULL;  -- já tem DDI
+    ELSIF digitos LIKE '00%' THEN
+        digitos := substr(digitos, 3);  -- prefixo internacional
+    ELSIF length(ltrim(digitos, '0')) IN (10, 11) THEN
+        digitos := ddi_padrao || ltrim(digitos, '0');  -- DDD + número, com ou sem 0 de tronco
+    END IF;
+    IF length(digitos) < 10 OR length(digitos) > 15 THEN
+        RETURN NULL;
+    END IF;
+    RETURN '+' || digitos;
+END
+$$;
+
+-- Coluna gerada: mantida pelo PostgreSQL em toda escrita (API, importadores, scripts).
+-- O ADD COLUMN reescreve a tabela e já preenche as linhas existentes.
+ALTER TABLE clientes ADD COLUMN IF NOT EXISTS telefone_e164 TEXT
+GENERATED ALWAYS AS (normalizar_telefone(telefone)) STORED;
+
+-- @etapa indice_telefone_e164 sem-transacao
+-- Busca por telefone passa a ser por telefone_e164 (sem bloquear escritas em clientes)
+DROP INDEX CONCURRENTLY IF EXISTS idx_clientes_telefone;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clientes_telefone_e164
+ON clientes(telefone_e164) WHERE telefone_e164 IS NOT NULL;
+
+-- Duplicados existentes: mesclar com backend/scripts/deduplicar_clientes.py --aplicar
+-- (--indice-unico cria idx_clientes_telefone_e164_unico depois da mescla)
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'clientes'
+        AND column_name = 'telefone_e164'
+    ) THEN
+        RAISE EXCEPTION 'Coluna telefone_e164 não foi criada corretamente';
+    END IF;
+
+    IF normalizar_telefone('(11) 99999-9999') IS DISTINCT FROM '+5511999999999'
+       OR normalizar_telefone('+55 11 99999-9999') IS DISTINCT FROM '+5511999999999'
+       OR normalizar_telefone('5511999999999') IS DISTINCT FROM '+5511999999999' THEN
+        RAISE EXCEPTION 'normalizar_telefone não normaliza os formatos esperados';
+    END IF;
+END $$;
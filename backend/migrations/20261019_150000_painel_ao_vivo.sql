@@ -0,0 +1,112 @@
+-- Migration: Painel ao vivo (NOTIFY por comando em historico_envios e clientes)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Triggers FOR EACH STATEMENT com tabelas de transição: um envio em lote de mil
+-- linhas gera uma notificação, não mil. O NOTIFY só é entregue no COMMIT.
+-- Consumidor: services/painel_ao_vivo.py (GET /api/dashboard/eventos)
+
+-- Envios: delta de envios do mês e até 20 ids alterados por comando (os mais recentes)
+CREATE OR REPLACE FUNCTION painel_notificar_historico()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    ids JSON;
+    envios_mes BIGINT := 0;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT COUNT(*) FILTER (WHERE data_envio >= DATE_TRUNC('month', CURRENT_DATE))
+        INTO envios_mes FROM novas;
+        SELECT json_agg(id) INTO ids FROM (SELECT id FROM novas ORDER BY id DESC LIMIT 20) r;
+    ELSE
+        SELECT json_agg(id) INTO ids FROM (
+            SELECT n.id FROM novas n JOIN antigas a ON a.id = n.id
+            WHERE n.status IS DISTINCT FROM a.status
+               OR n.status_entrega IS DISTINCT FROM a.status_entrega
+            ORDER BY n.id DESC LIMIT 20
+        ) r;
+    END IF;
+    IF ids IS NOT NULL OR envios_mes <> 0 THEN
+        -- clock_timestamp() evita que notificações iguais na mesma transação sejam fundidas
+        PERFORM pg_notify('painel', json_build_object(
+            'ids', COALESCE(ids, '[]'::json),
+            'delta', json_build_object('cobrancas_mes', envios_mes),
+            'em', clock_timestamp()
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Clientes: deltas de total, ativos e inativos/suspensos
+CREATE OR REPLACE FUNCTION painel_notificar_clientes()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    novos_total BIGINT := 0;
+    novos_ativos BIGINT := 0;
+    novos_inativos BIGINT := 0;
+    antigos_total BIGINT := 0;
+    antigos_ativos BIGINT := 0;
+    antigos_inativos BIGINT := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE status = 'ativo'), COUNT(*) FILTER (WHERE status <> 'ativo')
+        INTO novos_total, novos_ativos, novos_inativos FROM novas;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE status = 'ativo'), COUNT(*) FILTER (WHERE status <> 'ativo')
+        INTO antigos_total, antigos_ativos, antigos_inativos FROM antigas;
+    END IF;
+    IF novos_total <> antigos_total OR novos_ativos <> antigos_ativos OR novos_inativos <> antigos_inativos THEN
+        PERFORM pg_notify('painel', json_build_object(
+            'ids', '[]'::json,
+            'delta', json_build_object(
+                'total_clientes', novos_total - antigos_total,
+                'clientes_ativos', novos_ativos - antigos_ativos,
+                'clientes_inadimplentes', novos_inativos - antigos_inativos
+            ),
+            'em', clock_timestamp()
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Uma trigger por evento: tabelas de transição não aceitam INSERT OR UPDATE
+DROP TRIGGER IF EXISTS trg_painel_historico_insert ON historico_envios;
+CREATE TRIGGER trg_painel_historico_insert AFTER INSERT ON historico_envios
+REFERENCING NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION painel_notificar_historico();
+
+DROP TRIGGER IF EXISTS trg_painel_historico_update ON historico_envios;
+CREATE TRIGGER trg_painel_historico_update AFTER UPDATE ON historico_envios
+REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION painel_notificar_historico();
+
+DROP TRIGGER IF EXISTS trg_painel_clientes_insert ON clientes;
+CREATE TRIGGER trg_painel_clientes_insert AFTER INSERT ON clientes
+REFERENCING NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION painel_notificar_clientes();
+
+DROP TRIGGER IF EXISTS trg_painel_clientes_update ON clientes;
+CREATE TRIGGER trg_painel_clientes_update AFTER UPDATE ON clientes
+REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION painel_notificar_clientes();
+
+DROP TRIGGER IF EXISTS trg_painel_clientes_delete ON clientes;
+CREATE TRIGGER trg_painel_clientes_delete AFTER DELETE ON clientes
+REFERENCING OLD TABLE AS antigas
+FOR EACH STATEMENT EXECUTE FUNCTION painel_notificar_clientes();
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE 'trg_painel_%' AND NOT tgisinternal) <> 5 THEN
+        RAISE EXCEPTION 'Triggers do painel ao vivo não foram criadas corretamente';
+    END IF;
+END $$;
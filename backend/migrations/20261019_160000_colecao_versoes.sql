@@ -0,0 +1,55 @@
+-- Migration: Versão por coleção para GET condicional (ETag) das listagens
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Uma linha por tabela; /api/clientes/ e /api/templates/ leem só esta linha
+-- para responder 304 quando a ETag do cliente ainda é a atual
+CREATE TABLE IF NOT EXISTS colecao_versoes (
+    colecao TEXT PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 1,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Incrementada na mesma transação da escrita: a versão nova só fica visível
+-- junto com os dados. Trigger por comando: um lote de mil linhas incrementa uma vez
+CREATE OR REPLACE FUNCTION incrementar_versao_colecao()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO colecao_versoes (colecao, versao, atualizado_em)
+    VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (colecao) DO UPDATE
+    SET versao = colecao_versoes.versao + 1, atualizado_em = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_versao_clientes ON clientes;
+CREATE TRIGGER trg_versao_clientes
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON clientes
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_versao_colecao();
+
+DROP TRIGGER IF EXISTS trg_versao_message_templates ON message_templates;
+CREATE TRIGGER trg_versao_message_templates
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON message_templates
+FOR EACH STATEMENT EXECUTE FUNCTION incrementar_versao_colecao();
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.tables
+        WHERE table_name = 'colecao_versoes'
+    ) THEN
+        RAISE EXCEPTION 'Tabela colecao_versoes não foi criada corretamente';
+    END IF;
+
+    IF (SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE 'trg_versao_%' AND NOT tgisinternal) <> 2 THEN
+        RAISE EXCEPTION 'Triggers de versão das coleções não foram criadas corretamente';
+    END IF;
+END $$;
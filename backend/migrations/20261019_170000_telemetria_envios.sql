@@ -0,0 +1,43 @@
+-- Migration: Telemetria por envio (latência e status HTTP do Digisac)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Colunas anuláveis sem default: só catálogo, sem reescrever historico_envios.
+-- Envios anteriores ficam com NULL e não entram nas consultas de telemetria.
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS latencia_ms INTEGER;
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS http_status SMALLINT;
+-- Latência de cada tentativa (reenvios acrescentam ao array)
+ALTER TABLE historico_envios ADD COLUMN IF NOT EXISTS tentativas_ms INTEGER[];
+
+-- @etapa indice_telemetria sem-transacao
+-- Cobre GET /api/dashboard/telemetria (index-only scan pelo intervalo de datas)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_historico_envios_telemetria
+ON historico_envios(data_envio)
+INCLUDE (latencia_ms, http_status, status, template_usado, lote_id)
+WHERE latencia_ms IS NOT NULL;
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'historico_envios'
+        AND column_name IN ('latencia_ms', 'http_status', 'tentativas_ms')) <> 3 THEN
+        RAISE EXCEPTION 'Colunas de telemetria não foram criadas corretamente';
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = 'idx_historico_envios_telemetria' AND i.indisvalid
+    ) THEN
+        RAISE EXCEPTION 'Índice idx_historico_envios_telemetria ausente ou inválido';
+    END IF;
+END $$;
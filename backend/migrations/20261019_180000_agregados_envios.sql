@@ -0,0 +1,252 @@
+-- Migration: Agregados de desempenho por lote (campanha) e por template/dia
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Lote/campanha com contadores atualizados na mesma transação de cada envio
+CREATE TABLE IF NOT EXISTS lotes_envio (
+    lote_id TEXT PRIMARY KEY,
+    tipo TEXT,
+    template_usado TEXT,
+    criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    concluido_em TIMESTAMP,
+    total INTEGER NOT NULL DEFAULT 0,
+    pendentes INTEGER NOT NULL DEFAULT 0,
+    processando INTEGER NOT NULL DEFAULT 0,
+    enviados INTEGER NOT NULL DEFAULT 0,
+    erros INTEGER NOT NULL DEFAULT 0,
+    erros_por_classe JSONB NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_lotes_envio_criado_em ON lotes_envio(criado_em DESC);
+
+-- Uma linha por template e dia (data_envio)
+CREATE TABLE IF NOT EXISTS envios_template_dia (
+    template TEXT NOT NULL,
+    dia DATE NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    enviados INTEGER NOT NULL DEFAULT 0,
+    erros INTEGER NOT NULL DEFAULT 0,
+    erros_por_classe JSONB NOT NULL DEFAULT '{}',
+    atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (template, dia)
+);
+CREATE INDEX IF NOT EXISTS idx_envios_template_dia_dia ON envios_template_dia(dia);
+
+-- Soma contadores em JSONB ({"timeout": 3} + {"timeout": -1, "http_5xx": 2}), sem zeros
+CREATE OR REPLACE FUNCTION somar_contadores(a JSONB, b JSONB)
+RETURNS JSONB LANGUAGE sql IMMUTABLE AS $$
+    SELECT COALESCE(jsonb_object_agg(chave, total), '{}'::JSONB)
+    FROM (
+        SELECT chave, SUM(valor::BIGINT) AS total
+        FROM (
+            SELECT * FROM jsonb_each_text(COALESCE(a, '{}'::JSONB))
+            UNION ALL
+            SELECT * FROM jsonb_each_text(COALESCE(b, '{}'::JSONB))
+        ) c(chave, valor)
+        GROUP BY chave
+        HAVING SUM(valor::BIGINT) <> 0
+    ) s
+$$;
+
+-- Deltas por comando (tabelas de transição): +1 no estado novo, -1 no antigo
+CREATE OR REPLACE FUNCTION acumular_agregados_envios()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    mudancas JSONB;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT tipo, lote_id, COALESCE(template_usado, '(mensagem avulsa)') AS template,
+                   data_envio::DATE AS dia, status, COALESCE(erro_classe, 'desconhecido') AS erro_classe,
+                   COUNT(*) AS n
+            FROM novas GROUP BY 1, 2, 3, 4, 5, 6
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT tipo, lote_id, COALESCE(template_usado, '(mensagem avulsa)') AS template,
+                   data_envio::DATE AS dia, status, COALESCE(erro_classe, 'desconhecido') AS erro_classe,
+                   -COUNT(*) AS n
+            FROM antigas GROUP BY 1, 2, 3, 4, 5, 6
+        ) d;
+    ELSE
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT v.tipo, v.lote_id, v.template, v.dia, v.status, v.erro_classe, SUM(v.sinal) AS n
+            FROM novas n
+            JOIN antigas a ON a.id = n.id
+            CROSS JOIN LATERAL (VALUES
+                (1, n.tipo, n.lote_id, COALESCE(n.template_usado, '(mensagem avulsa)'), n.data_envio::DATE,
+                 n.status, COALESCE(n.erro_classe, 'desconhecido')),
+                (-1, a.tipo, a.lote_id, COALESCE(a.template_usado, '(mensagem avulsa)'), a.data_envio::DATE,
+                 a.status, COALESCE(a.erro_classe, 'desconhecido'))
+            ) AS v(sinal, tipo, lote_id, template, dia, status, erro_classe)
+            -- Webhooks de entrega e reivindicações sem mudança de status não geram escrita
+            WHERE (n.status, n.erro_classe, n.lote_id, n.template_usado, n.data_envio::DATE)
+                  IS DISTINCT FROM (a.status, a.erro_classe, a.lote_id, a.template_usado, a.data_envio::DATE)
+            GROUP BY 1, 2, 3, 4, 5, 6
+            HAVING SUM(v.sinal) <> 0
+        ) d;
+    END IF;
+
+    IF mudancas IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH m AS (
+        SELECT * FROM jsonb_to_recordset(mudancas)
+        AS x(tipo TEXT, lote_id TEXT, template TEXT, dia DATE, status TEXT, erro_classe TEXT, n BIGINT)
+        WHERE lote_id IS NOT NULL
+    ),
+    classes AS (
+        SELECT lote_id, jsonb_object_agg(erro_classe, n) AS erros_por_classe
+        FROM (SELECT lote_id, erro_classe, SUM(n) AS n FROM m WHERE status = 'erro'
+              GROUP BY 1, 2 HAVING SUM(n) <> 0) c
+        GROUP BY lote_id
+    )
+    INSERT INTO lotes_envio AS l
+        (lote_id, tipo, template_usado, total, pendentes, processando, enviados, erros,
+         erros_por_classe, concluido_em)
+    SELECT d.lote_id, d.tipo, d.template, d.total, d.pendentes, d.processando, d.enviados, d.erros,
+           COALESCE(c.erros_por_classe, '{}'::JSONB),
+           CASE WHEN d.pendentes + d.processando = 0 THEN CURRENT_TIMESTAMP END
+    FROM (
+        SELECT lote_id, MIN(tipo) AS tipo, MIN(template) AS template, SUM(n) AS total,
+               COALESCE(SUM(n) FILTER (WHERE status = 'pendente'), 0) AS pendentes,
+               COALESCE(SUM(n) FILTER (WHERE status = 'processando'), 0) AS processando,
+               COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0) AS enviados,
+               COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0) AS erros
+        FROM m GROUP BY lote_id
+    ) d
+    LEFT JOIN classes c USING (lote_id)
+    ORDER BY d.lote_id
+    ON CONFLICT (lote_id) DO UPDATE SET
+        total = l.total + EXCLUDED.total,
+        pendentes = l.pendentes + EXCLUDED.pendentes,
+        processando = l.processando + EXCLUDED.processando,
+        enviados = l.enviados + EXCLUDED.enviados,
+        erros = l.erros + EXCLUDED.erros,
+        erros_por_classe = somar_contadores(l.erros_por_classe, EXCLUDED.erros_por_classe),
+        atualizado_em = CURRENT_TIMESTAMP,
+        concluido_em = CASE
+            WHEN l.pendentes + EXCLUDED.pendentes + l.processando + EXCLUDED.processando = 0
+            THEN COALESCE(l.concluido_em, CURRENT_TIMESTAMP)
+        END;
+
+    -- Por template e dia: só interessam volume e resultado (pendente <-> processando não conta)
+    WITH m AS (
+        SELECT * FROM jsonb_to_recordset(mudancas)
+        AS x(template TEXT, dia DATE, status TEXT, erro_classe TEXT, n BIGINT)
+        WHERE dia IS NOT NULL
+    ),
+    classes AS (
+        SELECT template, dia, jsonb_object_agg(erro_classe, n) AS erros_por_classe
+        FROM (SELECT template, dia, erro_classe, SUM(n) AS n FROM m WHERE status = 'erro'
+              GROUP BY 1, 2, 3 HAVING SUM(n) <> 0) c
+        GROUP BY template, dia
+    )
+    INSERT INTO envios_template_dia AS e (template, dia, total, enviados, erros, erros_por_classe)
+    SELECT d.template, d.dia, d.total, d.enviados, d.erros, COALESCE(c.erros_por_classe, '{}'::JSONB)
+    FROM (
+        SELECT template, dia, SUM(n) AS total,
+               COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0) AS enviados,
+               COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0) AS erros
+        FROM m GROUP BY template, dia
+        HAVING SUM(n) <> 0 OR bool_or(status IN ('enviado', 'erro'))
+    ) d
+    LEFT JOIN classes c USING (template, dia)
+    ORDER BY d.template, d.dia
+    ON CONFLICT (template, dia) DO UPDATE SET
+        total = e.total + EXCLUDED.total,
+        enviados = e.enviados + EXCLUDED.enviados,
+        erros = e.erros + EXCLUDED.erros,
+        erros_por_classe = somar_contadores(e.erros_por_classe, EXCLUDED.erros_por_classe),
+        atualizado_em = CURRENT_TIMESTAMP;
+
+    RETURN NULL;
+END
+$$;
+
+-- @etapa triggers_e_carga
+-- Bloqueia escritas em historico_envios só durante a carga (uma passada agregada):
+-- nenhum envio fica fora da carga inicial nem é contado duas vezes pelos triggers.
+-- Rodar de novo recalcula tudo a partir do histórico.
+LOCK TABLE historico_envios IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_agregados_envios_insert ON historico_envios;
+DROP TRIGGER IF EXISTS trg_agregados_envios_update ON historico_envios;
+DROP TRIGGER IF EXISTS trg_agregados_envios_delete ON historico_envios;
+
+CREATE TRIGGER trg_agregados_envios_insert AFTER INSERT ON historico_envios
+REFERENCING NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_agregados_envios();
+
+CREATE TRIGGER trg_agregados_envios_update AFTER UPDATE ON historico_envios
+REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_agregados_envios();
+
+CREATE TRIGGER trg_agregados_envios_delete AFTER DELETE ON historico_envios
+REFERENCING OLD TABLE AS antigas
+FOR EACH STATEMENT EXECUTE FUNCTION acumular_agregados_envios();
+
+TRUNCATE lotes_envio, envios_template_dia;
+
+INSERT INTO lotes_envio
+    (lote_id, tipo, template_usado, criado_em, atualizado_em, concluido_em,
+     total, pendentes, processando, enviados, erros, erros_por_classe)
+SELECT lote_id, MIN(tipo), MIN(template), MIN(primeiro), MAX(ultimo),
+       CASE WHEN bool_and(status NOT IN ('pendente', 'processando')) THEN MAX(ultimo) END,
+       SUM(n),
+       COALESCE(SUM(n) FILTER (WHERE status = 'pendente'), 0),
+       COALESCE(SUM(n) FILTER (WHERE status = 'processando'), 0),
+       COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0),
+       COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0),
+       COALESCE(jsonb_object_agg(erro_classe, n) FILTER (WHERE status = 'erro'), '{}')
+FROM (
+    SELECT lote_id, status, COALESCE(erro_classe, 'desconhecido') AS erro_classe,
+           MIN(tipo) AS tipo, MIN(COALESCE(template_usado, '(mensagem avulsa)')) AS template,
+           MIN(data_envio) AS primeiro, MAX(data_envio) AS ultimo, COUNT(*) AS n
+    FROM historico_envios
+    WHERE lote_id IS NOT NULL
+    GROUP BY 1, 2, 3
+) g
+GROUP BY lote_id;
+
+INSERT INTO envios_template_dia (template, dia, total, enviados, erros, erros_por_classe)
+SELECT template, dia, SUM(n),
+       COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0),
+       COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0),
+       COALESCE(jsonb_object_agg(erro_classe, n) FILTER (WHERE status = 'erro'), '{}')
+FROM (
+    SELECT COALESCE(template_usado, '(mensagem avulsa)') AS template, data_envio::DATE AS dia,
+           status, COALESCE(erro_classe, 'desconhecido') AS erro_classe, COUNT(*) AS n
+    FROM historico_envios
+    WHERE data_envio IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+) g
+GROUP BY template, dia;
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+-- @etapa verificacao
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM pg_trigger
+        WHERE tgname IN ('trg_agregados_envios_insert', 'trg_agregados_envios_update',
+                         'trg_agregados_envios_delete')) <> 3 THEN
+        RAISE EXCEPTION 'Triggers de agregados de envios não foram criados corretamente';
+    END IF;
+
+    IF somar_contadores('{"timeout": 3}', '{"timeout": -3, "http_5xx": 2}') IS DISTINCT FROM '{"http_5xx": 2}'::JSONB THEN
+        RAISE EXCEPTION 'somar_contadores não soma os contadores esperados';
+    END IF;
+
+    IF (SELECT COALESCE(SUM(total), 0) FROM lotes_envio)
+       <> (SELECT COUNT(*) FROM historico_envios WHERE lote_id IS NOT NULL) THEN
+        RAISE EXCEPTION 'Contadores de lotes_envio divergem do histórico';
+    END IF;
+END $$;
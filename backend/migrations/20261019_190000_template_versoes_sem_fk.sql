@@ -0,0 +1,38 @@
+-- Migration: Versões de template sobrevivem ao template (histórico compacto)
+-- Created: 2026-10-19
+
+-- ============================================
+-- UP - Aplicar mudanças
+-- ============================================
+
+-- Com ON DELETE CASCADE em template_versoes.template_id, excluir um template tentava
+-- apagar versões referenciadas por historico_envios.template_versao_id e falhava por FK.
+-- ON DELETE SET NULL colidiria em idx_template_versoes_hash com a versão avulsa de
+-- mesmo texto; a versão guarda o id original (SERIAL não reutiliza ids) e fica sem FK.
+DO $$
+DECLARE
+    restricao TEXT;
+BEGIN
+    FOR restricao IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'template_versoes'::regclass
+        AND confrelid = 'message_templates'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE template_versoes DROP CONSTRAINT %I', restricao);
+    END LOOP;
+END $$;
+
+-- ============================================
+-- Verificação
+-- ============================================
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'template_versoes'::regclass
+        AND confrelid = 'message_templates'::regclass
+    ) THEN
+        RAISE EXCEPTION 'template_versoes ainda referencia message_templates';
+    END IF;
+END $$;
@@ -1,17 +1,113 @@
 import os
+import re
+import time
 import psycopg2
 from pathlib import Path
+from typing import List, NamedTuple
 import sys
 
 sys.path.insert(0, '/app/src')
 from core.config import POSTGRES_CONNECTION_STRING
 
+# Espera máxima por locks de tabela antes de desistir (e tentar de novo) da etapa:
+# um ALTER TABLE na fila de locks bloqueia todas as queries que chegam depois dele
+MIGRACAO_LOCK_TIMEOUT = os.getenv('MIGRACAO_LOCK_TIMEOUT', '5s')
+MIGRACAO_STATEMENT_TIMEOUT = os.getenv('MIGRACAO_STATEMENT_TIMEOUT', '15min')
+# Etapas sem transação (CREATE INDEX CONCURRENTLY) podem levar horas em tabelas grandes
+MIGRACAO_STATEMENT_TIMEOUT_SEM_TRANSACAO = os.getenv('MIGRACAO_STATEMENT_TIMEOUT_SEM_TRANSACAO', '0')
+MIGRACAO_TENTATIVAS_LOCK = int(os.getenv('MIGRACAO_TENTATIVAS_LOCK', '3'))
+# Quanto esperar por outro processo que esteja migrando (advisory lock)
+MIGRACAO_ESPERA_S = int(os.getenv('MIGRACAO_ESPERA_S', '600'))
+
+# Chave do advisory lock que serializa runners (containers subindo juntos)
+CHAVE_LOCK = "hashtext('schema_migrations')"
+
+# "-- @etapa <nome>" inicia uma etapa; "-- @etapa <nome> sem-transacao" roda fora de transação
+RE_ETAPA = re.compile(r'^--\s*@etapa\s+(\S+)(\s+sem-transacao)?\s*$', re.MULTILINE)
+RE_INDICE_CONCORRENTE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?("?[\w.]+"?)', re.IGNORECASE
+)
+LOCK_NAO_DISPONIVEL = '55P03'
+
+
+class Etapa(NamedTuple):
+    nome: str
+    sql: str
+    transacional: bool
+
+
+def dividir_etapas(sql: str) -> List[Etapa]:
+    """
+    Divide o arquivo em etapas pelas diretivas "-- @etapa". Sem diretivas, o
+    arquivo inteiro é uma etapa transacional (comportamento original).
+    """
+    marcas = list(RE_ETAPA.finditer(sql))
+    etapas = []
+
+    inicial = sql[:marcas[0].start()] if marcas else sql
+    if _tem_comandos(inicial):
+        etapas.append(Etapa('principal', inicial, True))
+
+    for i, marca in enumerate(marcas):
+        fim = marcas[i + 1].start() if i + 1 < len(marcas) else len(sql)
+        corpo = sql[marca.end():fim]
+        if _tem_comandos(corpo):
+            etapas.append(Etapa(marca.group(1), corpo, not marca.group(2)))
+    return etapas
+
+
+def dividir_comandos(sql: str) -> List[str]:
+    """Separa comandos por ';' respeitando strings, $$ e comentários de linha"""
+    comandos, atual = [], []
+    i, n = 0, len(sql)
+    aspas = dolar = None
+    while i < n:
+        c = sql[i]
+        if dolar:
+            if sql.startswith(dolar, i):
+                atual.append(dolar)
+                i += len(dolar)
+                dolar = None
+                continue
+        elif aspas:
+            if c == "'":
+                aspas = None
+        elif c == "'":
+            aspas = c
+        elif c == '$':
+            tag = re.match(r'\$\w*\$', sql[i:])
+            if tag:
+                dolar = tag.group(0)
+                atual.append(dolar)
+                i += len(dolar)
+                continue
+        elif sql.startswith('--', i):
+            fim = sql.find('\n', i)
+            fim = n if fim == -1 else fim
+            atual.append(sql[i:fim])
+            i = fim
+            continue
+        elif c == ';':
+            comandos.append(''.join(atual))
+            atual = []
+            i += 1
+            continue
+        atual.append(c)
+        i += 1
+    comandos.append(''.join(atual))
+    return [comando.strip() for comando in comandos if _tem_comandos(comando)]
+
+
+def _tem_comandos(sql: str) -> bool:
+    return any(linha.strip() and not linha.strip().startswith('--') for linha in sql.splitlines())
+
+
 class MigrationManager:
     def __init__(self):
         self.conn = psycopg2.connect(POSTGRES_CONNECTION_STRING)
         self.migrations_dir = Path(__file__).parent
         self._ensure_migrations_table()
-    
+
     def _ensure_migrations_table(self):
         """Cria tabela para controlar migrations aplicadas"""
         with self.conn.cursor() as cursor:
@@ -22,14 +118,15 @@ class MigrationManager:
                     applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            cursor.execute('ALTER TABLE schema_migrations ADD COLUMN IF NOT EXISTS duracao_ms INTEGER')
             self.conn.commit()
-    
+
     def get_applied_migrations(self):
         """Retorna lista de migrations já aplicadas"""
         with self.conn.cursor() as cursor:
             cursor.execute('SELECT filename FROM schema_migrations ORDER BY filename')
             return [row[0] for row in cursor.fetchall()]
-    
+
     def get_pending_migrations(self):
         """Retorna migrations pendentes"""
         applied = set(self.get_applied_migrations())
@@ -38,75 +135,199 @@ class MigrationManager:
             if f.name != 'template.sql'
         ])
         return [m for m in all_migrations if m not in applied]
-    
+
     def apply_migration(self, filename):
-        """Aplica uma migration"""
+        """
+        Aplica uma migration, etapa por etapa.
+
+        Etapas transacionais fazem commit ao final de cada uma; etapas
+        sem-transacao rodam comando a comando em autocommit. A migration só
+        é registrada depois da última etapa, então as etapas precisam ser
+        idempotentes (IF NOT EXISTS) para uma nova execução após falha.
+        """
         filepath = self.migrations_dir / filename
-        
+
         print(f"[MIGRATION] Aplicando: {filename}")
-        
+
         with open(filepath, 'r', encoding='utf-8') as f:
             sql = f.read()
-        
+
+        etapas = dividir_etapas(sql)
+        # Com a última etapa transacional, o registro entra no mesmo commit dela
+        registrar_na_ultima = bool(etapas) and etapas[-1].transacional
+        inicio = time.monotonic()
+
         try:
+            for numero, etapa in enumerate(etapas, 1):
+                self._executar_etapa(filename, etapa, numero, len(etapas),
+                                     registrar=registrar_na_ultima and numero == len(etapas))
+
+            duracao_ms = int((time.monotonic() - inicio) * 1000)
             with self.conn.cursor() as cursor:
-                cursor.execute(sql)
-                
-                cursor.execute(
-                    'INSERT INTO schema_migrations (filename) VALUES (%s)',
-                    (filename,)
-                )
-                
-                self.conn.commit()
-                print(f"[SUCCESS] Migration {filename} aplicada com sucesso!")
-                
+                if registrar_na_ultima:
+                    cursor.execute(
+                        'UPDATE schema_migrations SET duracao_ms = %s WHERE filename = %s',
+                        (duracao_ms, filename)
+                    )
+                else:
+                    self._registrar(filename, duracao_ms, cursor)
+            self.conn.commit()
+            print(f"[SUCCESS] Migration {filename} aplicada com sucesso! ({duracao_ms / 1000:.2f}s)")
+
         except Exception as e:
             self.conn.rollback()
             print(f"[ERROR] Erro ao aplicar migration {filename}: {e}")
             raise
-    
+
+    def _executar_etapa(self, filename, etapa: Etapa, numero: int, total: int, registrar: bool):
+        """Executa a etapa com lock_timeout, repetindo quando o lock não sai a tempo"""
+        modo = 'transacional' if etapa.transacional else 'sem transação'
+
+        for tentativa in range(1, MIGRACAO_TENTATIVAS_LOCK + 1):
+            inicio = time.monotonic()
+            try:
+                if etapa.transacional:
+                    self._executar_transacional(filename, etapa, registrar)
+                else:
+                    self._executar_sem_transacao(etapa)
+                print(f"  [ETAPA {numero}/{total}] {etapa.nome} ({modo}): {time.monotonic() - inicio:.2f}s")
+                return
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                if not etapa.transacional:
+                    self._remover_indices_invalidos(etapa)
+                if e.pgcode != LOCK_NAO_DISPONIVEL or tentativa == MIGRACAO_TENTATIVAS_LOCK:
+                    print(f"  [ETAPA {numero}/{total}] {etapa.nome} falhou após {time.monotonic() - inicio:.2f}s")
+                    raise
+                espera = 2 ** tentativa
+                print(f"  [ETAPA {numero}/{total}] {etapa.nome}: lock indisponível em {MIGRACAO_LOCK_TIMEOUT}, "
+                      f"nova tentativa em {espera}s ({tentativa}/{MIGRACAO_TENTATIVAS_LOCK})")
+                time.sleep(espera)
+            finally:
+                self.conn.autocommit = False
+
+    def _executar_transacional(self, filename, etapa: Etapa, registrar: bool):
+        with self.conn.cursor() as cursor:
+            cursor.execute('SET LOCAL lock_timeout = %s', (MIGRACAO_LOCK_TIMEOUT,))
+            cursor.execute('SET LOCAL statement_timeout = %s', (MIGRACAO_STATEMENT_TIMEOUT,))
+            cursor.execute(etapa.sql)
+            if registrar:
+                self._registrar(filename, None, cursor)
+        self.conn.commit()
+
+    def _executar_sem_transacao(self, etapa: Etapa):
+        """Um comando por vez: CREATE INDEX CONCURRENTLY não roda em bloco de transação"""
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute('SET lock_timeout = %s', (MIGRACAO_LOCK_TIMEOUT,))
+            cursor.execute('SET statement_timeout = %s', (MIGRACAO_STATEMENT_TIMEOUT_SEM_TRANSACAO,))
+            try:
+                for comando in dividir_comandos(etapa.sql):
+                    cursor.execute(comando)
+            finally:
+                cursor.execute('RESET lock_timeout')
+                cursor.execute('RESET statement_timeout')
+
+    def _remover_indices_invalidos(self, etapa: Etapa):
+        """
+        CREATE INDEX CONCURRENTLY interrompido deixa um índice INVALID que o
+        IF NOT EXISTS da próxima execução pularia: remove os desta etapa.
+        """
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            for nome in RE_INDICE_CONCORRENTE.findall(etapa.sql):
+                cursor.execute('''
+                    SELECT 1 FROM pg_index
+                    WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+                ''', (nome,))
+                if cursor.fetchone():
+                    print(f"  [INFO] Removendo índice inválido {nome}")
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {nome}')
+
+    def _registrar(self, filename, duracao_ms, cursor):
+        cursor.execute(
+            'INSERT INTO schema_migrations (filename, duracao_ms) VALUES (%s, %s)',
+            (filename, duracao_ms)
+        )
+
+    def _adquirir_lock(self):
+        """Advisory lock de sessão: só um runner migra por vez"""
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cursor:
+                limite = time.monotonic() + MIGRACAO_ESPERA_S
+                while True:
+                    cursor.execute(f'SELECT pg_try_advisory_lock({CHAVE_LOCK})')
+                    if cursor.fetchone()[0]:
+                        return
+                    if time.monotonic() >= limite:
+                        raise RuntimeError(
+                            f"Outro processo está aplicando migrations há mais de {MIGRACAO_ESPERA_S}s"
+                        )
+                    print("[INFO] Outro processo está aplicando migrations; aguardando...")
+                    time.sleep(5)
+        finally:
+            self.conn.autocommit = False
+
+    def _liberar_lock(self):
+        self.conn.rollback()
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f'SELECT pg_advisory_unlock({CHAVE_LOCK})')
+        finally:
+            self.conn.autocommit = False
+
     def run_migrations(self):
         """Executa todas as migrations pendentes"""
-        pending = self.get_pending_migrations()
-        
-        if not pending:
-            print("[INFO] Nenhuma migration pendente. Banco de dados está atualizado!")
-            return
-        
-        print(f"\n[INFO] Encontradas {len(pending)} migration(s) pendente(s):\n")
-        for m in pending:
-            print(f"  - {m}")
-        print()
-        
-        for migration in pending:
-            self.apply_migration(migration)
-        
-        print(f"\n[SUCCESS] Todas as {len(pending)} migration(s) foram aplicadas com sucesso!")
-    
+        self._adquirir_lock()
+        try:
+            # Recalcula depois do lock: outro container pode ter acabado de aplicar
+            pending = self.get_pending_migrations()
+            self.conn.commit()
+
+            if not pending:
+                print("[INFO] Nenhuma migration pendente. Banco de dados está atualizado!")
+                return
+
+            print(f"\n[INFO] Encontradas {len(pending)} migration(s) pendente(s):\n")
+            for m in pending:
+                print(f"  - {m}")
+            print()
+
+            for migration in pending:
+                self.apply_migration(migration)
+
+            print(f"\n[SUCCESS] Todas as {len(pending)} migration(s) foram aplicadas com sucesso!")
+        finally:
+            self._liberar_lock()
+
     def status(self):
         """Mostra status das migrations"""
-        applied = self.get_applied_migrations()
+        with self.conn.cursor() as cursor:
+            cursor.execute('SELECT filename, duracao_ms FROM schema_migrations ORDER BY filename')
+            applied = cursor.fetchall()
         pending = self.get_pending_migrations()
-        
+
         print("\n[STATUS] Migrations:\n")
         print(f"Aplicadas: {len(applied)}")
-        for m in applied:
-            print(f"  - {m}")
-        
+        for m, duracao_ms in applied:
+            print(f"  - {m}" + (f" ({duracao_ms / 1000:.2f}s)" if duracao_ms is not None else ""))
+
         print(f"\nPendentes: {len(pending)}")
         for m in pending:
             print(f"  - {m}")
         print()
-    
+
     def close(self):
         """Fecha conexão"""
         self.conn.close()
 
 if __name__ == '__main__':
     import sys
-    
+
     manager = MigrationManager()
-    
+
     try:
         if len(sys.argv) > 1 and sys.argv[1] == 'status':
             manager.status()
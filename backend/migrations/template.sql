@@ -7,6 +7,18 @@
 -- ============================================
 
 -- Adicione aqui as mudanças no schema
+--
+-- Sem diretivas, o arquivo roda em uma única transação. Para dividir em etapas
+-- (cada uma com o próprio commit e tempo reportado), use:
+--
+--   -- @etapa <nome>
+--   -- @etapa <nome> sem-transacao
+--
+-- Etapas sem-transacao rodam comando a comando fora de transação, como exigido
+-- por CREATE INDEX CONCURRENTLY (não bloqueia escritas na tabela). Não use
+-- CREATE INDEX simples em tabelas grandes (historico_envios, clientes).
+-- As etapas devem ser idempotentes (IF NOT EXISTS): se uma falhar, a migration
+-- inteira roda de novo na próxima execução.
 
 
 -- ============================================
@@ -7,7 +7,7 @@ Uso: python scripts/adicionar_cliente.py
 import sys
 import os
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
 
 from core.database import DatabaseManager
 
@@ -154,8 +154,8 @@ def adicionar_cliente_lote():
 
 
 def importar_csv():
-    """Importa clientes de um arquivo CSV"""
-    import csv
+    """Importa clientes de um arquivo CSV (COPY em massa, ver importar_clientes_csv.py)"""
+    from services.importador import ImportadorClientes, ImportacaoInvalidaError
     
     print("IMPORTAR CLIENTES DE CSV")
     print()
@@ -167,67 +167,45 @@ def importar_csv():
     
     print()
     print("Formato esperado do CSV:")
-    print("nome,telefone,email,ativo,inadimplente,observacoes")
+    print("nome,digisac_contact_id,telefone,email,status,tags")
+    print("(sem digisac_contact_id, atualiza o cliente com o mesmo telefone)")
     print()
     
     confirma = input("Continuar? (S/n): ").strip().lower()
     if confirma == 'n':
         return
     
+    db = DatabaseManager()
+    importador = ImportadorClientes(db)
     try:
-        with open(arquivo, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            clientes = []
-            
-            for row in reader:
-                clientes.append({
-                    'nome': row.get('nome', '').strip(),
-                    'telefone': row.get('telefone', '').strip(),
-                    'email': row.get('email', '').strip() or None,
-                    'ativo': row.get('ativo', 's').strip().lower() == 's',
-                    'inadimplente': row.get('inadimplente', 'n').strip().lower() == 's',
-                    'observacoes': row.get('observacoes', '').strip() or None
-                })
-        
-        if not clientes:
-            print(" Nenhum cliente encontrado no CSV!")
-            return
+        # Primeiro só valida; nada é gravado até a confirmação
+        with open(arquivo, 'rb') as f:
+            validacao = importador.importar(f, aplicar=False)
         
         print()
-        print(f" {len(clientes)} clientes encontrados no arquivo")
+        print(f" {validacao['linhas']} clientes encontrados no arquivo, {validacao['erros']} com erro")
+        for erro in validacao['relatorio'][:20]:
+            print(f"[ERRO] Linha {erro['linha']}: {erro['erro']}")
         print()
         
-        confirma = input("Importar todos? (S/n): ").strip().lower()
+        confirma = input("Importar os registros válidos? (S/n): ").strip().lower()
         if confirma == 'n':
             print("[ERRO] Importação cancelada!")
             return
         
-        db = DatabaseManager()
-        sucesso = 0
-        erros = 0
-        
-        print()
-        print("Processando...")
-        for c in clientes:
-            if not c['nome'] or not c['telefone']:
-                erros += 1
-                print(f"[ERRO] Registro inválido: {c}")
-                continue
-            
-            try:
-                db.inserir_cliente(**c)
-                sucesso += 1
-                print(f"[SUCCESS] {c['nome']}")
-            except Exception as e:
-                erros += 1
-                print(f"[ERRO] {c['nome']}: {e}")
+        with open(arquivo, 'rb') as f:
+            resultado = importador.importar(f)
         
         print()
-        print(f"[SUCCESS] Importados: {sucesso}")
-        print(f"[ERRO]: {erros}")
+        print(f"[SUCCESS] Inseridos: {resultado['inseridos']}, atualizados: {resultado['atualizados']}")
+        print(f"[ERRO]: {resultado['erros']}")
         
-    except Exception as e:
+    except ImportacaoInvalidaError as e:
         print(f" Erro ao ler CSV: {e}")
+    except Exception as e:
+        print(f" Erro ao importar CSV: {e}")
+    finally:
+        db.close_pool()
 
 
 def listar_clientes():
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Detecta e mescla clientes duplicados pelo telefone normalizado (E.164)
+
+Sem --aplicar apenas lista os grupos encontrados. Com --aplicar, cada grupo
+é mesclado no sobrevivente (ativo primeiro, depois o mais antigo): o
+histórico de envios é reapontado e os duplicados são removidos, tudo em
+uma única transação.
+
+Uso:
+    python backend/scripts/deduplicar_clientes.py
+    python backend/scripts/deduplicar_clientes.py --aplicar
+    python backend/scripts/deduplicar_clientes.py --aplicar --indice-unico
+"""
+
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from core.database import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicação de clientes por telefone')
+    parser.add_argument('--aplicar', action='store_true', help='Mescla os duplicados (padrão: só lista)')
+    parser.add_argument('--indice-unico', action='store_true',
+                        help='Depois de mesclar, cria índice único em telefone_e164 para impedir novos duplicados')
+    parser.add_argument('--amostra', type=int, default=20, help='Grupos listados como exemplo')
+    args = parser.parse_args()
+
+    if args.indice_unico and not args.aplicar:
+        parser.error('--indice-unico exige --aplicar')
+
+    db = DatabaseManager()
+    resultado = db.mesclar_clientes_duplicados(aplicar=args.aplicar, amostra=args.amostra)
+
+    print(f"[INFO] {resultado['grupos']} telefones com duplicados, {resultado['duplicados']} clientes a mesclar")
+    for grupo in resultado['exemplos']:
+        print(f"  {grupo['telefone_e164']}: mantém {grupo['sobrevivente_id']}, remove {grupo['duplicados']}")
+
+    if resultado['aplicado']:
+        print(f"[SUCCESS] {resultado['duplicados']} clientes mesclados, "
+              f"{resultado['envios_reapontados']} envios reapontados")
+    elif not args.aplicar and resultado['duplicados']:
+        print("[INFO] Nada alterado. Rode com --aplicar para mesclar.")
+
+    if args.indice_unico:
+        db.criar_indice_telefone_unico()
+        print("[SUCCESS] Índice único idx_clientes_telefone_e164_unico criado")
+
+    db.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Exporta histórico de envios ou clientes em CSV, NDJSON ou Parquet
+
+Usa cursor server-side com fetch size fixo, então a memória fica
+constante mesmo para milhões de linhas.
+
+Uso:
+    python backend/scripts/exportar.py historico --formato csv --saida historico.csv
+    python backend/scripts/exportar.py historico --inicio 2025-01-01 --fim 2025-02-01 --formato ndjson
+    python backend/scripts/exportar.py clientes --formato parquet --saida clientes.parquet
+"""
+
+import argparse
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from core.database import DatabaseManager
+from services.exportador import Exportador
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exportação em streaming')
+    parser.add_argument('recurso', choices=['historico', 'clientes'])
+    parser.add_argument('--formato', choices=['csv', 'ndjson', 'parquet'], default='csv')
+    parser.add_argument('--saida', default=None, help='Arquivo de saída (padrão: stdout; obrigatório para parquet)')
+    parser.add_argument('--inicio', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--fim', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--status', default=None)
+    parser.add_argument('--tipo', default=None)
+    parser.add_argument('--fetch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.recurso == 'historico':
+        filtros = {'inicio': args.inicio, 'fim': args.fim, 'status': args.status, 'tipo': args.tipo}
+    else:
+        filtros = {'status': args.status}
+
+    db = DatabaseManager()
+    exportador = Exportador(db, fetch_size=args.fetch_size)
+
+    try:
+        if args.formato == 'parquet':
+            if not args.saida:
+                parser.error('--saida é obrigatório para parquet')
+            total = exportador.parquet(args.recurso, args.saida, **filtros)
+            print(f"[SUCCESS] {total} linhas exportadas para {args.saida}", file=sys.stderr)
+            return
+
+        destino = open(args.saida, 'wb') if args.saida else sys.stdout.buffer
+        try:
+            for bloco in exportador.gerar(args.recurso, args.formato, **filtros):
+                destino.write(bloco)
+        finally:
+            if args.saida:
+                destino.close()
+
+        if args.saida:
+            print(f"[SUCCESS] Exportação gravada em {args.saida}", file=sys.stderr)
+    finally:
+        db.close_pool()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n[INFO] Interrompido pelo usuário.", file=sys.stderr)
+    except Exception as e:
+        print(f"\n[ERRO] {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Gera datasets sintéticos para testes de escala
+
+Popula clientes, message_templates e historico_envios via COPY, com
+distribuição controlável (mix de status e tipos, tamanho do histórico
+por cliente) e seed fixa para reprodutibilidade.
+
+Uso:
+    python backend/scripts/gerar_dataset.py --clientes 100000 --historico-medio 30 --anos 3
+    python backend/scripts/gerar_dataset.py --dsn postgresql://... --limpar
+
+Também é usado por backend/benchmarks/run_benchmarks.py (--gerar-dataset) e
+para popular um banco descartável antes de rodar backend/migrations/migrate.py.
+"""
+
+import argparse
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from core.database import DatabaseManager
+
+PREFIXO_CONTATO = 'synth-'
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+         'Isabela', 'João', 'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Olívia', 'Paulo',
+         'Rafaela', 'Sérgio', 'Tatiana', 'Vinícius']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa',
+              'Ferreira', 'Almeida', 'Ribeiro', 'Carvalho', 'Gomes', 'Martins', 'Araújo']
+RAMOS = ['Comércio', 'Serviços', 'Transportes', 'Tecnologia', 'Alimentos', 'Consultoria']
+
+ERROS = ['Falha no envio via API Digisac', 'Timeout na requisição', 'Contato inválido']
+
+
+def parse_mix(texto: str) -> Dict[str, float]:
+    """Converte 'enviado=0.9,erro=0.08' em pesos normalizados"""
+    pesos = {}
+    for parte in texto.split(','):
+        chave, _, valor = parte.partition('=')
+        pesos[chave.strip()] = float(valor)
+    total = sum(pesos.values())
+    return {k: v / total for k, v in pesos.items()}
+
+
+def nome_cliente(cliente_id: int) -> str:
+    """Nome determinístico a partir do ID, usado no cadastro e nas mensagens"""
+    return (f"{NOMES[cliente_id % len(NOMES)]} "
+            f"{SOBRENOMES[(cliente_id // len(NOMES)) % len(SOBRENOMES)]} "
+            f"{RAMOS[cliente_id % len(RAMOS)]} {cliente_id}")
+
+
+def _escapar(valor) -> str:
+    """Escapa valor no formato texto do COPY"""
+    if valor is None:
+        return '\\N'
+    texto = str(valor)
+    return (texto.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
+class LinhasCopy:
+    """Adapta um iterador de tuplas a um arquivo lido pelo copy_expert"""
+
+    def __init__(self, linhas: Iterator[tuple]):
+        self.linhas = linhas
+        self.buffer = ''
+        self.total = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            try:
+                linha = next(self.linhas)
+            except StopIteration:
+                break
+            self.buffer += '\t'.join(_escapar(v) for v in linha) + '\n'
+            self.total += 1
+        if size < 0:
+            dados, self.buffer = self.buffer, ''
+        else:
+            dados, self.buffer = self.buffer[:size], self.buffer[size:]
+        return dados
+
+
+class GeradorDataset:
+    def __init__(self, db: DatabaseManager, seed: int = 42):
+        self.db = db
+        self.random = random.Random(seed)
+
+    def limpar(self):
+        """Remove dados sintéticos anteriores (clientes com prefixo e seus históricos)"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM clientes WHERE digisac_contact_id LIKE %s',
+                           (PREFIXO_CONTATO + '%',))
+            cursor.execute('DELETE FROM message_templates WHERE nome LIKE %s', ('Sintético %',))
+
+    def _copy(self, tabela: str, colunas: List[str], linhas: Iterator[tuple]) -> int:
+        fonte = LinhasCopy(linhas)
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.copy_expert(
+                f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN",
+                fonte,
+                size=1 << 16
+            )
+        return fonte.total
+
+    def _proximo_id(self, tabela: str) -> int:
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}')
+            return cursor.fetchone()[0]
+
+    def _ajustar_sequence(self, tabela: str):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {tabela}))"
+            )
+
+    def gerar_templates(self, quantidade: int, tipo_mix: Dict[str, float]) -> List[Dict[str, str]]:
+        tipos = list(tipo_mix)
+        pesos = list(tipo_mix.values())
+        templates = []
+        for i in range(quantidade):
+            tipo = self.random.choices(tipos, pesos)[0]
+            paragrafos = self.random.randint(1, 4)
+            texto = 'Olá ${nome}!\n\n' + '\n\n'.join(
+                f'Mensagem sintética {i}, parágrafo {p}: referente ao mês ${{mes_ano}}.'
+                for p in range(paragrafos)
+            ) + '\n\nAtt,\n${empresa}'
+            templates.append({'nome': f'Sintético {i:04d}', 'tipo': tipo, 'texto': texto})
+
+        self._copy('message_templates', ['nome', 'tipo', 'template_text', 'variaveis'], (
+            (t['nome'], t['tipo'], t['texto'], 'nome,mes_ano,empresa') for t in templates
+        ))
+        return templates
+
+    def gerar_clientes(self, quantidade: int, status_mix: Dict[str, float]) -> range:
+        inicio = self._proximo_id('clientes')
+        status = list(status_mix)
+        pesos = list(status_mix.values())
+        agora = datetime.now()
+
+        def linhas():
+            for i in range(quantidade):
+                cliente_id = inicio + i
+                nome = nome_cliente(cliente_id)
+                criado = agora - timedelta(days=self.random.randint(0, 1500))
+                yield (
+                    cliente_id,
+                    nome,
+                    f'{PREFIXO_CONTATO}{cliente_id}',
+                    f'55{self.random.randint(11, 99)}9{cliente_id:08d}',
+                    None,
+                    self.random.choices(status, pesos)[0],
+                    criado,
+                    criado
+                )
+
+        self._copy('clientes', ['id', 'nome', 'digisac_contact_id', 'telefone', 'email',
+                                'status', 'created_at', 'updated_at'], linhas())
+        self._ajustar_sequence('clientes')
+        return range(inicio, inicio + quantidade)
+
+    def _tamanho_historico(self, media: float, skew: float) -> int:
+        """Tamanho do histórico por cliente com cauda longa (Pareto com média ~media)"""
+        if skew <= 1:
+            return self.random.randint(0, int(2 * media))
+        valor = (self.random.paretovariate(skew) - 1) * (skew - 1) * media
+        return min(int(round(valor)), int(media * 50))
+
+    def gerar_historico(self, clientes: range, templates: List[Dict[str, str]],
+                        media: float, skew: float, anos: float,
+                        status_mix: Dict[str, float]) -> int:
+        status = list(status_mix)
+        pesos_status = list(status_mix.values())
+        # Popularidade dos templates segue Zipf: poucos templates concentram os envios
+        pesos_templates = [1 / (k + 1) for k in range(len(templates))]
+        agora = datetime.now()
+        janela = int(anos * 365 * 86400)
+
+        def linhas():
+            for cliente_id in clientes:
+                nome = nome_cliente(cliente_id)
+                for _ in range(self._tamanho_historico(media, skew)):
+                    template = self.random.choices(templates, pesos_templates)[0]
+                    st = self.random.choices(status, pesos_status)[0]
+                    data = agora - timedelta(seconds=self.random.randint(0, janela))
+                    data = data.replace(hour=self.random.choice(range(8, 19)))
+                    mensagem = (template['texto']
+                                .replace('${nome}', nome)
+                                .replace('${mes_ano}', data.strftime('%m/%Y'))
+                                .replace('${empresa}', 'Grupo INOV'))
+                    yield (
+                        cliente_id,
+                        template['tipo'],
+                        template['nome'],
+                        mensagem,
+                        st,
+                        data,
+                        1 if st != 'erro' else self.random.randint(1, 3),
+                        self.random.choice(ERROS) if st == 'erro' else None
+                    )
+
+        return self._copy('historico_envios', ['cliente_id', 'tipo', 'template_usado', 'mensagem',
+                                               'status', 'data_envio', 'tentativas', 'erro_detalhe'],
+                          linhas())
+
+    def analisar(self):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            for tabela in ('clientes', 'message_templates', 'historico_envios'):
+                cursor.execute(f'ANALYZE {tabela}')
+
+
+def gerar(dsn: Optional[str] = None, clientes: int = 100000, templates: int = 50,
+          historico_medio: float = 30, skew: float = 1.5, anos: float = 3,
+          status_envio: str = 'enviado=0.9,erro=0.08,pendente=0.02',
+          status_cliente: str = 'ativo=0.85,inativo=0.1,suspenso=0.05',
+          tipos: str = 'financeira=0.6,documento=0.3,geral=0.1',
+          seed: int = 42, limpar: bool = False) -> Dict[str, int]:
+    """Gera o dataset completo e retorna as contagens inseridas"""
+    db = DatabaseManager(dsn)
+    gerador = GeradorDataset(db, seed)
+
+    try:
+        if limpar:
+            print("[INFO] Removendo dados sintéticos anteriores...")
+            gerador.limpar()
+
+        inicio = time.perf_counter()
+        lista_templates = gerador.gerar_templates(templates, parse_mix(tipos))
+        print(f"[INFO] {len(lista_templates)} templates ({time.perf_counter() - inicio:.1f}s)")
+
+        etapa = time.perf_counter()
+        ids = gerador.gerar_clientes(clientes, parse_mix(status_cliente))
+        print(f"[INFO] {len(ids)} clientes ({time.perf_counter() - etapa:.1f}s)")
+
+        etapa = time.perf_counter()
+        total_historico = gerador.gerar_historico(
+            ids, lista_templates, historico_medio, skew, anos, parse_mix(status_envio)
+        )
+        print(f"[INFO] {total_historico} envios no histórico ({time.perf_counter() - etapa:.1f}s)")
+
+        gerador.analisar()
+        print(f"[SUCCESS] Dataset gerado em {time.perf_counter() - inicio:.1f}s")
+
+        return {
+            'templates': len(lista_templates),
+            'clientes': len(ids),
+            'historico_envios': total_historico
+        }
+    finally:
+        db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera dataset sintético para testes de escala')
+    parser.add_argument('--dsn', default=None, help='DSN do PostgreSQL (padrão: core.config)')
+    parser.add_argument('--clientes', type=int, default=100000)
+    parser.add_argument('--templates', type=int, default=50)
+    parser.add_argument('--historico-medio', type=float, default=30,
+                        help='Média de envios por cliente')
+    parser.add_argument('--skew', type=float, default=1.5,
+                        help='Cauda da distribuição de histórico por cliente (Pareto; <=1 = uniforme)')
+    parser.add_argument('--anos', type=float, default=3, help='Janela de datas do histórico')
+    parser.add_argument('--status-envio', default='enviado=0.9,erro=0.08,pendente=0.02')
+    parser.add_argument('--status-cliente', default='ativo=0.85,inativo=0.1,suspenso=0.05')
+    parser.add_argument('--tipos', default='financeira=0.6,documento=0.3,geral=0.1')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--limpar', action='store_true', help='Remove dados sintéticos anteriores')
+    args = parser.parse_args()
+
+    gerar(
+        dsn=args.dsn,
+        clientes=args.clientes,
+        templates=args.templates,
+        historico_medio=args.historico_medio,
+        skew=args.skew,
+        anos=args.anos,
+        status_envio=args.status_envio,
+        status_cliente=args.status_cliente,
+        tipos=args.tipos,
+        seed=args.seed,
+        limpar=args.limpar
+    )
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n[INFO] Interrompido pelo usuário.")
+    except Exception as e:
+        print(f"\n[ERRO] {e}")
+        sys.exit(1)
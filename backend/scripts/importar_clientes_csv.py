@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Importa clientes de um CSV em massa (COPY + validação em SQL + upsert único)
+
+O arquivo é lido em blocos direto para o COPY, então a memória fica
+constante mesmo para centenas de milhares de linhas. Colunas aceitas:
+nome, digisac_contact_id, telefone, email, status (ou ativo s/n), tags
+(separadas por '|'); separador ',' ou ';'.
+
+Uso:
+    python backend/scripts/importar_clientes_csv.py clientes.csv
+    python backend/scripts/importar_clientes_csv.py clientes.csv --validar
+    python backend/scripts/importar_clientes_csv.py clientes.csv --relatorio erros.csv
+"""
+
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from core.database import DatabaseManager
+from services.importador import ImportadorClientes, ImportacaoInvalidaError
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importação de clientes via CSV')
+    parser.add_argument('arquivo', help='Arquivo CSV (UTF-8, com cabeçalho)')
+    parser.add_argument('--validar', action='store_true', help='Só valida e gera o relatório, sem gravar')
+    parser.add_argument('--relatorio', default=None, help='Grava todas as linhas rejeitadas neste CSV')
+    parser.add_argument('--amostra', type=int, default=20, help='Erros exibidos no terminal')
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    relatorio = open(args.relatorio, 'w', encoding='utf-8', newline='') if args.relatorio else None
+
+    try:
+        with open(args.arquivo, 'rb') as arquivo:
+            resultado = ImportadorClientes(db, max_erros_relatorio=args.amostra).importar(
+                arquivo, aplicar=not args.validar, relatorio_saida=relatorio
+            )
+    except ImportacaoInvalidaError as e:
+        print(f"[ERRO] {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if relatorio:
+            relatorio.close()
+        db.close_pool()
+
+    print(f"[INFO] {resultado['linhas']} linhas lidas em {resultado['duracao_ms']} ms")
+    if resultado['colunas_ignoradas']:
+        print(f"[INFO] Colunas ignoradas: {', '.join(resultado['colunas_ignoradas'])}")
+
+    for erro in resultado['relatorio']:
+        print(f"  linha {erro['linha']}: {erro['erro']} ({erro['nome'] or erro['digisac_contact_id'] or '-'})")
+    if resultado['erros']:
+        destino = f" (todas em {args.relatorio})" if args.relatorio else ""
+        print(f"[ERRO] {resultado['erros']} linhas rejeitadas{destino}")
+
+    if resultado['aplicado']:
+        print(f"[SUCCESS] {resultado['inseridos']} inseridos, {resultado['atualizados']} atualizados, "
+              f"{resultado['inalterados']} sem alteração")
+    else:
+        print("[INFO] Nada gravado (--validar).")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n[INFO] Interrompido pelo usuário.", file=sys.stderr)
@@ -47,7 +47,11 @@ function showToast(title, message, type = 'info') {
 // Inicialização
 document.addEventListener('DOMContentLoaded', () => {
     carregarTemplates();
-    carregarDashboard();
+    if (window.EventSource) {
+        conectarPainelAoVivo();  // carrega o dashboard ao conectar
+    } else {
+        carregarDashboard();
+    }
     showToast('Sistema Pronto', 'Bem-vindo ao Sistema de Mensagens WhatsApp', 'success');
     // Render de ícones caso o script já esteja disponível
     if (window.lucide && typeof lucide.createIcons === 'function') {
@@ -108,7 +112,8 @@ function showTab(tabName) {
     
     // Carregar dados específicos
     if (tabName === 'dashboard') {
-        carregarDashboard();
+        // Com o stream conectado o painel já está atualizado
+        if (!painel.conectado) carregarDashboard();
     } else if (tabName === 'templates') {
         carregarListaTemplates();
     }
@@ -659,8 +664,23 @@ function atualizaBadgeResultadoBusca(qtd, termo) {
 }
 
     // ========== ENVIO EM LOTE ==========
+    function montarAudiencia() {
+        if (!document.getElementById('usarAudiencia').checked) return null;
+        const audiencia = {};
+        const status = document.getElementById('audiencia_status').value;
+        const tag = document.getElementById('audiencia_tag').value.trim();
+        const semContato = parseInt(document.getElementById('audiencia_sem_contato').value, 10);
+        const busca = document.getElementById('searchClientes').value.trim();
+        if (status) audiencia.status = status;
+        if (tag) audiencia.tag = tag;
+        if (semContato > 0) audiencia.sem_contato_dias = semContato;
+        if (busca) audiencia.busca = busca;
+        return audiencia;
+    }
+
     async function enviarLote() {
-        if (clientesSelecionados.size === 0) {
+        const audiencia = montarAudiencia();
+        if (!audiencia && clientesSelecionados.size === 0) {
             showToast('Atenção', 'Selecione pelo menos um cliente!', 'info');
             return;
         }
@@ -680,14 +700,16 @@ function atualizaBadgeResultadoBusca(qtd, termo) {
         if (diaVencimento) variaveisExtras.dia_vencimento = diaVencimento;
         if (dataVencimento) variaveisExtras.data_vencimento = dataVencimento;
         if (descricao) variaveisExtras.descricao = descricao;
-        if (!confirm(`Confirma envio para ${clientesSelecionados.size} cliente(s)?`)) return;
+        const destino = audiencia ? 'todos os clientes do filtro' : `${clientesSelecionados.size} cliente(s)`;
+        if (!confirm(`Confirma envio para ${destino}?`)) return;
         const resultBox = document.getElementById('resultBox');
         resultBox.innerHTML = '<div class="loading"><div class="spinner"></div><p>Enviando mensagens...</p></div>';
         resultBox.style.display = 'block';
-        showToast('Enviando', `Processando ${clientesSelecionados.size} mensagens...`, 'info');
+        showToast('Enviando', `Processando mensagens para ${destino}...`, 'info');
         try {
             const payload = {
-                clientes_ids: Array.from(clientesSelecionados),
+                clientes_ids: audiencia ? null : Array.from(clientesSelecionados),
+                audiencia: audiencia,
                 tipo: tipo,
                 mensagem_padrao: templateName ? null : (mensagemPadrao || null),
                 template_name: templateName || null,
@@ -707,12 +729,14 @@ function atualizaBadgeResultadoBusca(qtd, termo) {
                 <p><strong>Total:</strong> ${resultado.total_clientes} clientes</p>
                 <p><strong>Enviados:</strong> ${resultado.enviados}</p>
                 <p><strong>Erros:</strong> ${resultado.erros}</p>
+                ${resultado.ignorados ? `<p><strong>Ignorados (limite de frequência):</strong> ${resultado.ignorados}</p>` : ''}
+                ${resultado.adiados ? `<p><strong>Adiados (Digisac indisponível):</strong> ${resultado.adiados}</p>` : ''}
                 <hr style="margin: 15px 0; border: none; border-top: 1px solid rgba(0,0,0,0.1);">
                 <div style="max-height: 300px; overflow-y: auto;">
                     ${resultado.detalhes.map(d => `
                         <div class="result-item">
                             <strong>${d.cliente_nome}</strong>
-                            <span class="badge badge-${d.status === 'enviado' ? 'success' : 'error'}">${d.status}</span>
+                            <span class="badge badge-${d.status === 'enviado' ? 'success' : (d.status === 'ignorado' || d.status === 'pendente' ? 'warning' : 'error')}">${d.status}</span>
                             ${d.erro ? `<br><small style="color: #721c24;">Erro: ${d.erro}</small>` : ''}
                         </div>
                     `).join('')}
@@ -750,6 +774,57 @@ function limparFormulario() {
 }
 
 // ========== DASHBOARD ==========
+// Estado exibido: o stream /dashboard/eventos aplica deltas sobre ele em vez de refazer as consultas
+const painel = {
+    stats: null,
+    atividades: [],
+    filtro: { tipo: 'todos', mes: '', ano: '', limit: 10 },
+    eventos: null,
+    conectado: false
+};
+
+function renderizarStats(stats) {
+    document.getElementById('statsGrid').innerHTML = `
+        <div class="stat-card blue">
+            <div class="stat-value">${stats.total_clientes}</div>
+            <div class="stat-label">Total de Clientes</div>
+        </div>
+        <div class="stat-card green">
+            <div class="stat-value">${stats.clientes_ativos}</div>
+            <div class="stat-label">Clientes Ativos</div>
+        </div>
+        <div class="stat-card red">
+            <div class="stat-value">${stats.clientes_inadimplentes}</div>
+            <div class="stat-label">Inadimplentes</div>
+        </div>
+        <div class="stat-card orange">
+            <div class="stat-value">${stats.cobrancas_mes}</div>
+            <div class="stat-label">Cobranças este Mês</div>
+        </div>
+    `;
+}
+
+function renderizarAtividades(mensagemVazia = 'Nenhuma atividade recente') {
+    const atividadesDiv = document.getElementById('atividadesRecentes');
+    if (painel.atividades.length > 0) {
+        atividadesDiv.innerHTML = painel.atividades.map(a => `
+            <div class="result-item">
+                <span class="badge badge-${a.status === 'enviado' ? 'success' : 'warning'}">
+                    ${a.tipo}
+                </span>
+                <strong>${a.cliente}</strong> - ${a.preview}
+                <br><small style="color: #7f8c8d;">${new Date(a.data).toLocaleString('pt-BR')}</small>
+            </div>
+        `).join('');
+    } else {
+        atividadesDiv.innerHTML = `<div class="empty-state">
+            <i data-lucide="inbox" style="width: 48px; height: 48px;"></i>
+            <p>${mensagemVazia}</p>
+        </div>`;
+    }
+    if (window.lucide && typeof lucide.createIcons === 'function') lucide.createIcons();
+}
+
 async function carregarDashboard() {
     const statsGrid = document.getElementById('statsGrid');
     const atividadesDiv = document.getElementById('atividadesRecentes');
@@ -759,50 +834,17 @@ async function carregarDashboard() {
     try {
         // Carregar estatísticas
         const statsResponse = await fetch(`${API_URL}/dashboard/stats`);
-        const stats = await statsResponse.json();
-        
-        statsGrid.innerHTML = `
-            <div class="stat-card blue">
-                <div class="stat-value">${stats.total_clientes}</div>
-                <div class="stat-label">Total de Clientes</div>
-            </div>
-            <div class="stat-card green">
-                <div class="stat-value">${stats.clientes_ativos}</div>
-                <div class="stat-label">Clientes Ativos</div>
-            </div>
-            <div class="stat-card red">
-                <div class="stat-value">${stats.clientes_inadimplentes}</div>
-                <div class="stat-label">Inadimplentes</div>
-            </div>
-            <div class="stat-card orange">
-                <div class="stat-value">${stats.cobrancas_mes}</div>
-                <div class="stat-label">Cobranças este Mês</div>
-            </div>
-        `;
+        painel.stats = await statsResponse.json();
+        renderizarStats(painel.stats);
         
         // Carregar atividades com filtro se aplicável
         const queryTipo = tipoFiltro && tipoFiltro !== 'todos' ? `&tipo=${encodeURIComponent(tipoFiltro)}` : '';
         const atividadesResponse = await fetch(`${API_URL}/dashboard/atividades-recentes?limit=10${queryTipo}`);
         const atividades = await atividadesResponse.json();
         
-        if (atividades.atividades && atividades.atividades.length > 0) {
-            atividadesDiv.innerHTML = atividades.atividades.map(a => `
-                <div class="result-item">
-                    <span class="badge badge-${a.status === 'enviado' ? 'success' : 'warning'}">
-                        ${a.tipo}
-                    </span>
-                    <strong>${a.cliente}</strong> - ${a.preview}
-                    <br><small style="color: #7f8c8d;">${new Date(a.data).toLocaleString('pt-BR')}</small>
-                </div>
-            `).join('');
-        } else {
-            atividadesDiv.innerHTML = `<div class="empty-state">
-                <i data-lucide="inbox" style="width: 48px; height: 48px;"></i>
-                <p>Nenhuma atividade recente</p>
-            </div>`;
-        }
-        
-        lucide.createIcons();
+        painel.filtro = { tipo: tipoFiltro || 'todos', mes: '', ano: '', limit: 10 };
+        painel.atividades = atividades.atividades || [];
+        renderizarAtividades();
         
     } catch (error) {
         statsGrid.innerHTML = `<div class="empty-state">
@@ -818,6 +860,53 @@ async function carregarDashboard() {
     }
 }
 
+// Painel ao vivo (Server-Sent Events). A cada (re)conexão recarrega o dashboard
+// uma vez e depois só aplica os eventos; sem suporte a EventSource, volta ao fetch por aba.
+function conectarPainelAoVivo() {
+    if (!window.EventSource || painel.eventos) return;
+    
+    painel.eventos = new EventSource(`${API_URL}/dashboard/eventos`);
+    painel.eventos.onopen = () => {
+        painel.conectado = true;
+        carregarDashboard();
+    };
+    painel.eventos.onerror = () => {
+        // O navegador reconecta sozinho (retry enviado pelo servidor); enquanto isso,
+        // se o stream nunca abriu, carrega o dashboard pelo fetch normal
+        const estavaConectado = painel.conectado;
+        painel.conectado = false;
+        if (!estavaConectado && !painel.stats) carregarDashboard();
+    };
+    painel.eventos.onmessage = (mensagem) => {
+        const evento = JSON.parse(mensagem.data);
+        if (evento.tipo === 'recarregar') {
+            carregarDashboard();
+        } else if (evento.tipo === 'stats' && painel.stats) {
+            Object.entries(evento.delta).forEach(([campo, valor]) => {
+                if (campo in painel.stats) painel.stats[campo] += valor;
+            });
+            renderizarStats(painel.stats);
+        } else if (evento.tipo === 'atividades') {
+            aplicarAtividades(evento.itens);
+        }
+    };
+}
+
+function aplicarAtividades(itens) {
+    // Com filtro de mês/ano a lista é histórica: não recebe atividades novas
+    if (painel.filtro.mes && painel.filtro.ano) return;
+    
+    const tipo = painel.filtro.tipo;
+    const porId = new Map(painel.atividades.map(a => [a.id, a]));
+    itens.forEach(a => {
+        if (porId.has(a.id) || !tipo || tipo === 'todos' || a.tipo === tipo) porId.set(a.id, a);
+    });
+    painel.atividades = [...porId.values()]
+        .sort((a, b) => new Date(b.data) - new Date(a.data))
+        .slice(0, painel.filtro.limit);
+    renderizarAtividades();
+}
+
 // Atualiza somente atividades quando muda o filtro
 function atualizarFiltroAtividades() {
     // Recarrega somente a lista de atividades sem refazer stats
@@ -841,23 +930,9 @@ function atualizarFiltroAtividades() {
     fetch(`${API_URL}/dashboard/atividades-recentes?${queryParams}`)
         .then(r => r.json())
         .then(atividades => {
-            if (atividades.atividades && atividades.atividades.length > 0) {
-                atividadesDiv.innerHTML = atividades.atividades.map(a => `
-                    <div class="result-item">
-                        <span class="badge badge-${a.status === 'enviado' ? 'success' : 'warning'}">
-                            ${a.tipo}
-                        </span>
-                        <strong>${a.cliente}</strong> - ${a.preview}
-                        <br><small style="color:#7f8c8d;">${new Date(a.data).toLocaleString('pt-BR')}</small>
-                    </div>
-                `).join('');
-            } else {
-                atividadesDiv.innerHTML = `<div class="empty-state">
-                    <i data-lucide="inbox" style="width:48px;height:48px;"></i>
-                    <p>Nenhuma atividade encontrada para o período selecionado</p>
-                </div>`;
-            }
-            if (window.lucide && typeof lucide.createIcons === 'function') lucide.createIcons();
+            painel.filtro = { tipo: filtroTipo, mes: filtroMes, ano: filtroAno, limit: 50 };
+            painel.atividades = atividades.atividades || [];
+            renderizarAtividades('Nenhuma atividade encontrada para o período selecionado');
         })
         .catch(err => {
             atividadesDiv.innerHTML = `<div class="empty-state">
@@ -9,8 +9,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from core.database import DatabaseManager
-import core.config as config
-import requests
+from services.digisac_service import DigisacAPI
 
 
 def importar_contatos():
@@ -20,46 +19,14 @@ def importar_contatos():
     
     db = DatabaseManager()
     
-    headers = {
-        "Authorization": f"Bearer {config.DIGISAC_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    digisac = DigisacAPI()
     
     print("[INFO] Buscando contatos no Digisac (paginado)...")
     
     try:
-        all_contatos = []
-        page = 1
-        per_page = 200
-        
-        while True:
-            print(f"   Página {page}...", end=" ", flush=True)
-            
-            response = requests.get(
-                f"{config.API_BASE_URL}/contacts",
-                headers=headers,
-                params={"perPage": per_page, "page": page},
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Status: {response.status_code}")
-                break
-            
-            data = response.json()
-            contatos = data.get('data', [])
-            
-            if not contatos:
-                print("OK (fim)")
-                break
-            
-            all_contatos.extend(contatos)
-            print(f"OK (+{len(contatos)})")
-            
-            if len(contatos) < per_page:
-                break
-            
-            page += 1
+        # Listagem reaproveitada do cache por CONTATOS_LISTA_TTL_S; também aquece o
+        # cache de cada contato usado na validação antes do envio (validar_contatos)
+        all_contatos = digisac.listar_contatos()
         
         if not all_contatos:
             print("[WARNING] Nenhum contato encontrado no Digisac!")
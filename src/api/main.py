@@ -5,9 +5,18 @@ from typing import List, Optional
 from datetime import datetime
 import logging
 
-from .routes import clientes, cobrancas, templates, dashboard
+from .routes import clientes, cobrancas, templates, dashboard, webhooks, exportacao
 from .models import ErrorResponse
-from core.database import DatabaseManager
+from .middleware import OrcamentoConsultasMiddleware
+from core.contexto_consulta import metricas_consultas
+from core.database import (
+    DatabaseManager, get_database, fechar_database,
+    DatabaseTimeoutError, DatabasePoolEsgotadoError, ConsultaCanceladaError
+)
+from services.cache import get_cache_contatos
+from services.circuit_breaker import get_circuito_digisac
+from services.webhook_processor import processador_status
+from services.painel_ao_vivo import painel_ao_vivo
 
 # Configurar logging
 logging.basicConfig(
@@ -34,32 +43,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# statement_timeout por rota e cancelamento de consultas quando o cliente desconecta
+app.add_middleware(OrcamentoConsultasMiddleware)
+
 # Incluir rotas
 app.include_router(clientes.router, prefix="/api/clientes", tags=["Clientes"])
 app.include_router(cobrancas.router, prefix="/api/cobrancas", tags=["Mensagens"])
 app.include_router(templates.router, prefix="/api/templates", tags=["Templates"])
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"])
+app.include_router(webhooks.router, prefix="/api/webhooks", tags=["Webhooks"])
+app.include_router(exportacao.router, prefix="/api/exportacao", tags=["Exportação"])
+
+@app.on_event("startup")
+async def iniciar_processadores():
+    processador_status.iniciar()
+
+@app.on_event("shutdown")
+async def parar_processadores():
+    processador_status.parar()
+    painel_ao_vivo.parar()
+    fechar_database()
 
 # Dependency para obter database
 def get_db():
-    db = DatabaseManager()
+    db = get_database()
     try:
         yield db
     finally:
         pass
 
 # Health check
+# Síncrono (threadpool): health_check e pool_metricas usam o pool do psycopg2
 @app.get("/health", tags=["System"])
-async def health_check():
+def health_check():
     """Verifica saúde do sistema"""
     try:
-        db = DatabaseManager()
+        db = get_database()
         db_status = db.health_check()
+        circuito = get_circuito_digisac().info()
+        pool = db.pool_metricas()
+        
+        if not db_status:
+            status = "unhealthy"
+        elif circuito["estado"] != "fechado" or pool["aguardando"] > 0:
+            status = "degraded"
+        else:
+            status = "healthy"
         
         return {
-            "status": "healthy" if db_status else "unhealthy",
+            "status": status,
             "timestamp": datetime.now().isoformat(),
             "database": "connected" if db_status else "disconnected",
+            "pool": pool,
+            "replicas": db.replicas_info(),
+            "consultas": metricas_consultas(),
+            "painel": painel_ao_vivo.status(),
+            "digisac": circuito,
+            "cache_contatos": get_cache_contatos().info(),
             "version": "3.0.0"
         }
     except Exception as e:
@@ -95,6 +135,24 @@ async def http_exception_handler(request, exc):
         }
     )
 
+@app.exception_handler(DatabaseTimeoutError)
+async def database_timeout_handler(request, exc):
+    if isinstance(exc, ConsultaCanceladaError):
+        # Ninguém vai ler a resposta; 499 fica só no log de acesso
+        status_code, headers = 499, None
+    elif isinstance(exc, DatabasePoolEsgotadoError):
+        status_code, headers = 503, {"Retry-After": "5"}
+    else:
+        status_code, headers = 504, None
+    return JSONResponse(
+        status_code=status_code,
+        headers=headers,
+        content={
+            "error": str(exc),
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     logger.error(f"Unhandled exception: {str(exc)}")
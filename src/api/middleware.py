@@ -0,0 +1,66 @@
+"""
+Middleware ASGI de orçamento de consultas
+
+Abre um ContextoConsulta por requisição HTTP (statement_timeout da rota) e
+vigia o canal de entrada: quando o cliente desconecta, as consultas em
+andamento da requisição são canceladas no PostgreSQL, liberando a conexão
+do pool em vez de esperar o resultado que ninguém vai ler.
+
+O cancelamento só alcança consultas que rodam fora do event loop (rotas
+síncronas no threadpool e respostas em streaming).
+"""
+
+import asyncio
+import logging
+
+from core.contexto_consulta import (
+    ContextoConsulta, ativar, desativar, orcamento_rota, prefixo_rota
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OrcamentoConsultasMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        caminho = scope.get('path', '')
+        contexto = ContextoConsulta(prefixo_rota(caminho), orcamento_rota(caminho))
+        token = ativar(contexto)
+
+        # Único leitor do receive original; a aplicação lê da fila
+        mensagens: asyncio.Queue = asyncio.Queue()
+        concluida = False
+
+        async def vigiar():
+            while True:
+                mensagem = await receive()
+                await mensagens.put(mensagem)
+                if mensagem['type'] == 'http.disconnect':
+                    if not concluida:
+                        canceladas = await asyncio.to_thread(contexto.cancelar)
+                        if canceladas:
+                            logger.info(f"{caminho}: cliente desconectou, {canceladas} consulta(s) cancelada(s)")
+                    return
+
+        async def enviar(mensagem):
+            nonlocal concluida
+            await send(mensagem)
+            # Resposta completa: o http.disconnect que o servidor manda em seguida não é
+            # desistência do cliente (BackgroundTasks e o fim de geradores de streaming
+            # ainda rodam dentro da aplicação e não devem ser cancelados)
+            if mensagem['type'] == 'http.response.body' and not mensagem.get('more_body', False):
+                concluida = True
+
+        vigia = asyncio.create_task(vigiar())
+        try:
+            await self.app(scope, mensagens.get, enviar)
+        finally:
+            concluida = True
+            vigia.cancel()
+            desativar(token)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, date
 from enum import Enum
 
@@ -38,6 +38,7 @@ class ClienteBase(BaseModel):
     digisac_contact_id: str
     telefone: Optional[str] = None
     email: Optional[str] = None
+    tags: List[str] = []
 
 class ClienteCreate(ClienteBase):
     pass
@@ -46,6 +47,7 @@ class ClienteUpdate(BaseModel):
     nome: Optional[str] = None
     telefone: Optional[str] = None
     email: Optional[str] = None
+    tags: Optional[List[str]] = None
 
 class ClienteResponse(ClienteBase):
     id: int
@@ -146,21 +148,87 @@ class PreviewResponse(BaseModel):
     variaveis_utilizadas: Dict[str, Any]
 
 # Batch Send Models
+class AudienciaFiltro(BaseModel):
+    """Seleção declarativa de destinatários, resolvida no servidor"""
+    status: Optional[str] = None
+    busca: Optional[str] = None
+    sem_contato_dias: Optional[int] = Field(None, ge=1)
+    tag: Optional[str] = None
+
 class BatchSendRequest(BaseModel):
-    clientes_ids: List[int]
+    clientes_ids: Optional[List[int]] = None
+    audiencia: Optional[AudienciaFiltro] = None
     tipo: TipoCobranca
     template_name: Optional[str] = None
     mensagem_padrao: Optional[str] = None
     variaveis_extras: Optional[Dict[str, Any]] = {}
     mensagens_customizadas: Optional[Dict[int, str]] = {}
     enviar_agora: bool = True
+    ignorar_limite_frequencia: bool = False
+    # Confere os contatos no Digisac antes de enfileirar (em lote, via cache de contatos)
+    validar_contatos: bool = False
+    # Repetir o mesmo lote_id não duplica envios (chave de idempotência por cliente)
+    lote_id: Optional[str] = Field(None, max_length=64)
+
+    @model_validator(mode='after')
+    def validar_destinatarios(self):
+        if (self.clientes_ids is None) == (self.audiencia is None):
+            raise ValueError("Informe clientes_ids ou audiencia (apenas um)")
+        return self
 
 class BatchSendResponse(BaseModel):
+    lote_id: Optional[str] = None
     total_clientes: int
     enviados: int
     erros: int
+    ignorados: int = 0
+    adiados: int = 0
     detalhes: List[Dict[str, Any]]
 
+class ReenvioRequest(BaseModel):
+    """Seleção de envios com falha para reenvio (ao menos um filtro)"""
+    lote_id: Optional[str] = None
+    inicio: Optional[datetime] = None
+    fim: Optional[datetime] = None
+    erro_classe: Optional[str] = None
+    max_tentativas: Optional[int] = Field(None, ge=1)
+
+    @model_validator(mode='after')
+    def validar_filtro(self):
+        if not (self.lote_id or self.inicio or self.fim or self.erro_classe):
+            raise ValueError("Informe lote_id, inicio/fim ou erro_classe")
+        return self
+
+class ReenvioResponse(BaseModel):
+    selecionados: int
+    enviados: int
+    erros: int
+    interrompido: bool = False
+
+# Atualização de clientes em lote
+class ClienteAtualizacaoLote(BaseModel):
+    """Mesma alteração aplicada a clientes_ids ou a um filtro, em um único UPDATE"""
+    clientes_ids: Optional[List[int]] = None
+    filtro: Optional[AudienciaFiltro] = None
+    status: Optional[Literal['ativo', 'inativo', 'suspenso']] = None
+    adicionar_tags: List[str] = []
+    remover_tags: List[str] = []
+
+    @model_validator(mode='after')
+    def validar_lote(self):
+        if (self.clientes_ids is None) == (self.filtro is None):
+            raise ValueError("Informe clientes_ids ou filtro (apenas um)")
+        if self.filtro is not None and not any(self.filtro.model_dump().values()):
+            raise ValueError("Filtro vazio: informe ao menos um critério")
+        if self.status is None and not (self.adicionar_tags or self.remover_tags):
+            raise ValueError("Informe status, adicionar_tags ou remover_tags")
+        return self
+
+class ClienteAtualizacaoLoteResponse(BaseModel):
+    atualizados: int
+    ids: List[int]
+    aplicado: bool = True
+
 # Dashboard Models
 class DashboardStats(BaseModel):
     total_clientes: int
@@ -0,0 +1,59 @@
+"""
+Respostas JSON rápidas para listagens
+
+Serializa linhas do banco direto das tuplas do cursor, sem construir um
+modelo Pydantic por linha nem revalidar via response_model. Usa orjson
+quando disponível e cai para o json da stdlib caso contrário.
+
+Listagens com ETag (GET condicional): a versão da coleção (colecao_versoes)
+mais os parâmetros da consulta formam a ETag; If-None-Match igual responde
+304 sem executar a listagem nem serializar as linhas.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Sequence
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from core.serializacao import dumps, orjson
+
+
+class RespostaJSONRapida(Response):
+    """JSONResponse com orjson; retornada diretamente, dispensa o response_model"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def linhas_para_dicts(colunas: Sequence[str], linhas: Iterable[tuple]) -> List[Dict[str, Any]]:
+    """Converte tuplas do cursor em dicts (dados confiáveis do banco, sem validação)"""
+    return [dict(zip(colunas, linha)) for linha in linhas]
+
+
+def colunas_cursor(cursor) -> List[str]:
+    return [descricao[0] for descricao in cursor.description]
+
+
+def etag_colecao(colecao: str, versao: int, request: Request) -> str:
+    """ETag fraca: versão da coleção + parâmetros da consulta (cada filtro/página tem a sua)"""
+    parametros = sorted(request.query_params.multi_items())
+    consulta = hashlib.sha1(repr(parametros).encode('utf-8')).hexdigest()[:16]
+    return f'W/"{colecao}-{versao}-{consulta}"'
+
+
+def cabecalhos_cache(etag: str) -> Dict[str, str]:
+    """no-cache: o navegador guarda a resposta, mas revalida com If-None-Match a cada uso"""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def nao_modificado(request: Request, etag: str) -> bool:
+    """Comparação fraca de If-None-Match (ignora o prefixo W/ inserido por proxies com gzip)"""
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == "*":
+        return True
+    alvo = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == alvo for tag in cabecalho.split(","))
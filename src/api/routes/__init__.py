@@ -1,4 +1,4 @@
 # API Routes __init__.py
-from . import clientes, cobrancas, templates, dashboard
+from . import clientes, cobrancas, templates, dashboard, webhooks, exportacao
 
-__all__ = ['clientes', 'cobrancas', 'templates', 'dashboard']
+__all__ = ['clientes', 'cobrancas', 'templates', 'dashboard', 'webhooks', 'exportacao']
@@ -1,35 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File
 from typing import List, Optional
 from datetime import datetime
 
 from ..models import (
     ClienteResponse, ClienteCreate, ClienteUpdate, 
-    ClienteListFilter, SuccessResponse
+    ClienteListFilter, SuccessResponse,
+    ClienteAtualizacaoLote, ClienteAtualizacaoLoteResponse
 )
-from core.database import DatabaseManager
+from ..respostas import (
+    RespostaJSONRapida, linhas_para_dicts, colunas_cursor,
+    etag_colecao, cabecalhos_cache, nao_modificado
+)
+from core.database import DatabaseManager, DatabaseTimeoutError, get_database
 from models.models import Cliente
+from services.importador import ImportadorClientes, ImportacaoInvalidaError
+from services.cache import get_cache_contatos
 
 router = APIRouter()
 
 def get_db():
-    return DatabaseManager()
+    return get_database()
 
+# Rotas síncronas: o checkout do pool pode esperar (DB_POOL_TIMEOUT_S) e psycopg2
+# bloqueia; rodam no threadpool para não travar o event loop do worker
 @router.get("/", response_model=List[ClienteResponse])
-async def listar_clientes(
+def listar_clientes(
+    request: Request,
     nome: Optional[str] = Query(None, description="Filtrar por nome"),
     status: Optional[str] = Query(None, description="Filtrar por status"),
+    tag: Optional[str] = Query(None, description="Filtrar por tag"),
     limit: int = Query(200, ge=1, le=500),
     offset: int = Query(0, ge=0),
     db: DatabaseManager = Depends(get_db)
 ):
-    """Lista todos os clientes com filtros opcionais"""
+    """Lista todos os clientes com filtros opcionais (304 se If-None-Match ainda for a ETag atual)"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection(somente_leitura=True) as conn:
             cursor = conn.cursor()
             
+            # GET condicional: versão lida antes dos dados, na mesma conexão
+            etag = etag_colecao('clientes', db.versao_colecao(cursor, 'clientes'), request)
+            if nao_modificado(request, etag):
+                return Response(status_code=304, headers=cabecalhos_cache(etag))
+            
             query = '''
                 SELECT c.id, c.nome, c.digisac_contact_id, c.telefone, c.email,
-                       c.created_at, c.status
+                       c.created_at, c.status, c.tags
                 FROM clientes c
                 WHERE 1=1
             '''
@@ -44,28 +60,69 @@ async def listar_clientes(
                 query += " AND c.status = %s"
                 params.append(status)
             
+            if tag:
+                query += " AND c.tags @> ARRAY[%s]::TEXT[]"
+                params.append(tag)
+            
             query += " ORDER BY c.nome LIMIT %s OFFSET %s"
             params.extend([limit, offset])
             
             cursor.execute(query, params)
             rows = cursor.fetchall()
             
-            return [
-                ClienteResponse(
-                    id=row[0],
-                    nome=row[1],
-                    digisac_contact_id=row[2],
-                    telefone=row[3],
-                    email=row[4],
-                    created_at=row[5],
-                    status=row[6]
-                ) for row in rows
-            ]
+            # Linhas confiáveis do banco: serializa direto, sem modelo por linha
+            return RespostaJSONRapida(linhas_para_dicts(colunas_cursor(cursor), rows), headers=cabecalhos_cache(etag))
+    except DatabaseTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar clientes: {str(e)}")
 
+@router.patch("/lote", response_model=ClienteAtualizacaoLoteResponse)
+def atualizar_clientes_em_lote(
+    atualizacao: ClienteAtualizacaoLote,
+    aplicar: bool = Query(True, description="false = só lista os ids que seriam alterados"),
+    db: DatabaseManager = Depends(get_db)
+):
+    """Altera status e/ou tags de vários clientes de uma vez (lista de ids ou filtro).
+    Um único UPDATE, sem leitura prévia; retorna os ids efetivamente alterados."""
+    try:
+        ids = db.atualizar_clientes_em_lote(
+            clientes_ids=atualizacao.clientes_ids,
+            filtro=atualizacao.filtro.model_dump() if atualizacao.filtro else None,
+            status=atualizacao.status,
+            adicionar_tags=atualizacao.adicionar_tags,
+            remover_tags=atualizacao.remover_tags,
+            aplicar=aplicar
+        )
+        return RespostaJSONRapida({"atualizados": len(ids), "ids": ids, "aplicado": aplicar})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseTimeoutError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar clientes: {str(e)}")
+
+@router.post("/importar")
+def importar_clientes(
+    arquivo: UploadFile = File(..., description="CSV: nome, digisac_contact_id, telefone, email, status, tags"),
+    aplicar: bool = Query(True, description="false = só valida, sem gravar"),
+    db: DatabaseManager = Depends(get_db)
+):
+    """Importa clientes de um CSV em massa (COPY para staging, validação em SQL e upsert único).
+    Responde com contadores e o relatório das linhas rejeitadas (linha do arquivo e motivo)."""
+    try:
+        # O upload fica em arquivo temporário e é lido em blocos pelo COPY
+        resultado = ImportadorClientes(db).importar(arquivo.file, aplicar=aplicar)
+        return RespostaJSONRapida(resultado)
+    except ImportacaoInvalidaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseTimeoutError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao importar clientes: {str(e)}")
+
 @router.get("/{cliente_id}", response_model=ClienteResponse)
-async def obter_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
+def obter_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
     """Obtém detalhes de um cliente específico"""
     try:
         cliente = db.get_cliente_by_id(cliente_id)
@@ -74,9 +131,9 @@ async def obter_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
         
         with db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT status FROM clientes WHERE id = %s', (cliente_id,))
+            cursor.execute('SELECT status, tags FROM clientes WHERE id = %s', (cliente_id,))
             result = cursor.fetchone()
-            status = result[0] if result else 'ativo'
+            status, tags = result if result else ('ativo', [])
         
         return ClienteResponse(
             id=cliente.id,
@@ -84,23 +141,27 @@ async def obter_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
             digisac_contact_id=cliente.digisac_contact_id,
             telefone=cliente.telefone,
             email=cliente.email,
+            tags=tags,
             status=status
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter cliente: {str(e)}")
 
 @router.post("/", response_model=ClienteResponse, status_code=201)
-async def criar_cliente(cliente: ClienteCreate, db: DatabaseManager = Depends(get_db)):
+def criar_cliente(cliente: ClienteCreate, db: DatabaseManager = Depends(get_db)):
     """Cria um novo cliente"""
     try:
         cliente_id = db.inserir_cliente(
             nome=cliente.nome,
             digisac_contact_id=cliente.digisac_contact_id,
             telefone=cliente.telefone,
-            email=cliente.email
+            email=cliente.email,
+            tags=cliente.tags
         )
+        # Um 404 recente do contato não deve barrar a validação antes do envio
+        get_cache_contatos().invalidar(cliente.digisac_contact_id)
         
         return ClienteResponse(
             id=cliente_id,
@@ -108,13 +169,16 @@ async def criar_cliente(cliente: ClienteCreate, db: DatabaseManager = Depends(ge
             digisac_contact_id=cliente.digisac_contact_id,
             telefone=cliente.telefone,
             email=cliente.email,
+            tags=cliente.tags,
             status="ativo"
         )
+    except DatabaseTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao criar cliente: {str(e)}")
 
 @router.put("/{cliente_id}", response_model=ClienteResponse)
-async def atualizar_cliente(
+def atualizar_cliente(
     cliente_id: int, 
     cliente_update: ClienteUpdate, 
     db: DatabaseManager = Depends(get_db)
@@ -144,6 +208,10 @@ async def atualizar_cliente(
                 updates.append("email = %s")
                 params.append(cliente_update.email)
             
+            if cliente_update.tags is not None:
+                updates.append("tags = %s")
+                params.append(cliente_update.tags)
+            
             if updates:
                 updates.append("updated_at = CURRENT_TIMESTAMP")
                 params.append(cliente_id)
@@ -156,9 +224,9 @@ async def atualizar_cliente(
         
         with db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT status FROM clientes WHERE id = %s', (cliente_id,))
+            cursor.execute('SELECT status, tags FROM clientes WHERE id = %s', (cliente_id,))
             result = cursor.fetchone()
-            status = result[0] if result else 'ativo'
+            status, tags = result if result else ('ativo', [])
         
         return ClienteResponse(
             id=cliente_atualizado.id,
@@ -166,15 +234,16 @@ async def atualizar_cliente(
             digisac_contact_id=cliente_atualizado.digisac_contact_id,
             telefone=cliente_atualizado.telefone,
             email=cliente_atualizado.email,
+            tags=tags,
             status=status
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar cliente: {str(e)}")
 
 @router.delete("/{cliente_id}", response_model=SuccessResponse)
-async def deletar_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
+def deletar_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)):
     """Deleta um cliente (soft delete - marca como inativo)"""
     try:
         cliente = db.get_cliente_by_id(cliente_id)
@@ -188,13 +257,13 @@ async def deletar_cliente(cliente_id: int, db: DatabaseManager = Depends(get_db)
             message=f"Cliente {cliente.nome} marcado como inativo",
             data={"cliente_id": cliente_id}
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar cliente: {str(e)}")
 
 @router.get("/{cliente_id}/historico")
-async def obter_historico_cliente(
+def obter_historico_cliente(
     cliente_id: int,
     tipo: Optional[str] = Query(None, description="Filtrar por tipo: financeira, documento, geral"),
     limit: int = Query(50, ge=1, le=200),
@@ -222,7 +291,7 @@ async def obter_historico_cliente(
             "envios": envios
         }
         
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter histórico: {str(e)}")
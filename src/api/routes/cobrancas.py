@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query
 from typing import List, Dict, Any
 from datetime import datetime
 import logging
@@ -6,20 +6,25 @@ import logging
 from ..models import (
     BatchSendRequest, BatchSendResponse,
     PreviewRequest, PreviewResponse,
+    ReenvioRequest, ReenvioResponse,
     SuccessResponse
 )
-from core.database import DatabaseManager
-from services.digisac_service import DigisacAPI
+from core.database import DatabaseManager, get_database
+from services.envio_lote import EnvioLoteService
+from services.outbox import OutboxSender
+from services.reenvio import ReenvioService
 from services.template_manager import TemplateManager
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 def get_db():
-    return DatabaseManager()
+    return get_database()
 
+# Rotas síncronas: o envio bloqueia (psycopg2, requests e a espera do limite de taxa
+# em time.sleep) e precisa rodar no threadpool, não no event loop do worker
 @router.post("/preview", response_model=PreviewResponse)
-async def preview_mensagem(
+def preview_mensagem(
     request: PreviewRequest,
     db: DatabaseManager = Depends(get_db)
 ):
@@ -61,7 +66,7 @@ async def preview_mensagem(
         raise HTTPException(status_code=500, detail=f"Erro ao gerar preview: {str(e)}")
 
 @router.post("/enviar-lote", response_model=BatchSendResponse)
-async def enviar_mensagens_lote(
+def enviar_mensagens_lote(
     request: BatchSendRequest,
     background_tasks: BackgroundTasks,
     db: DatabaseManager = Depends(get_db)
@@ -70,7 +75,7 @@ async def enviar_mensagens_lote(
     **ENDPOINT PRINCIPAL**: Envia mensagens em lote para múltiplos clientes
     
     Fluxo:
-    1. Valida todos os clientes
+    1. Resolve os destinatários (IDs explícitos OU filtro de audiência)
     2. Para cada cliente:
        - Usa mensagem customizada OU mensagem padrão OU template
        - Renderiza com variáveis do cliente
@@ -80,6 +85,8 @@ async def enviar_mensagens_lote(
     
     Parâmetros:
     - clientes_ids: Lista de IDs dos clientes
+    - audiencia: Filtro resolvido no servidor, em vez de clientes_ids
+      (status, busca por nome, sem_contato_dias, tag)
     - tipo: 'financeira' ou 'documento'
     - template_name: Nome do template (opcional)
     - mensagem_padrao: Mensagem padrão (opcional, se não usar template)
@@ -87,143 +94,23 @@ async def enviar_mensagens_lote(
     - enviar_agora: True para enviar imediatamente
     """
     try:
-        digisac = DigisacAPI()
-        template_manager = TemplateManager(db)
-        
-        # Validar clientes
-        clientes = []
-        for cliente_id in request.clientes_ids:
-            cliente = db.get_cliente_by_id(cliente_id)
-            if not cliente:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"Cliente ID {cliente_id} não encontrado"
-                )
-            clientes.append(cliente)
-        
-        # Resultados
-        resultados = []
-        enviados = 0
-        erros = 0
-        
-        for cliente in clientes:
-            try:
-                # Determinar mensagem a usar
-                mensagem = None
-                
-                # 1. Prioridade: mensagem customizada
-                if request.mensagens_customizadas and cliente.id in request.mensagens_customizadas:
-                    mensagem = request.mensagens_customizadas[cliente.id]
-                    fonte = "customizada"
-                
-                # 2. Usar template
-                elif request.template_name:
-                    context = {'nome': cliente.nome}
-                    
-                    # Adicionar contexto adicional se fornecido
-                    if hasattr(request, 'variaveis_extras') and request.variaveis_extras:
-                        context.update(request.variaveis_extras)
-                    
-                    mensagem = template_manager.engine.render_template(
-                        request.template_name, 
-                        context
+        if request.audiencia is not None:
+            # Cursor server-side: a audiência nunca é materializada em memória
+            clientes = db.iterar_audiencia(**request.audiencia.model_dump())
+        else:
+            # Validar clientes
+            clientes = []
+            for cliente_id in request.clientes_ids:
+                cliente = db.get_cliente_by_id(cliente_id)
+                if not cliente:
+                    raise HTTPException(
+                        status_code=404, 
+                        detail=f"Cliente ID {cliente_id} não encontrado"
                     )
-                    fonte = f"template:{request.template_name}"
-                
-                # 3. Usar mensagem padrão
-                elif request.mensagem_padrao:
-                    # Criar contexto com todas as variáveis
-                    context = {'nome': cliente.nome}
-                    
-                    # Adicionar variáveis extras se fornecidas
-                    if hasattr(request, 'variaveis_extras') and request.variaveis_extras:
-                        context.update(request.variaveis_extras)
-                    
-                    # Renderizar mensagem padrão com as variáveis
-                    mensagem = template_manager.engine._render_text(
-                        request.mensagem_padrao, 
-                        context
-                    )
-                    fonte = "padrao"
-                
-                else:
-                    raise ValueError("Nenhuma mensagem fornecida")
-                
-                if not mensagem:
-                    raise ValueError("Mensagem vazia após renderização")
-                
-                # Enviar mensagem
-                if request.enviar_agora:
-                    sucesso = digisac.enviar_mensagem(
-                        cliente.digisac_contact_id, 
-                        mensagem
-                    )
-                    
-                    if sucesso:
-                        enviados += 1
-                        status = "enviado"
-                        erro_msg = None
-                    else:
-                        erros += 1
-                        status = "erro"
-                        erro_msg = "Falha no envio via API Digisac"
-                else:
-                    # Apenas agendar
-                    status = "agendado"
-                    erro_msg = None
-                    sucesso = True
-                
-                # Registrar histórico
-                # Define template_usado baseado na fonte da mensagem
-                if request.template_name:
-                    template_label = request.template_name
-                elif request.mensagens_customizadas and cliente.id in request.mensagens_customizadas:
-                    template_label = "Customizada"
-                else:
-                    template_label = "Padrão"
-                
-                db.registrar_envio(
-                    cliente_id=cliente.id,
-                    tipo=request.tipo,
-                    template_usado=template_label,
-                    mensagem=mensagem,
-                    status=status,
-                    erro_detalhe=erro_msg
-                )
-                
-                # Resultado individual
-                resultados.append({
-                    "cliente_id": cliente.id,
-                    "cliente_nome": cliente.nome,
-                    "status": status,
-                    "mensagem": mensagem[:100] + "..." if len(mensagem) > 100 else mensagem,
-                    "fonte_mensagem": fonte,
-                    "erro": erro_msg
-                })
-                
-                logger.info(f"{'✅' if sucesso else '❌'} {cliente.nome}: {status}")
-                
-            except Exception as e:
-                erros += 1
-                erro_msg = str(e)
-                
-                resultados.append({
-                    "cliente_id": cliente.id,
-                    "cliente_nome": cliente.nome,
-                    "status": "erro",
-                    "mensagem": None,
-                    "fonte_mensagem": None,
-                    "erro": erro_msg
-                })
-                
-                logger.error(f"❌ Erro ao processar {cliente.nome}: {erro_msg}")
+                clientes.append(cliente)
         
-        return BatchSendResponse(
-            total_clientes=len(clientes),
-            enviados=enviados,
-            erros=erros,
-            detalhes=resultados
-        )
+        resumo = EnvioLoteService(db, request).executar(clientes)
+        return BatchSendResponse(**resumo)
         
     except HTTPException:
         raise
@@ -231,14 +118,76 @@ async def enviar_mensagens_lote(
         logger.error(f"Erro no envio em lote: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro no envio em lote: {str(e)}")
 
-@router.get("/status/{task_id}")
-async def verificar_status_envio(task_id: str):
+@router.post("/reenviar", response_model=ReenvioResponse)
+def reenviar_falhas(
+    request: ReenvioRequest,
+    db: DatabaseManager = Depends(get_db)
+):
+    """
+    Reenvia em massa os envios com falha (status 'erro'), selecionados por
+    lote, período e/ou classe de erro. Envios adiados pelo circuit breaker
+    seguem pendentes no lote: use /lotes/{lote_id}/retomar.
+    
+    - Reutiliza a mensagem gravada no histórico
+    - Respeita o limite de taxa e o circuit breaker do Digisac
+    - Envios com max_tentativas (padrão REENVIO_MAX_TENTATIVAS) não são reenviados
+    - Falhas 4xx só são reenviadas se erro_classe='http_4xx' for pedido explicitamente
+    """
+    try:
+        resumo = ReenvioService(db).reenviar(**request.model_dump())
+        return ReenvioResponse(**resumo)
+    except Exception as e:
+        logger.error(f"Erro no reenvio: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro no reenvio: {str(e)}")
+
+@router.post("/lotes/{lote_id}/retomar", response_model=BatchSendResponse)
+def retomar_lote(
+    lote_id: str,
+    forcar: bool = Query(False, description="Considera abandonadas todas as reivindicações em aberto"),
+    db: DatabaseManager = Depends(get_db)
+):
     """
-    Verifica status de um envio em lote (para envios assíncronos futuros)
+    Retoma um lote interrompido (ou agendado com enviar_agora=false) a partir
+    das linhas pendentes gravadas, sem recalcular a audiência e sem duplicar
+    envios já concluídos.
     """
-    # TODO: Implementar com Redis/Celery para envios assíncronos
+    try:
+        if not db.resumo_lote(lote_id):
+            raise HTTPException(status_code=404, detail="Lote não encontrado")
+        
+        resultado = OutboxSender(db).retomar(lote_id, forcar=forcar)
+        return BatchSendResponse(
+            lote_id=lote_id,
+            total_clientes=len(resultado['detalhes']) + resultado['adiados'] + resultado['interrompidos'],
+            enviados=resultado['enviados'],
+            erros=resultado['erros'] + resultado['interrompidos'],
+            adiados=resultado['adiados'],
+            detalhes=resultado['detalhes']
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao retomar lote {lote_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao retomar lote: {str(e)}")
+
+@router.get("/status/{lote_id}")
+def verificar_status_envio(lote_id: str, db: DatabaseManager = Depends(get_db)):
+    """
+    Verifica o status de um envio em lote pelas linhas do outbox
+    """
+    contagem = db.resumo_lote(lote_id)
+    if not contagem:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    
+    if contagem.get('processando'):
+        status = "em_andamento"
+    elif contagem.get('pendente'):
+        status = "pendente"
+    else:
+        status = "concluido"
+    
     return {
-        "task_id": task_id,
-        "status": "completed",
-        "message": "Funcionalidade em desenvolvimento"
+        "lote_id": lote_id,
+        "status": status,
+        "contagem": contagem
     }
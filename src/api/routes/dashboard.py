@@ -1,52 +1,53 @@
+import asyncio
+
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 
 from ..models import DashboardStats
-from core.database import DatabaseManager
-from datetime import datetime, timedelta
+from ..respostas import RespostaJSONRapida, linhas_para_dicts
+from core.database import DatabaseManager, DatabaseTimeoutError, get_database, SQL_JOIN_VERSAO, SQL_MENSAGEM_ENVIO, DIMENSOES_TELEMETRIA
+from core.config import PAINEL_SSE_HEARTBEAT_S
+from services.painel_ao_vivo import painel_ao_vivo
+from datetime import date, datetime, timedelta
 
 router = APIRouter()
 
 def get_db():
-    return DatabaseManager()
+    return get_database()
 
+# Rotas síncronas: rodam no threadpool, sem bloquear o event loop, e suas consultas
+# podem ser canceladas quando o cliente desconecta (api/middleware.py)
 @router.get("/stats", response_model=DashboardStats)
-async def obter_estatisticas(db: DatabaseManager = Depends(get_db)):
+def obter_estatisticas(db: DatabaseManager = Depends(get_db)):
     """Obtém estatísticas gerais do sistema para o dashboard"""
     try:
-        with db.get_connection() as conn:
+        with db.get_connection(somente_leitura=True) as conn:
             cursor = conn.cursor()
             
             # Total de clientes
-            cursor.execute("SELECT COUNT(*) FROM clientes")
+            db.executar_preparada(cursor, 'dashboard_total_clientes')
             total_clientes = cursor.fetchone()[0]
             
             # Clientes ativos
-            cursor.execute("SELECT COUNT(*) FROM clientes WHERE status = 'ativo'")
+            db.executar_preparada(cursor, 'dashboard_clientes_ativos')
             clientes_ativos = cursor.fetchone()[0] or 0
             
             # Clientes inativos/suspensos
-            cursor.execute("SELECT COUNT(*) FROM clientes WHERE status != 'ativo'")
+            db.executar_preparada(cursor, 'dashboard_clientes_inativos')
             clientes_inativos = cursor.fetchone()[0] or 0
             
             # Envios do mês
-            cursor.execute("""
-                SELECT COUNT(*) FROM historico_envios
-                WHERE data_envio >= DATE_TRUNC('month', CURRENT_DATE)
-            """)
+            db.executar_preparada(cursor, 'dashboard_envios_mes')
             cobrancas_mes = cursor.fetchone()[0] or 0
             
             # Envios pendentes
-            cursor.execute("SELECT COUNT(*) FROM historico_envios WHERE status = 'pendente'")
+            db.executar_preparada(cursor, 'dashboard_envios_pendentes')
             documentos_pendentes = cursor.fetchone()[0] or 0
             
             # Taxa de sucesso nos últimos 30 dias
-            cursor.execute("""
-                SELECT 
-                    COUNT(CASE WHEN status = 'enviado' THEN 1 END)::float /
-                    NULLIF(COUNT(*), 0) * 100
-                FROM historico_envios
-                WHERE data_envio >= CURRENT_DATE - INTERVAL '30 days'
-            """)
+            db.executar_preparada(cursor, 'dashboard_taxa_sucesso_30d')
             taxa_resposta = cursor.fetchone()[0] or 0.0
             
             return DashboardStats(
@@ -58,11 +59,13 @@ async def obter_estatisticas(db: DatabaseManager = Depends(get_db)):
                 taxa_resposta=round(taxa_resposta, 2)
             )
             
+    except DatabaseTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
 
 @router.get("/stats/periodo")
-async def obter_estatisticas_periodo(
+def obter_estatisticas_periodo(
     mes: int,
     ano: int,
     db: DatabaseManager = Depends(get_db)
@@ -74,36 +77,19 @@ async def obter_estatisticas_periodo(
         if ano < 2000 or ano > 2100:
             raise HTTPException(status_code=400, detail="Ano inválido")
         
-        with db.get_connection() as conn:
+        with db.get_connection(somente_leitura=True) as conn:
             cursor = conn.cursor()
             
             # Envios no período
-            cursor.execute("""
-                SELECT COUNT(*) FROM historico_envios
-                WHERE EXTRACT(MONTH FROM data_envio) = %s
-                  AND EXTRACT(YEAR FROM data_envio) = %s
-            """, (mes, ano))
+            db.executar_preparada(cursor, 'dashboard_periodo_total', (mes, ano))
             envios_periodo = cursor.fetchone()[0] or 0
             
             # Envios por tipo
-            cursor.execute("""
-                SELECT tipo, COUNT(*) 
-                FROM historico_envios
-                WHERE EXTRACT(MONTH FROM data_envio) = %s
-                  AND EXTRACT(YEAR FROM data_envio) = %s
-                GROUP BY tipo
-            """, (mes, ano))
+            db.executar_preparada(cursor, 'dashboard_periodo_por_tipo', (mes, ano))
             por_tipo = {row[0]: row[1] for row in cursor.fetchall()}
             
             # Taxa de sucesso
-            cursor.execute("""
-                SELECT 
-                    COUNT(CASE WHEN status = 'enviado' THEN 1 END)::float /
-                    NULLIF(COUNT(*), 0) * 100
-                FROM historico_envios
-                WHERE EXTRACT(MONTH FROM data_envio) = %s
-                  AND EXTRACT(YEAR FROM data_envio) = %s
-            """, (mes, ano))
+            db.executar_preparada(cursor, 'dashboard_periodo_taxa', (mes, ano))
             taxa_sucesso = cursor.fetchone()[0] or 0.0
             
             return {
@@ -114,13 +100,109 @@ async def obter_estatisticas_periodo(
                 "taxa_sucesso": round(taxa_sucesso, 2)
             }
             
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas do período: {str(e)}")
 
+@router.get("/telemetria")
+def obter_telemetria_envios(
+    agrupar: str = "template",
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    lote_id: Optional[str] = None,
+    limite: int = 100,
+    db: DatabaseManager = Depends(get_db)
+):
+    """Latência do Digisac (p50/p95/p99) e taxa de erro por template, hora, dia ou lote.
+    Sem período informado, usa os últimos 7 dias. 'geral' traz o total do intervalo.
+    """
+    try:
+        if agrupar not in DIMENSOES_TELEMETRIA:
+            raise HTTPException(
+                status_code=400,
+                detail=f"agrupar inválido; use: {', '.join(DIMENSOES_TELEMETRIA)}"
+            )
+        if limite < 1 or limite > 1000:
+            raise HTTPException(status_code=400, detail="limite deve estar entre 1 e 1000")
+        
+        fim = fim or datetime.now()
+        inicio = inicio or fim - timedelta(days=7)
+        if inicio >= fim:
+            raise HTTPException(status_code=400, detail="inicio deve ser anterior a fim")
+        
+        telemetria = db.telemetria_envios(agrupar, inicio, fim, lote_id=lote_id, limite=limite)
+        return RespostaJSONRapida({
+            "agrupar": agrupar,
+            "inicio": inicio,
+            "fim": fim,
+            **telemetria
+        })
+    except (HTTPException, DatabaseTimeoutError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter telemetria: {str(e)}")
+
+@router.get("/desempenho/templates")
+def obter_desempenho_templates(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    template: Optional[str] = None,
+    db: DatabaseManager = Depends(get_db)
+):
+    """Volume, taxa de sucesso e classes de erro por template (padrão: últimos 30 dias).
+    Com template, devolve a série diária dele. Lido dos agregados diários, não do histórico.
+    """
+    try:
+        fim = fim or date.today()
+        inicio = inicio or fim - timedelta(days=29)
+        if inicio > fim:
+            raise HTTPException(status_code=400, detail="inicio deve ser anterior a fim")
+        if (fim - inicio).days > 366:
+            raise HTTPException(status_code=400, detail="Intervalo máximo de 366 dias")
+        
+        grupos = db.desempenho_templates(inicio, fim, template=template)
+        return RespostaJSONRapida({"inicio": inicio, "fim": fim, "template": template, "grupos": grupos})
+    except (HTTPException, DatabaseTimeoutError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter desempenho por template: {str(e)}")
+
+@router.get("/desempenho/lotes")
+def listar_desempenho_lotes(
+    limite: int = 50,
+    antes_de: Optional[datetime] = None,
+    db: DatabaseManager = Depends(get_db)
+):
+    """Lotes (campanhas) mais recentes com contadores e taxa de sucesso.
+    Para a próxima página, envie antes_de com o criado_em do último lote.
+    """
+    try:
+        if limite < 1 or limite > 500:
+            raise HTTPException(status_code=400, detail="limite deve estar entre 1 e 500")
+        
+        lotes = db.listar_lotes_envio(limite=limite, antes_de=antes_de)
+        return RespostaJSONRapida({"total": len(lotes), "lotes": lotes})
+    except (HTTPException, DatabaseTimeoutError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar lotes: {str(e)}")
+
+@router.get("/desempenho/lotes/{lote_id}")
+def obter_desempenho_lote(lote_id: str, db: DatabaseManager = Depends(get_db)):
+    """Contadores de um lote: pendentes, enviados, erros por classe e taxa de sucesso"""
+    try:
+        lote = db.get_lote_envio(lote_id)
+        if lote is None:
+            raise HTTPException(status_code=404, detail="Lote não encontrado")
+        return RespostaJSONRapida(lote)
+    except (HTTPException, DatabaseTimeoutError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter lote: {str(e)}")
+
 @router.get("/atividades-recentes")
-async def obter_atividades_recentes(
+def obter_atividades_recentes(
     limit: int = 20,
     tipo: str | None = None,
     mes: int | None = None,
@@ -146,18 +228,20 @@ async def obter_atividades_recentes(
         if ano is not None and (ano < 2000 or ano > 2100):
             raise HTTPException(status_code=400, detail="Ano inválido")
 
-        with db.get_connection() as conn:
+        with db.get_connection(somente_leitura=True) as conn:
             cursor = conn.cursor()
 
-            base_query = """
+            base_query = f"""
                 SELECT 
+                    he.id,
                     he.tipo,
                     c.nome as cliente_nome,
                     he.status,
                     he.data_envio as data,
-                    LEFT(he.mensagem, 100) as preview
+                    LEFT({SQL_MENSAGEM_ENVIO}, 100) as preview
                 FROM historico_envios he
                 JOIN clientes c ON he.cliente_id = c.id
+                {SQL_JOIN_VERSAO}
                 WHERE 1=1
             """
 
@@ -179,18 +263,44 @@ async def obter_atividades_recentes(
 
             cursor.execute(base_query, tuple(params))
 
-            atividades = []
-            for row in cursor.fetchall():
-                atividades.append({
-                    "tipo": row[0],
-                    "cliente": row[1],
-                    "status": row[2],
-                    "data": row[3].isoformat() if row[3] else None,
-                    "preview": row[4]
-                })
-
-            return {"total": len(atividades), "atividades": atividades}
-    except HTTPException:
+            atividades = linhas_para_dicts(
+                ("id", "tipo", "cliente", "status", "data", "preview"),
+                cursor.fetchall()
+            )
+
+            return RespostaJSONRapida({"total": len(atividades), "atividades": atividades})
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter atividades: {str(e)}")
+
+@router.get("/eventos")
+async def eventos_dashboard():
+    """Server-Sent Events do painel: deltas das estatísticas e novas atividades.
+    Eventos (JSON no campo data):
+        - {"tipo": "stats", "delta": {"cobrancas_mes": 3, ...}}
+        - {"tipo": "atividades", "itens": [...]}  (mesmo formato de /atividades-recentes)
+        - {"tipo": "recarregar"}  (eventos perdidos: buscar /stats novamente)
+    O cliente carrega /stats e /atividades-recentes ao abrir o stream e aplica os deltas.
+    """
+    fila = painel_ao_vivo.assinar()
+
+    async def gerar():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    dados = await asyncio.wait_for(fila.get(), timeout=PAINEL_SSE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Comentário SSE: mantém proxies abertos e detecta cliente desconectado
+                    yield b": ping\n\n"
+                    continue
+                yield b"data: " + dados + b"\n\n"
+        finally:
+            painel_ao_vivo.cancelar(fila)
+
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+
+from core.database import DatabaseManager, get_database
+from services.exportador import Exportador, FORMATOS, nome_arquivo
+
+router = APIRouter()
+
+def get_db():
+    return get_database()
+
+def _resposta(exportador: Exportador, recurso: str, formato: str, **filtros) -> StreamingResponse:
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato inválido. Use: csv ou ndjson")
+
+    # Sem Content-Length: a resposta sai em chunked transfer, bloco a bloco
+    return StreamingResponse(
+        exportador.gerar(recurso, formato, **filtros),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo(recurso, formato)}"'}
+    )
+
+@router.get("/historico")
+async def exportar_historico(
+    formato: str = Query("csv", description="csv ou ndjson"),
+    inicio: Optional[datetime] = Query(None, description="Envios a partir de (inclusive)"),
+    fim: Optional[datetime] = Query(None, description="Envios até (exclusive)"),
+    status: Optional[str] = Query(None, description="enviado, erro ou pendente"),
+    tipo: Optional[str] = Query(None, description="financeira, documento ou geral"),
+    db: DatabaseManager = Depends(get_db)
+):
+    """Exporta o histórico de envios em streaming (para conciliação contábil)"""
+    return _resposta(Exportador(db), "historico", formato,
+                     inicio=inicio, fim=fim, status=status, tipo=tipo)
+
+@router.get("/clientes")
+async def exportar_clientes(
+    formato: str = Query("csv", description="csv ou ndjson"),
+    status: Optional[str] = Query(None, description="ativo, inativo ou suspenso"),
+    db: DatabaseManager = Depends(get_db)
+):
+    """Exporta o cadastro de clientes em streaming"""
+    return _resposta(Exportador(db), "clientes", formato, status=status)
@@ -1,44 +1,63 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from typing import List
 from datetime import datetime
 
 from ..models import TemplateResponse, TemplateCreate, TemplateUpdate, SuccessResponse
-from core.database import DatabaseManager
+from ..respostas import (
+    RespostaJSONRapida, linhas_para_dicts, colunas_cursor,
+    etag_colecao, cabecalhos_cache, nao_modificado
+)
+from core.database import DatabaseManager, DatabaseTimeoutError, get_database
 
 router = APIRouter()
 
 def get_db():
-    return DatabaseManager()
+    return get_database()
 
+# Rotas síncronas: o checkout do pool pode esperar (DB_POOL_TIMEOUT_S) e psycopg2
+# bloqueia; rodam no threadpool para não travar o event loop do worker
 @router.get("/", response_model=List[TemplateResponse])
-async def listar_templates(
+def listar_templates(
+    request: Request,
     ativo: bool = None,
     db: DatabaseManager = Depends(get_db)
 ):
-    """Lista todos os templates disponíveis. Use ativo=true para apenas ativos, ativo=false para apenas inativos, ou omita para todos"""
+    """Lista todos os templates disponíveis. Use ativo=true para apenas ativos, ativo=false para apenas inativos, ou omita para todos.
+    Responde 304 se a ETag enviada em If-None-Match ainda for a atual."""
     try:
-        templates = db.get_all_templates()
-        
-        # Filtra baseado no parâmetro ativo
-        if ativo is not None:
-            templates_filtrados = [t for t in templates if t.ativo == ativo]
-        else:
-            templates_filtrados = templates
-        
-        return [
-            TemplateResponse(
-                id=t.id,
-                nome=t.nome,
-                template_text=t.template_text,
-                variaveis=t.variaveis,
-                ativo=t.ativo
-            ) for t in templates_filtrados
-        ]
+        with db.get_connection(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            
+            # GET condicional: versão lida antes dos dados, na mesma conexão
+            etag = etag_colecao('templates', db.versao_colecao(cursor, 'message_templates'), request)
+            if nao_modificado(request, etag):
+                return Response(status_code=304, headers=cabecalhos_cache(etag))
+            
+            query = '''
+                SELECT id, nome, template_text, variaveis, ativo, created_at
+                FROM message_templates
+            '''
+            params = []
+            
+            # Filtra baseado no parâmetro ativo
+            if ativo is not None:
+                query += " WHERE ativo = %s"
+                params.append(ativo)
+            
+            query += " ORDER BY tipo, nome"
+            cursor.execute(query, params)
+            
+            return RespostaJSONRapida(
+                linhas_para_dicts(colunas_cursor(cursor), cursor.fetchall()),
+                headers=cabecalhos_cache(etag)
+            )
+    except DatabaseTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar templates: {str(e)}")
 
 @router.get("/{template_name}", response_model=TemplateResponse)
-async def obter_template(template_name: str, db: DatabaseManager = Depends(get_db)):
+def obter_template(template_name: str, db: DatabaseManager = Depends(get_db)):
     """Obtém um template específico pelo nome"""
     try:
         template = db.get_template_by_name(template_name)
@@ -52,13 +71,13 @@ async def obter_template(template_name: str, db: DatabaseManager = Depends(get_d
             variaveis=template.variaveis,
             ativo=template.ativo
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter template: {str(e)}")
 
 @router.post("/", response_model=TemplateResponse, status_code=201)
-async def criar_template(template: TemplateCreate, db: DatabaseManager = Depends(get_db)):
+def criar_template(template: TemplateCreate, db: DatabaseManager = Depends(get_db)):
     """Cria um novo template"""
     try:
         template_id = db.inserir_template(
@@ -74,11 +93,13 @@ async def criar_template(template: TemplateCreate, db: DatabaseManager = Depends
             variaveis=template.variaveis,
             ativo=True
         )
+    except DatabaseTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao criar template: {str(e)}")
 
 @router.put("/{template_name}", response_model=TemplateResponse)
-async def atualizar_template(
+def atualizar_template(
     template_name: str,
     template_update: TemplateUpdate,
     db: DatabaseManager = Depends(get_db)
@@ -152,14 +173,14 @@ async def atualizar_template(
             variaveis=template_atualizado.variaveis,
             ativo=template_atualizado.ativo
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         logger.error(f"Erro ao atualizar template: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar template: {str(e)}")
 
 @router.delete("/{template_name}", response_model=SuccessResponse)
-async def deletar_template(template_name: str, db: DatabaseManager = Depends(get_db)):
+def deletar_template(template_name: str, db: DatabaseManager = Depends(get_db)):
     """Desativa um template (soft delete)"""
     try:
         template = db.get_template_by_name(template_name)
@@ -177,7 +198,7 @@ async def deletar_template(template_name: str, db: DatabaseManager = Depends(get
             message=f"Template '{template_name}' desativado com sucesso",
             data={"template_name": template_name}
         )
-    except HTTPException:
+    except (HTTPException, DatabaseTimeoutError):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar template: {str(e)}")
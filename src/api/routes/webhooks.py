@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+import hashlib
+import hmac
+import json
+import logging
+
+from core.config import WEBHOOK_SECRET
+from services.webhook_processor import processador_status, extrair_evento
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+HEADERS_ASSINATURA = ('X-Digisac-Signature', 'X-Hub-Signature-256', 'X-Signature')
+
+
+def verificar_assinatura(corpo: bytes, assinatura: str) -> bool:
+    """Valida HMAC-SHA256 do corpo bruto com DIGISAC_WEBHOOK_SECRET"""
+    if not WEBHOOK_SECRET or not assinatura:
+        return False
+    if assinatura.startswith('sha256='):
+        assinatura = assinatura[len('sha256='):]
+    esperado = hmac.new(WEBHOOK_SECRET.encode('utf-8'), corpo, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperado, assinatura.strip().lower())
+
+
+@router.post("/digisac", status_code=202)
+async def receber_webhook_digisac(request: Request):
+    """
+    Recebe eventos de status de mensagem do Digisac.
+
+    Verifica a assinatura, enfileira os eventos e responde imediatamente;
+    a persistência em historico_envios acontece em lote em segundo plano.
+    """
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook não configurado (DIGISAC_WEBHOOK_SECRET)")
+
+    corpo = await request.body()
+    assinatura = next(
+        (request.headers[h] for h in HEADERS_ASSINATURA if h in request.headers), ''
+    )
+    if not verificar_assinatura(corpo, assinatura):
+        raise HTTPException(status_code=401, detail="Assinatura inválida")
+
+    try:
+        payload = json.loads(corpo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+
+    itens = payload if isinstance(payload, list) else [payload]
+    eventos = [e for e in (extrair_evento(i) for i in itens if isinstance(i, dict)) if e]
+
+    if eventos and not processador_status.enfileirar(eventos):
+        # Fila cheia: o Digisac reenvia o evento mais tarde
+        logger.warning("Fila de webhooks cheia, evento recusado")
+        return JSONResponse(status_code=503, content={"error": "Fila cheia, tente novamente"})
+
+    return {"recebidos": len(eventos)}
+
+
+@router.get("/digisac/status")
+async def status_webhook():
+    """Métricas da fila de eventos do webhook"""
+    return processador_status.status()
@@ -8,6 +8,9 @@ DATABASE_PATH = 'contas.db'
 API_BASE_URL = os.getenv('DIGISAC_API_URL')
 WEBHOOK_SECRET = os.getenv('DIGISAC_WEBHOOK_SECRET')
 WEBHOOK_URL = os.getenv('DIGISAC_WEBHOOK_URL')
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '500'))
+WEBHOOK_FLUSH_MS = int(os.getenv('WEBHOOK_FLUSH_MS', '200'))
+WEBHOOK_QUEUE_MAX = int(os.getenv('WEBHOOK_QUEUE_MAX', '100000'))
 
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
@@ -15,4 +18,103 @@ POSTGRES_DB = os.getenv('POSTGRES_DB', 'cobranca_db')
 POSTGRES_USER = os.getenv('POSTGRES_USER', 'postgres')
 POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'senha123')
 
-POSTGRES_CONNECTION_STRING = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
\ No newline at end of file
+POSTGRES_CONNECTION_STRING = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+# Pool por processo: o total (workers x DB_POOL_MAX) fica abaixo do max_connections.
+# Padrão 1 (uvicorn/dev); o gunicorn_conf.py exporta WEB_WORKERS para os workers que cria
+WEB_WORKERS = int(os.getenv('WEB_WORKERS') or os.getenv('WORKERS') or '0') or 1
+POSTGRES_MAX_CONNECTIONS = int(os.getenv('POSTGRES_MAX_CONNECTIONS', '100'))
+DB_RESERVED_CONNECTIONS = int(os.getenv('DB_RESERVED_CONNECTIONS', '10'))
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '20'))
+# Checkout bloqueia até este tempo quando o pool está esgotado
+DB_POOL_TIMEOUT_S = float(os.getenv('DB_POOL_TIMEOUT_S', '10'))
+# Conexões são recicladas após este tempo de vida e fechadas após ficarem ociosas
+DB_CONN_MAX_LIFETIME_S = float(os.getenv('DB_CONN_MAX_LIFETIME_S', '1800'))
+DB_CONN_IDLE_TIMEOUT_S = float(os.getenv('DB_CONN_IDLE_TIMEOUT_S', '300'))
+# Ping (SELECT 1) no checkout de conexões ociosas há mais que isto
+DB_CONN_VALIDAR_APOS_S = float(os.getenv('DB_CONN_VALIDAR_APOS_S', '30'))
+# Queries quentes preparadas por conexão; desligue atrás de PgBouncer em modo transaction
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() in ('1', 'true', 'yes')
+
+# Réplicas de leitura (DSNs separados por vírgula) para dashboard, listagens e exportações
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
+# Réplicas com atraso de replicação acima disto saem da rotação (leitura vai ao primário)
+DB_REPLICA_MAX_LAG_S = float(os.getenv('DB_REPLICA_MAX_LAG_S', '10'))
+# Intervalo entre medições de lag (e nova tentativa após falha) de cada réplica
+DB_REPLICA_VERIFICAR_S = float(os.getenv('DB_REPLICA_VERIFICAR_S', '5'))
+
+# statement_timeout por rota (prefixo=ms, separados por vírgula), aplicado com SET LOCAL.
+# Nas exportações vale por FETCH do cursor, não pelo arquivo inteiro.
+DB_STATEMENT_TIMEOUT_ROTAS = {
+    prefixo.strip(): int(ms)
+    for prefixo, _, ms in (
+        item.partition('=') for item in os.getenv(
+            'DB_STATEMENT_TIMEOUT_ROTAS',
+            '/api/dashboard=5000,/api/clientes=5000,/api/clientes/importar=120000,/api/clientes/lote=60000,'
+            '/api/templates=3000,/api/exportacao=60000'
+        ).split(',')
+    )
+    if prefixo.strip() and ms.strip()
+}
+# Rotas fora da lista (0 = statement_timeout do servidor)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+
+# Painel ao vivo (SSE): uma conexão LISTEN por worker alimenta todos os painéis abertos.
+# LISTEN exige sessão: atrás de PgBouncer em modo transaction, aponte para o PostgreSQL direto.
+PAINEL_LISTEN_DSN = os.getenv('PAINEL_LISTEN_DSN') or POSTGRES_CONNECTION_STRING
+# Janela para agrupar notificações em um único evento (e uma única consulta de atividades)
+PAINEL_AGRUPAR_MS = int(os.getenv('PAINEL_AGRUPAR_MS', '250'))
+PAINEL_SSE_HEARTBEAT_S = float(os.getenv('PAINEL_SSE_HEARTBEAT_S', '15'))
+# Eventos pendentes por painel; painel lento que estoura a fila recebe "recarregar"
+PAINEL_FILA_MAX = int(os.getenv('PAINEL_FILA_MAX', '100'))
+
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '5000'))
+
+# Histórico compacto: grava versão do template + variáveis em vez do texto renderizado
+HISTORICO_COMPACTO = os.getenv('HISTORICO_COMPACTO', 'false').lower() in ('1', 'true', 'yes')
+
+# Limite de frequência por cliente: no máximo N envios do mesmo template (ou tipo)
+# por janela. FREQ_CAP_MAX_ENVIOS=0 desativa.
+FREQ_CAP_MAX_ENVIOS = int(os.getenv('FREQ_CAP_MAX_ENVIOS', '1'))
+FREQ_CAP_JANELA_HORAS = int(os.getenv('FREQ_CAP_JANELA_HORAS', '24'))
+FREQ_CAP_ESCOPO = os.getenv('FREQ_CAP_ESCOPO', 'template').lower()  # template ou tipo
+
+# Redis (opcional): estado compartilhado entre workers. Sem REDIS_HOST, usa memória local.
+REDIS_HOST = os.getenv('REDIS_HOST')
+REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD') or None
+REDIS_DB = int(os.getenv('REDIS_DB', '0'))
+
+# Digisac: limite de envios por minuto (somando os workers; 0 = sem limite)
+RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '0'))
+
+# Outbox do envio em lote: linhas reivindicadas por vez e tempo após o qual
+# uma reivindicação sem conclusão é considerada abandonada (processo caiu)
+OUTBOX_REIVINDICACAO = int(os.getenv('OUTBOX_REIVINDICACAO', '50'))
+OUTBOX_EXPIRACAO_S = int(os.getenv('OUTBOX_EXPIRACAO_S', '300'))
+
+# Reenvio de falhas: tentativas máximas por envio
+REENVIO_MAX_TENTATIVAS = int(os.getenv('REENVIO_MAX_TENTATIVAS', '3'))
+
+# Digisac: timeout por requisição e circuit breaker
+DIGISAC_TIMEOUT = float(os.getenv('DIGISAC_TIMEOUT', '10'))
+CIRCUITO_JANELA_S = int(os.getenv('CIRCUITO_JANELA_S', '60'))
+CIRCUITO_MIN_CHAMADAS = int(os.getenv('CIRCUITO_MIN_CHAMADAS', '10'))
+CIRCUITO_TAXA_FALHA = float(os.getenv('CIRCUITO_TAXA_FALHA', '0.5'))
+CIRCUITO_LATENCIA_LENTA_MS = int(os.getenv('CIRCUITO_LATENCIA_LENTA_MS', '5000'))
+CIRCUITO_TAXA_LENTA = float(os.getenv('CIRCUITO_TAXA_LENTA', '0.8'))
+CIRCUITO_TEMPO_ABERTO_S = int(os.getenv('CIRCUITO_TEMPO_ABERTO_S', '30'))
+
+# Cache de contatos do Digisac (services/cache.py): no Redis quando disponível,
+# senão LRU em memória por processo com no máximo CONTATOS_CACHE_MAX itens.
+# Contatos inexistentes (404) ficam em cache negativo por um tempo menor.
+CONTATOS_CACHE_TTL_S = int(os.getenv('CONTATOS_CACHE_TTL_S', '3600'))
+CONTATOS_CACHE_TTL_AUSENTE_S = int(os.getenv('CONTATOS_CACHE_TTL_AUSENTE_S', '300'))
+CONTATOS_CACHE_MAX = int(os.getenv('CONTATOS_CACHE_MAX', '20000'))
+# Listagem completa (listar_contatos) reaproveitada por este tempo
+CONTATOS_LISTA_TTL_S = int(os.getenv('CONTATOS_LISTA_TTL_S', '300'))
+# Prefetch: acima deste número de contatos fora do cache, uma listagem paginada
+# (200 por página) sai mais barata que uma consulta por contato
+CONTATOS_PREFETCH_LISTAGEM_MIN = int(os.getenv('CONTATOS_PREFETCH_LISTAGEM_MIN', '200'))
+CONTATOS_PREFETCH_PARALELO = int(os.getenv('CONTATOS_PREFETCH_PARALELO', '4'))
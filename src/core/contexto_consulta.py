@@ -0,0 +1,89 @@
+"""
+Contexto de consultas da requisição HTTP atual
+
+- orçamento de statement_timeout por rota (prefixo do caminho)
+- registro das conexões em uso, para cancelar as consultas em andamento
+  quando o cliente HTTP desconecta
+- contadores de timeouts, cancelamentos e pool esgotado por rota
+"""
+
+import logging
+import threading
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional, Set
+
+from .config import DB_STATEMENT_TIMEOUT_MS, DB_STATEMENT_TIMEOUT_ROTAS
+
+logger = logging.getLogger(__name__)
+
+_contexto: ContextVar[Optional['ContextoConsulta']] = ContextVar('contexto_consulta', default=None)
+
+_metricas: Dict[str, Dict[str, int]] = {}
+_metricas_lock = threading.Lock()
+
+
+class ContextoConsulta:
+    def __init__(self, rota: str, timeout_ms: int):
+        self.rota = rota
+        self.timeout_ms = timeout_ms
+        self.cancelado = False
+        self._conexoes: Set[Any] = set()
+        self._lock = threading.Lock()
+
+    def registrar(self, conn):
+        with self._lock:
+            self._conexoes.add(conn)
+
+    def liberar(self, conn):
+        """Chamado antes de devolver a conexão ao pool: depois disso ela não é mais cancelada"""
+        with self._lock:
+            self._conexoes.discard(conn)
+
+    def cancelar(self) -> int:
+        """Cancela as consultas em andamento; retorna quantas conexões estavam em uso"""
+        with self._lock:
+            self.cancelado = True
+            for conn in self._conexoes:
+                try:
+                    conn.cancel()
+                except Exception as e:
+                    logger.warning(f"Falha ao cancelar consulta de {self.rota}: {e}")
+            return len(self._conexoes)
+
+
+def orcamento_rota(caminho: str) -> int:
+    """statement_timeout (ms) do prefixo mais longo que casa com o caminho; 0 = padrão do servidor"""
+    melhor = ''
+    for prefixo in DB_STATEMENT_TIMEOUT_ROTAS:
+        if caminho.startswith(prefixo) and len(prefixo) > len(melhor):
+            melhor = prefixo
+    return DB_STATEMENT_TIMEOUT_ROTAS[melhor] if melhor else DB_STATEMENT_TIMEOUT_MS
+
+
+def prefixo_rota(caminho: str) -> str:
+    """Agrupamento das métricas: /api/<recurso>"""
+    return '/'.join(caminho.split('/')[:3]) or '/'
+
+
+def ativar(contexto: ContextoConsulta) -> Token:
+    return _contexto.set(contexto)
+
+
+def desativar(token: Token):
+    _contexto.reset(token)
+
+
+def contexto_atual() -> Optional[ContextoConsulta]:
+    return _contexto.get()
+
+
+def registrar_evento(rota: str, evento: str):
+    """evento: 'timeouts', 'cancelados' ou 'pool_esgotado'"""
+    with _metricas_lock:
+        contagem = _metricas.setdefault(rota, {'timeouts': 0, 'cancelados': 0, 'pool_esgotado': 0})
+        contagem[evento] += 1
+
+
+def metricas_consultas() -> Dict[str, Dict[str, int]]:
+    with _metricas_lock:
+        return {rota: dict(contagem) for rota, contagem in _metricas.items()}
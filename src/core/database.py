@@ -1,80 +1,576 @@
 import psycopg2
+import psycopg2.extensions
+import hashlib
 import logging
+import os
+import threading
 from contextlib import contextmanager
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from psycopg2.extensions import QueryCanceledError
+from psycopg2.extras import execute_values, Json
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
+from datetime import date, datetime
+import uuid
+from collections import OrderedDict
 from models.models import Cliente, MessageTemplate
+from .pool import PoolConexoes, PoolEsgotadoError
+from .replicas import RoteadorReplicas
+from .contexto_consulta import contexto_atual, registrar_evento
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Mensagem do histórico: texto completo ou reconstruída a partir da versão do template (modo compacto)
+SQL_MENSAGEM_ENVIO = "COALESCE(he.mensagem, renderizar_template(tv.template_text, he.variaveis))"
+SQL_JOIN_VERSAO = "LEFT JOIN template_versoes tv ON tv.id = he.template_versao_id"
+
+# Versão por coleção (ETag das listagens): incrementada a cada comando que altera a
+# tabela, na mesma transação; leitores nunca veem a versão nova antes dos dados
+SQL_FUNCAO_VERSAO_COLECAO = """
+CREATE OR REPLACE FUNCTION incrementar_versao_colecao()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO colecao_versoes (colecao, versao, atualizado_em)
+    VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (colecao) DO UPDATE
+    SET versao = colecao_versoes.versao + 1, atualizado_em = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END
+$$
+"""
+
+# Versões de template lembradas por processo (LRU): textos distintos de mensagem_padrao
+# não fazem a memória crescer sem limite
+VERSOES_CACHE_MAX = 1000
+
+# Reivindicações do reenvio de falhas (ReenvioService) começam com este prefixo
+PREFIXO_REIVINDICACAO_REENVIO = 'reenvio:'
+
+# Telemetria de envios: dimensões aceitas em telemetria_envios (expressão, ordenação)
+DIMENSOES_TELEMETRIA = {
+    'template': ("COALESCE(he.template_usado, '(mensagem avulsa)')", 'envios DESC'),
+    'hora': ('EXTRACT(HOUR FROM he.data_envio)::INTEGER', 'grupo'),
+    'dia': ('he.data_envio::DATE', 'grupo'),
+    'lote': ("COALESCE(he.lote_id, '(sem lote)')", 'envios DESC'),
+}
+
+# Canal LISTEN/NOTIFY do painel ao vivo (services/painel_ao_vivo.py)
+CANAL_PAINEL = 'painel'
+
+# Envios: delta de envios do mês e até 20 ids alterados por comando (os mais recentes)
+SQL_FUNCAO_PAINEL_HISTORICO = """
+CREATE OR REPLACE FUNCTION painel_notificar_historico()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    ids JSON;
+    envios_mes BIGINT := 0;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT COUNT(*) FILTER (WHERE data_envio >= DATE_TRUNC('month', CURRENT_DATE))
+        INTO envios_mes FROM novas;
+        SELECT json_agg(id) INTO ids FROM (SELECT id FROM novas ORDER BY id DESC LIMIT 20) r;
+    ELSE
+        SELECT json_agg(id) INTO ids FROM (
+            SELECT n.id FROM novas n JOIN antigas a ON a.id = n.id
+            WHERE n.status IS DISTINCT FROM a.status
+               OR n.status_entrega IS DISTINCT FROM a.status_entrega
+            ORDER BY n.id DESC LIMIT 20
+        ) r;
+    END IF;
+    IF ids IS NOT NULL OR envios_mes <> 0 THEN
+        -- clock_timestamp() evita que notificações iguais na mesma transação sejam fundidas
+        PERFORM pg_notify('painel', json_build_object(
+            'ids', COALESCE(ids, '[]'::json),
+            'delta', json_build_object('cobrancas_mes', envios_mes),
+            'em', clock_timestamp()
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Clientes: deltas de total, ativos e inativos/suspensos
+SQL_FUNCAO_PAINEL_CLIENTES = """
+CREATE OR REPLACE FUNCTION painel_notificar_clientes()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    novos_total BIGINT := 0;
+    novos_ativos BIGINT := 0;
+    novos_inativos BIGINT := 0;
+    antigos_total BIGINT := 0;
+    antigos_ativos BIGINT := 0;
+    antigos_inativos BIGINT := 0;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE status = 'ativo'), COUNT(*) FILTER (WHERE status <> 'ativo')
+        INTO novos_total, novos_ativos, novos_inativos FROM novas;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE status = 'ativo'), COUNT(*) FILTER (WHERE status <> 'ativo')
+        INTO antigos_total, antigos_ativos, antigos_inativos FROM antigas;
+    END IF;
+    IF novos_total <> antigos_total OR novos_ativos <> antigos_ativos OR novos_inativos <> antigos_inativos THEN
+        PERFORM pg_notify('painel', json_build_object(
+            'ids', '[]'::json,
+            'delta', json_build_object(
+                'total_clientes', novos_total - antigos_total,
+                'clientes_ativos', novos_ativos - antigos_ativos,
+                'clientes_inadimplentes', novos_inativos - antigos_inativos
+            ),
+            'em', clock_timestamp()
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Agregados de desempenho (lotes_envio e envios_template_dia): contadores mantidos por
+# trigger na mesma transação de cada escrita em historico_envios (enfileirar, concluir,
+# reenviar, devolver), então as consultas de desempenho não varrem o histórico.
+# Soma contadores em JSONB ({"timeout": 3} + {"timeout": -1, "http_5xx": 2}), sem zeros
+SQL_FUNCAO_SOMAR_CONTADORES = """
+CREATE OR REPLACE FUNCTION somar_contadores(a JSONB, b JSONB)
+RETURNS JSONB LANGUAGE sql IMMUTABLE AS $$
+    SELECT COALESCE(jsonb_object_agg(chave, total), '{}'::JSONB)
+    FROM (
+        SELECT chave, SUM(valor::BIGINT) AS total
+        FROM (
+            SELECT * FROM jsonb_each_text(COALESCE(a, '{}'::JSONB))
+            UNION ALL
+            SELECT * FROM jsonb_each_text(COALESCE(b, '{}'::JSONB))
+        ) c(chave, valor)
+        GROUP BY chave
+        HAVING SUM(valor::BIGINT) <> 0
+    ) s
+$$
+"""
+
+# Deltas por (lote, template, dia, status, classe de erro): +1 no estado novo, -1 no antigo.
+# Lotes são atualizados em ordem de lote_id (ordem fixa de locks entre workers)
+SQL_FUNCAO_AGREGADOS_ENVIOS = """
+CREATE OR REPLACE FUNCTION acumular_agregados_envios()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    mudancas JSONB;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT tipo, lote_id, COALESCE(template_usado, '(mensagem avulsa)') AS template,
+                   data_envio::DATE AS dia, status, COALESCE(erro_classe, 'desconhecido') AS erro_classe,
+                   COUNT(*) AS n
+            FROM novas GROUP BY 1, 2, 3, 4, 5, 6
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT tipo, lote_id, COALESCE(template_usado, '(mensagem avulsa)') AS template,
+                   data_envio::DATE AS dia, status, COALESCE(erro_classe, 'desconhecido') AS erro_classe,
+                   -COUNT(*) AS n
+            FROM antigas GROUP BY 1, 2, 3, 4, 5, 6
+        ) d;
+    ELSE
+        SELECT jsonb_agg(d) INTO mudancas FROM (
+            SELECT v.tipo, v.lote_id, v.template, v.dia, v.status, v.erro_classe, SUM(v.sinal) AS n
+            FROM novas n
+            JOIN antigas a ON a.id = n.id
+            CROSS JOIN LATERAL (VALUES
+                (1, n.tipo, n.lote_id, COALESCE(n.template_usado, '(mensagem avulsa)'), n.data_envio::DATE,
+                 n.status, COALESCE(n.erro_classe, 'desconhecido')),
+                (-1, a.tipo, a.lote_id, COALESCE(a.template_usado, '(mensagem avulsa)'), a.data_envio::DATE,
+                 a.status, COALESCE(a.erro_classe, 'desconhecido'))
+            ) AS v(sinal, tipo, lote_id, template, dia, status, erro_classe)
+            -- Webhooks de entrega e reivindicações sem mudança de status não geram escrita
+            WHERE (n.status, n.erro_classe, n.lote_id, n.template_usado, n.data_envio::DATE)
+                  IS DISTINCT FROM (a.status, a.erro_classe, a.lote_id, a.template_usado, a.data_envio::DATE)
+            GROUP BY 1, 2, 3, 4, 5, 6
+            HAVING SUM(v.sinal) <> 0
+        ) d;
+    END IF;
+
+    IF mudancas IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH m AS (
+        SELECT * FROM jsonb_to_recordset(mudancas)
+        AS x(tipo TEXT, lote_id TEXT, template TEXT, dia DATE, status TEXT, erro_classe TEXT, n BIGINT)
+        WHERE lote_id IS NOT NULL
+    ),
+    classes AS (
+        SELECT lote_id, jsonb_object_agg(erro_classe, n) AS erros_por_classe
+        FROM (SELECT lote_id, erro_classe, SUM(n) AS n FROM m WHERE status = 'erro'
+              GROUP BY 1, 2 HAVING SUM(n) <> 0) c
+        GROUP BY lote_id
+    )
+    INSERT INTO lotes_envio AS l
+        (lote_id, tipo, template_usado, total, pendentes, processando, enviados, erros,
+         erros_por_classe, concluido_em)
+    SELECT d.lote_id, d.tipo, d.template, d.total, d.pendentes, d.processando, d.enviados, d.erros,
+           COALESCE(c.erros_por_classe, '{}'::JSONB),
+           CASE WHEN d.pendentes + d.processando = 0 THEN CURRENT_TIMESTAMP END
+    FROM (
+        SELECT lote_id, MIN(tipo) AS tipo, MIN(template) AS template, SUM(n) AS total,
+               COALESCE(SUM(n) FILTER (WHERE status = 'pendente'), 0) AS pendentes,
+               COALESCE(SUM(n) FILTER (WHERE status = 'processando'), 0) AS processando,
+               COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0) AS enviados,
+               COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0) AS erros
+        FROM m GROUP BY lote_id
+    ) d
+    LEFT JOIN classes c USING (lote_id)
+    ORDER BY d.lote_id
+    ON CONFLICT (lote_id) DO UPDATE SET
+        total = l.total + EXCLUDED.total,
+        pendentes = l.pendentes + EXCLUDED.pendentes,
+        processando = l.processando + EXCLUDED.processando,
+        enviados = l.enviados + EXCLUDED.enviados,
+        erros = l.erros + EXCLUDED.erros,
+        erros_por_classe = somar_contadores(l.erros_por_classe, EXCLUDED.erros_por_classe),
+        atualizado_em = CURRENT_TIMESTAMP,
+        concluido_em = CASE
+            WHEN l.pendentes + EXCLUDED.pendentes + l.processando + EXCLUDED.processando = 0
+            THEN COALESCE(l.concluido_em, CURRENT_TIMESTAMP)
+        END;
+
+    -- Por template e dia: só interessam volume e resultado (pendente <-> processando não conta)
+    WITH m AS (
+        SELECT * FROM jsonb_to_recordset(mudancas)
+        AS x(template TEXT, dia DATE, status TEXT, erro_classe TEXT, n BIGINT)
+        WHERE dia IS NOT NULL
+    ),
+    classes AS (
+        SELECT template, dia, jsonb_object_agg(erro_classe, n) AS erros_por_classe
+        FROM (SELECT template, dia, erro_classe, SUM(n) AS n FROM m WHERE status = 'erro'
+              GROUP BY 1, 2, 3 HAVING SUM(n) <> 0) c
+        GROUP BY template, dia
+    )
+    INSERT INTO envios_template_dia AS e (template, dia, total, enviados, erros, erros_por_classe)
+    SELECT d.template, d.dia, d.total, d.enviados, d.erros, COALESCE(c.erros_por_classe, '{}'::JSONB)
+    FROM (
+        SELECT template, dia, SUM(n) AS total,
+               COALESCE(SUM(n) FILTER (WHERE status = 'enviado'), 0) AS enviados,
+               COALESCE(SUM(n) FILTER (WHERE status = 'erro'), 0) AS erros
+        FROM m GROUP BY template, dia
+        HAVING SUM(n) <> 0 OR bool_or(status IN ('enviado', 'erro'))
+    ) d
+    LEFT JOIN classes c USING (template, dia)
+    ORDER BY d.template, d.dia
+    ON CONFLICT (template, dia) DO UPDATE SET
+        total = e.total + EXCLUDED.total,
+        enviados = e.enviados + EXCLUDED.enviados,
+        erros = e.erros + EXCLUDED.erros,
+        erros_por_classe = somar_contadores(e.erros_por_classe, EXCLUDED.erros_por_classe),
+        atualizado_em = CURRENT_TIMESTAMP;
+
+    RETURN NULL;
+END
+$$
+"""
+
+# Statements quentes, preparados uma vez por conexão (PREPARE) e executados por nome.
+# nome -> (tipos dos parâmetros, SQL com %s na ordem dos tipos)
+STATEMENTS_PREPARADOS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    'cliente_por_id': (('integer',), """
+        SELECT id, nome, digisac_contact_id, telefone, email
+        FROM clientes WHERE id = %s
+    """),
+    'template_por_nome': (('text',), """
+        SELECT id, nome, template_text, variaveis, ativo, tipo
+        FROM message_templates WHERE nome = %s
+    """),
+    'registrar_envio': (
+        ('integer', 'text', 'text', 'text', 'integer', 'jsonb', 'text', 'integer',
+         'text', 'text', 'text', 'timestamp', 'text', 'text',
+         'integer', 'smallint', 'integer[]'), """
+        INSERT INTO historico_envios
+        (cliente_id, tipo, template_usado, mensagem, template_versao_id, variaveis,
+         status, tentativas, erro_detalhe,
+         digisac_message_id, status_entrega, status_entrega_em, lote_id, erro_classe,
+         latencia_ms, http_status, tentativas_ms)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """),
+    'historico_cliente': (('integer', 'bigint'), f"""
+        SELECT he.id, he.tipo, he.template_usado, {SQL_MENSAGEM_ENVIO}, he.status,
+               he.data_envio, he.tentativas, he.erro_detalhe,
+               he.status_entrega, he.status_entrega_em
+        FROM historico_envios he
+        {SQL_JOIN_VERSAO}
+        WHERE he.cliente_id = %s
+        ORDER BY he.data_envio DESC
+        LIMIT %s
+    """),
+    'estatisticas_envios': (('integer',), """
+        SELECT
+            COUNT(*) as total,
+            COUNT(CASE WHEN status = 'enviado' THEN 1 END) as enviados,
+            COUNT(CASE WHEN status = 'erro' THEN 1 END) as erros,
+            COUNT(CASE WHEN status = 'pendente' THEN 1 END) as pendentes,
+            COUNT(CASE WHEN tipo = 'financeira' THEN 1 END) as financeiros,
+            COUNT(CASE WHEN tipo = 'documento' THEN 1 END) as documentos
+        FROM historico_envios
+        WHERE data_envio >= CURRENT_DATE - make_interval(days => %s)
+    """),
+    'dashboard_total_clientes': ((), "SELECT COUNT(*) FROM clientes"),
+    'dashboard_clientes_ativos': ((), "SELECT COUNT(*) FROM clientes WHERE status = 'ativo'"),
+    'dashboard_clientes_inativos': ((), "SELECT COUNT(*) FROM clientes WHERE status != 'ativo'"),
+    'dashboard_envios_mes': ((), """
+        SELECT COUNT(*) FROM historico_envios
+        WHERE data_envio >= DATE_TRUNC('month', CURRENT_DATE)
+    """),
+    'dashboard_envios_pendentes': ((), "SELECT COUNT(*) FROM historico_envios WHERE status = 'pendente'"),
+    'dashboard_taxa_sucesso_30d': ((), """
+        SELECT
+            COUNT(CASE WHEN status = 'enviado' THEN 1 END)::float /
+            NULLIF(COUNT(*), 0) * 100
+        FROM historico_envios
+        WHERE data_envio >= CURRENT_DATE - INTERVAL '30 days'
+    """),
+    'dashboard_periodo_total': (('integer', 'integer'), """
+        SELECT COUNT(*) FROM historico_envios
+        WHERE EXTRACT(MONTH FROM data_envio) = %s
+          AND EXTRACT(YEAR FROM data_envio) = %s
+    """),
+    'dashboard_periodo_por_tipo': (('integer', 'integer'), """
+        SELECT tipo, COUNT(*)
+        FROM historico_envios
+        WHERE EXTRACT(MONTH FROM data_envio) = %s
+          AND EXTRACT(YEAR FROM data_envio) = %s
+        GROUP BY tipo
+    """),
+    'dashboard_periodo_taxa': (('integer', 'integer'), """
+        SELECT
+            COUNT(CASE WHEN status = 'enviado' THEN 1 END)::float /
+            NULLIF(COUNT(*), 0) * 100
+        FROM historico_envios
+        WHERE EXTRACT(MONTH FROM data_envio) = %s
+          AND EXTRACT(YEAR FROM data_envio) = %s
+    """),
+    'versao_colecao': (('text',), """
+        SELECT versao FROM colecao_versoes WHERE colecao = %s
+    """),
+}
+
+
+def sql_prepare(nome: str) -> str:
+    """Comando PREPARE do statement registrado (%s -> $1, $2, ...)"""
+    tipos, sql = STATEMENTS_PREPARADOS[nome]
+    partes = sql.split('%s')
+    corpo = partes[0] + ''.join(f'${i}{parte}' for i, parte in enumerate(partes[1:], 1))
+    assinatura = f" ({', '.join(tipos)})" if tipos else ''
+    return f"PREPARE {nome}{assinatura} AS {corpo}"
+
+
+def sql_execute(nome: str) -> str:
+    """Comando EXECUTE do statement registrado, com placeholders para o psycopg2"""
+    tipos, _ = STATEMENTS_PREPARADOS[nome]
+    return f"EXECUTE {nome} ({', '.join(['%s'] * len(tipos))})" if tipos else f"EXECUTE {nome}"
+
+
+# invalid_sql_statement_name, duplicate_prepared_statement, feature_not_supported
+# ("cached plan must not change result type")
+ERROS_STATEMENT_PREPARADO = {'26000', '42P05', '0A000'}
+
+
+class ConexaoPreparada(psycopg2.extensions.connection):
+    """Conexão que lembra quais statements já foram preparados na sessão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas: Set[str] = set()
+        # Após erro de statement preparado, limpa a sessão antes de preparar de novo
+        self.desalocar = False
+
+
 class DatabaseManager:
     """Gerenciador simplificado do banco de dados - Foco em envio de mensagens"""
     
-    def __init__(self, connection_string: str = None):
-        from .config import POSTGRES_CONNECTION_STRING
+    def __init__(self, connection_string: str = None, replica_dsns: List[str] = None):
+        from .config import POSTGRES_CONNECTION_STRING, DB_REPLICA_DSNS
         self.connection_string = connection_string or POSTGRES_CONNECTION_STRING
+        self.replica_dsns = DB_REPLICA_DSNS if replica_dsns is None else replica_dsns
+        self._versoes_cache: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+        self._versoes_lock = threading.Lock()
         self._init_pool()
         self.init_database()
 
     def _init_pool(self):
-        """Inicializa pool de conexões"""
-        try:
-            from psycopg2.pool import SimpleConnectionPool
-            self.pool = SimpleConnectionPool(
-                minconn=5,
-                maxconn=20,
-                dsn=self.connection_string,
-                connect_timeout=10,
-                keepalives=1,
-                keepalives_idle=30,
-                keepalives_interval=10,
-                keepalives_count=3
-            )
-        except ImportError:
-            self.pool = None
-            logger.warning("SimpleConnectionPool não disponível, usando conexões diretas")
+        """Inicializa pool de conexões do primário e das réplicas de leitura"""
+        from .config import DB_REPLICA_MAX_LAG_S, DB_REPLICA_VERIFICAR_S
+        minconn, maxconn = calcular_tamanho_pool()
+        # Instância compartilhada entre threads (threadpool do FastAPI e processadores)
+        self.pool = self._criar_pool(self.connection_string, minconn, maxconn)
+        # Réplicas abrem conexões sob demanda: uma réplica fora do ar não impede o boot
+        self.replicas = RoteadorReplicas(
+            self.replica_dsns,
+            lambda dsn: self._criar_pool(dsn, 0, maxconn, connect_timeout=3),
+            max_lag_s=DB_REPLICA_MAX_LAG_S,
+            intervalo_verificacao_s=DB_REPLICA_VERIFICAR_S
+        )
+
+    @staticmethod
+    def _criar_pool(dsn: str, minconn: int, maxconn: int, connect_timeout: int = 10) -> PoolConexoes:
+        from .config import (
+            DB_POOL_TIMEOUT_S, DB_CONN_MAX_LIFETIME_S, DB_CONN_IDLE_TIMEOUT_S, DB_CONN_VALIDAR_APOS_S
+        )
+        return PoolConexoes(
+            dsn=dsn,
+            minconn=minconn,
+            maxconn=maxconn,
+            max_lifetime_s=DB_CONN_MAX_LIFETIME_S,
+            idle_timeout_s=DB_CONN_IDLE_TIMEOUT_S,
+            checkout_timeout_s=DB_POOL_TIMEOUT_S,
+            validar_apos_s=DB_CONN_VALIDAR_APOS_S,
+            connection_factory=ConexaoPreparada,
+            connect_timeout=connect_timeout,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
+        )
 
     @contextmanager
-    def get_connection(self):
-        """Context manager para gerenciar conexões"""
+    def get_connection(self, somente_leitura: bool = False, statement_timeout_ms: int = None):
+        """
+        Context manager para gerenciar conexões.
+        
+        somente_leitura=True usa uma réplica elegível (disponível e com lag abaixo
+        de DB_REPLICA_MAX_LAG_S), caindo para o primário se não houver. Use só
+        em leituras que toleram alguns segundos de atraso (dashboard, listagens,
+        exportações); leituras logo após escrever ficam no primário.
+        
+        Dentro de uma requisição HTTP, a transação recebe o statement_timeout da
+        rota (SET LOCAL) e a conexão fica registrada para ser cancelada se o
+        cliente desconectar (ver core/contexto_consulta.py).
+        
+        Conexões que falharam com OperationalError/InterfaceError (ou que
+        ficaram fechadas) são descartadas do pool em vez de reaproveitadas.
+        """
+        contexto = contexto_atual()
+        if statement_timeout_ms is None:
+            statement_timeout_ms = contexto.timeout_ms if contexto else 0
+        rota = contexto.rota if contexto else None
+        
         conn = None
+        pool = self.pool
+        replica = self.replicas.escolher() if somente_leitura else None
+        descartar = False
         try:
-            if self.pool:
-                conn = self.pool.getconn()
-            else:
-                conn = psycopg2.connect(
-                    self.connection_string,
-                    connect_timeout=10
-                )
+            if contexto and contexto.cancelado:
+                raise ConsultaCanceladaError("Cliente desconectou; consulta não iniciada")
+            
+            if replica:
+                try:
+                    conn = replica.pool.getconn()
+                    pool = replica.pool
+                except (psycopg2.Error, PoolEsgotadoError) as e:
+                    logger.warning(f"Réplica {replica.host} indisponível ({e}), usando o primário")
+                    self.replicas.falhou(replica)
+                    replica = None
+            
+            if conn is None:
+                try:
+                    conn = self.pool.getconn()
+                except PoolEsgotadoError as e:
+                    logger.error(str(e))
+                    if rota:
+                        registrar_evento(rota, 'pool_esgotado')
+                    raise DatabasePoolEsgotadoError(str(e))
             
             conn.autocommit = False
+            if contexto:
+                contexto.registrar(conn)
+            if statement_timeout_ms:
+                cursor = conn.cursor()
+                cursor.execute('SET LOCAL statement_timeout = %s', (int(statement_timeout_ms),))
+                cursor.close()
             yield conn
             conn.commit()
             
-        except psycopg2.OperationalError as e:
+        except QueryCanceledError as e:
+            # statement_timeout estourado ou cancelamento por desconexão: a conexão continua boa
+            descartar = not self._rollback(conn)
+            if contexto and contexto.cancelado:
+                logger.info(f"Consulta de {rota} cancelada: cliente desconectou")
+                registrar_evento(rota, 'cancelados')
+                raise ConsultaCanceladaError("Cliente desconectou; consulta cancelada")
+            logger.warning(f"Consulta excedeu statement_timeout de {statement_timeout_ms}ms ({rota or 'sem rota'}): {e}")
+            if rota:
+                registrar_evento(rota, 'timeouts')
+            raise DatabaseTimeoutError(f"Consulta excedeu o tempo limite de {statement_timeout_ms}ms")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
             logger.error(f"Falha de conexão PostgreSQL: {e}")
-            if conn:
-                conn.rollback()
+            descartar = True
+            if replica:
+                self.replicas.falhou(replica)
+            self._rollback(conn)
             raise DatabaseConnectionError(f"Erro de conexão com o banco: {e}")
         except psycopg2.Error as e:
             logger.error(f"Erro PostgreSQL: {e}")
-            if conn:
-                conn.rollback()
+            descartar = not self._rollback(conn)
             raise DatabaseError(f"Erro de banco de dados: {e}")
         except Exception as e:
-            logger.error(f"Erro inesperado: {e}")
-            if conn:
-                conn.rollback()
+            if not isinstance(e, DatabaseError):
+                logger.error(f"Erro inesperado: {e}")
+            descartar = not self._rollback(conn)
             raise
         finally:
-            if conn and self.pool:
-                self.pool.putconn(conn)
-            elif conn:
-                conn.close()
+            if conn:
+                if contexto:
+                    contexto.liberar(conn)
+                pool.putconn(conn, descartar=descartar or bool(conn.closed))
+
+    @staticmethod
+    def _rollback(conn) -> bool:
+        """Rollback tolerante a conexão quebrada; False se a conexão não é mais utilizável"""
+        if conn is None or conn.closed:
+            return conn is None
+        try:
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def pool_metricas(self) -> Dict[str, Any]:
+        """Conexões em uso, ociosas, threads aguardando e contadores do pool"""
+        return self.pool.metricas()
+
+    def replicas_info(self) -> List[Dict[str, Any]]:
+        """Disponibilidade, lag e pool de cada réplica de leitura"""
+        return self.replicas.info()
+
+    def executar_preparada(self, cursor, nome: str, params: Tuple = ()):
+        """
+        Executa um statement de STATEMENTS_PREPARADOS pelo nome.
+        
+        O PREPARE acontece no primeiro uso em cada conexão do pool; as execuções
+        seguintes pulam parse e planejamento. Com DB_PREPARED_STATEMENTS=false
+        (PgBouncer em modo transaction) executa o SQL direto.
+        """
+        from .config import DB_PREPARED_STATEMENTS
+        
+        conn = cursor.connection
+        if not DB_PREPARED_STATEMENTS or not isinstance(conn, ConexaoPreparada):
+            cursor.execute(STATEMENTS_PREPARADOS[nome][1], params)
+            return
+        
+        try:
+            if conn.desalocar:
+                cursor.execute('DEALLOCATE ALL')
+                conn.preparadas.clear()
+                conn.desalocar = False
+            if nome not in conn.preparadas:
+                cursor.execute(sql_prepare(nome))
+                conn.preparadas.add(nome)
+            cursor.execute(sql_execute(nome), params)
+        except psycopg2.Error as e:
+            # Statement sumiu (DISCARD ALL), já existia ou ficou inválido (mudança de
+            # schema): a transação abortou, então a sessão é limpa no próximo uso
+            if e.pgcode in ERROS_STATEMENT_PREPARADO:
+                conn.desalocar = True
+            raise
 
     def init_database(self):
-        """Inicializa schema simplificado - apenas 3 tabelas"""
+        """Inicializa schema simplificado"""
         tables = [
             '''
             CREATE TABLE IF NOT EXISTS clientes (
@@ -84,6 +580,8 @@ class DatabaseManager:
                 telefone TEXT,
                 email TEXT,
                 status TEXT DEFAULT 'ativo' CHECK (status IN ('ativo', 'inativo', 'suspenso')),
+                tags TEXT[] NOT NULL DEFAULT '{}',
+                telefone_e164 TEXT GENERATED ALWAYS AS (normalizar_telefone(telefone)) STORED,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
@@ -100,36 +598,189 @@ class DatabaseManager:
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             ''',
+            # Versão é um retrato imutável referenciado pelo histórico: sobrevive ao template.
+            # template_id sem FK (SET NULL colidiria no índice único com a versão avulsa de
+            # mesmo texto; CASCADE esbarraria no histórico compacto que usa a versão)
+            '''
+            CREATE TABLE IF NOT EXISTS template_versoes (
+                id SERIAL PRIMARY KEY,
+                template_id INTEGER,
+                template_text TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS colecao_versoes (
+                colecao TEXT PRIMARY KEY,
+                versao BIGINT NOT NULL DEFAULT 1,
+                atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
             '''
             CREATE TABLE IF NOT EXISTS historico_envios (
                 id SERIAL PRIMARY KEY,
                 cliente_id INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
                 tipo TEXT DEFAULT 'financeira' CHECK (tipo IN ('financeira', 'documento', 'geral')),
                 template_usado TEXT,
-                mensagem TEXT NOT NULL,
-                status TEXT NOT NULL CHECK (status IN ('enviado', 'erro', 'pendente')),
+                mensagem TEXT,
+                template_versao_id INTEGER REFERENCES template_versoes(id),
+                variaveis JSONB,
+                status TEXT NOT NULL CHECK (status IN ('enviado', 'erro', 'pendente', 'processando')),
                 data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 tentativas INTEGER DEFAULT 1,
-                erro_detalhe TEXT
+                erro_detalhe TEXT,
+                digisac_message_id TEXT,
+                status_entrega TEXT CHECK (status_entrega IN ('enviado', 'entregue', 'lido', 'falhou')),
+                status_entrega_em TIMESTAMP,
+                lote_id TEXT,
+                erro_classe TEXT,
+                chave_idempotencia TEXT,
+                reivindicacao TEXT,
+                reivindicado_em TIMESTAMP,
+                latencia_ms INTEGER,
+                http_status SMALLINT,
+                tentativas_ms INTEGER[],
+                CONSTRAINT historico_envios_mensagem_ou_versao
+                    CHECK (mensagem IS NOT NULL OR template_versao_id IS NOT NULL)
+            )
+            ''',
+            # Lote/campanha: contadores mantidos por acumular_agregados_envios()
+            '''
+            CREATE TABLE IF NOT EXISTS lotes_envio (
+                lote_id TEXT PRIMARY KEY,
+                tipo TEXT,
+                template_usado TEXT,
+                criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                concluido_em TIMESTAMP,
+                total INTEGER NOT NULL DEFAULT 0,
+                pendentes INTEGER NOT NULL DEFAULT 0,
+                processando INTEGER NOT NULL DEFAULT 0,
+                enviados INTEGER NOT NULL DEFAULT 0,
+                erros INTEGER NOT NULL DEFAULT 0,
+                erros_por_classe JSONB NOT NULL DEFAULT '{}'
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS envios_template_dia (
+                template TEXT NOT NULL,
+                dia DATE NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                enviados INTEGER NOT NULL DEFAULT 0,
+                erros INTEGER NOT NULL DEFAULT 0,
+                erros_por_classe JSONB NOT NULL DEFAULT '{}',
+                atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (template, dia)
             )
             '''
         ]
 
+        functions = [
+            # Reconstrói a mensagem de envios armazenados em modo compacto
+            '''
+            CREATE OR REPLACE FUNCTION renderizar_template(texto TEXT, variaveis JSONB)
+            RETURNS TEXT LANGUAGE plpgsql IMMUTABLE AS $$
+            DECLARE
+                v RECORD;
+                resultado TEXT := texto;
+            BEGIN
+                IF variaveis IS NULL THEN
+                    RETURN resultado;
+                END IF;
+                FOR v IN SELECT key, value FROM jsonb_each_text(variaveis) LOOP
+                    resultado := replace(resultado, '${' || v.key || '}', COALESCE(v.value, ''));
+                END LOOP;
+                RETURN resultado;
+            END
+            $$
+            ''',
+            # Telefone em E.164 (+5511999999999); sem DDI assume o Brasil. NULL se não der para normalizar
+            '''
+            CREATE OR REPLACE FUNCTION normalizar_telefone(telefone TEXT, ddi_padrao TEXT DEFAULT '55')
+            RETURNS TEXT LANGUAGE plpgsql IMMUTABLE AS $$
+            DECLARE
+                digitos TEXT := regexp_replace(COALESCE(telefone, ''), '[^0-9]', '', 'g');
+            BEGIN
+                IF btrim(COALESCE(telefone, '')) LIKE '+%' THEN
+                    NULL;  -- já tem DDI
+                ELSIF digitos LIKE '00%' THEN
+                    digitos := substr(digitos, 3);  -- prefixo internacional
+                ELSIF length(ltrim(digitos, '0')) IN (10, 11) THEN
+                    digitos := ddi_padrao || ltrim(digitos, '0');  -- DDD + número, com ou sem 0 de tronco
+                END IF;
+                IF length(digitos) < 10 OR length(digitos) > 15 THEN
+                    RETURN NULL;
+                END IF;
+                RETURN '+' || digitos;
+            END
+            $$
+            ''',
+            # Painel ao vivo: um NOTIFY por comando (não por linha) com os deltas das
+            # estatísticas e os ids alterados; entregue só no COMMIT
+            SQL_FUNCAO_PAINEL_HISTORICO,
+            SQL_FUNCAO_PAINEL_CLIENTES,
+            SQL_FUNCAO_VERSAO_COLECAO,
+            SQL_FUNCAO_SOMAR_CONTADORES,
+            SQL_FUNCAO_AGREGADOS_ENVIOS
+        ]
+
+        # Triggers por comando; com tabelas de transição é uma por evento (exigência do PostgreSQL)
+        triggers = [
+            ('clientes', 'trg_versao_clientes', 'INSERT OR UPDATE OR DELETE OR TRUNCATE', None,
+             'incrementar_versao_colecao'),
+            ('message_templates', 'trg_versao_message_templates', 'INSERT OR UPDATE OR DELETE OR TRUNCATE', None,
+             'incrementar_versao_colecao'),
+            ('historico_envios', 'trg_painel_historico_insert', 'INSERT', 'NEW TABLE AS novas',
+             'painel_notificar_historico'),
+            ('historico_envios', 'trg_painel_historico_update', 'UPDATE', 'OLD TABLE AS antigas NEW TABLE AS novas',
+             'painel_notificar_historico'),
+            ('clientes', 'trg_painel_clientes_insert', 'INSERT', 'NEW TABLE AS novas',
+             'painel_notificar_clientes'),
+            ('clientes', 'trg_painel_clientes_update', 'UPDATE', 'OLD TABLE AS antigas NEW TABLE AS novas',
+             'painel_notificar_clientes'),
+            ('clientes', 'trg_painel_clientes_delete', 'DELETE', 'OLD TABLE AS antigas',
+             'painel_notificar_clientes'),
+            ('historico_envios', 'trg_agregados_envios_insert', 'INSERT', 'NEW TABLE AS novas',
+             'acumular_agregados_envios'),
+            ('historico_envios', 'trg_agregados_envios_update', 'UPDATE', 'OLD TABLE AS antigas NEW TABLE AS novas',
+             'acumular_agregados_envios'),
+            ('historico_envios', 'trg_agregados_envios_delete', 'DELETE', 'OLD TABLE AS antigas',
+             'acumular_agregados_envios')
+        ]
+
         indexes = [
             'CREATE INDEX IF NOT EXISTS idx_clientes_contact_id ON clientes(digisac_contact_id)',
             'CREATE INDEX IF NOT EXISTS idx_clientes_nome ON clientes(nome)',
-            'CREATE INDEX IF NOT EXISTS idx_clientes_telefone ON clientes(telefone)',
+            'CREATE INDEX IF NOT EXISTS idx_clientes_telefone_e164 ON clientes(telefone_e164) WHERE telefone_e164 IS NOT NULL',
             'CREATE INDEX IF NOT EXISTS idx_clientes_status ON clientes(status)',
+            'CREATE INDEX IF NOT EXISTS idx_clientes_tags ON clientes USING GIN(tags)',
             'CREATE INDEX IF NOT EXISTS idx_templates_tipo ON message_templates(tipo) WHERE ativo = true',
             'CREATE INDEX IF NOT EXISTS idx_historico_envios_cliente_id ON historico_envios(cliente_id)',
+            'CREATE INDEX IF NOT EXISTS idx_historico_envios_cliente_data ON historico_envios(cliente_id, data_envio DESC)',
             'CREATE INDEX IF NOT EXISTS idx_historico_envios_data_envio ON historico_envios(data_envio)',
             'CREATE INDEX IF NOT EXISTS idx_historico_envios_tipo ON historico_envios(tipo)',
-            'CREATE INDEX IF NOT EXISTS idx_historico_envios_status ON historico_envios(status)'
+            'CREATE INDEX IF NOT EXISTS idx_historico_envios_status ON historico_envios(status)',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_historico_envios_message_id ON historico_envios(digisac_message_id) WHERE digisac_message_id IS NOT NULL',
+            "CREATE INDEX IF NOT EXISTS idx_historico_envios_lote ON historico_envios(lote_id) WHERE lote_id IS NOT NULL",
+            "CREATE INDEX IF NOT EXISTS idx_historico_envios_falhas ON historico_envios(data_envio) WHERE status IN ('erro', 'pendente')",
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_historico_envios_idempotencia ON historico_envios(chave_idempotencia)',
+            "CREATE INDEX IF NOT EXISTS idx_historico_envios_outbox ON historico_envios(lote_id, id) WHERE status IN ('pendente', 'processando')",
+            'CREATE INDEX IF NOT EXISTS idx_lotes_envio_criado_em ON lotes_envio(criado_em DESC)',
+            'CREATE INDEX IF NOT EXISTS idx_envios_template_dia_dia ON envios_template_dia(dia)',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_template_versoes_hash ON template_versoes((COALESCE(template_id, 0)), hash)'
         ]
 
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
+            # Funções primeiro: colunas geradas dependem delas
+            for function_sql in functions:
+                try:
+                    cursor.execute(function_sql)
+                except Exception as e:
+                    logger.warning(f"Erro ao criar função: {e}")
+            
             for table_sql in tables:
                 try:
                     cursor.execute(table_sql)
@@ -141,23 +792,39 @@ class DatabaseManager:
                     cursor.execute(index_sql)
                 except Exception as e:
                     logger.warning(f"Erro ao criar índice: {e}")
+            
+            # Só cria se não existir: recriar a cada boot pediria lock exclusivo nas tabelas
+            for tabela, nome, evento, transicao, funcao in triggers:
+                try:
+                    cursor.execute("SELECT 1 FROM pg_trigger WHERE tgname = %s", (nome,))
+                    if cursor.fetchone() is None:
+                        referencias = f"REFERENCING {transicao}" if transicao else ""
+                        cursor.execute(f'''
+                            CREATE TRIGGER {nome} AFTER {evento} ON {tabela}
+                            {referencias}
+                            FOR EACH STATEMENT EXECUTE FUNCTION {funcao}()
+                        ''')
+                except Exception as e:
+                    logger.warning(f"Erro ao criar trigger: {e}")
 
     # ========== CLIENTES ==========
     
-    def inserir_cliente(self, nome: str, digisac_contact_id: str, telefone: str = None, email: str = None) -> int:
-        """Insere ou atualiza um cliente"""
+    def inserir_cliente(self, nome: str, digisac_contact_id: str, telefone: str = None, email: str = None,
+                        tags: List[str] = None) -> int:
+        """Insere ou atualiza um cliente (tags=None preserva as tags existentes)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO clientes (nome, digisac_contact_id, telefone, email)
-                VALUES (%s, %s, %s, %s)
+                INSERT INTO clientes (nome, digisac_contact_id, telefone, email, tags)
+                VALUES (%s, %s, %s, %s, COALESCE(%s::TEXT[], '{}'))
                 ON CONFLICT (digisac_contact_id) DO UPDATE SET
                     nome = EXCLUDED.nome,
                     telefone = EXCLUDED.telefone,
                     email = EXCLUDED.email,
+                    tags = COALESCE(%s::TEXT[], clientes.tags),
                     updated_at = CURRENT_TIMESTAMP
                 RETURNING id
-            ''', (nome, digisac_contact_id, telefone, email))
+            ''', (nome, digisac_contact_id, telefone, email, tags, tags))
             result = cursor.fetchone()
             return result[0] if result else None
 
@@ -176,24 +843,125 @@ class DatabaseManager:
         """Busca cliente por ID"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, nome, digisac_contact_id, telefone, email 
-                FROM clientes WHERE id = %s
-            ''', (cliente_id,))
+            self.executar_preparada(cursor, 'cliente_por_id', (cliente_id,))
             result = cursor.fetchone()
             return Cliente(*result) if result else None
 
     def get_cliente_por_telefone(self, telefone: str) -> Optional[Cliente]:
-        """Busca cliente por telefone"""
+        """Busca cliente por telefone em qualquer formato (comparação em E.164)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, nome, digisac_contact_id, telefone, email 
-                FROM clientes WHERE telefone = %s
+                FROM clientes WHERE telefone_e164 = normalizar_telefone(%s)
+                ORDER BY id
+                LIMIT 1
             ''', (telefone,))
             result = cursor.fetchone()
             return Cliente(*result) if result else None
 
+    def mesclar_clientes_duplicados(self, aplicar: bool = False, amostra: int = 20) -> Dict[str, Any]:
+        """
+        Detecta clientes com o mesmo telefone_e164 e, com aplicar=True, mescla cada
+        grupo no sobrevivente (ativo primeiro, depois o mais antigo) em uma transação:
+        o histórico de envios é reapontado, tags e email vazios são herdados e os
+        duplicados são removidos. Tudo em SQL por conjunto, sem laço por cliente.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TEMP TABLE mapa_duplicados ON COMMIT DROP AS
+                SELECT id AS duplicado_id, sobrevivente_id, telefone_e164
+                FROM (
+                    SELECT id, telefone_e164,
+                           FIRST_VALUE(id) OVER (
+                               PARTITION BY telefone_e164
+                               ORDER BY (status = 'ativo') DESC, id
+                           ) AS sobrevivente_id
+                    FROM clientes
+                    WHERE telefone_e164 IN (
+                        SELECT telefone_e164 FROM clientes
+                        WHERE telefone_e164 IS NOT NULL
+                        GROUP BY telefone_e164
+                        HAVING COUNT(*) > 1
+                    )
+                ) grupos
+                WHERE id <> sobrevivente_id
+            ''')
+            
+            cursor.execute('''
+                SELECT COUNT(DISTINCT telefone_e164), COUNT(*) FROM mapa_duplicados
+            ''')
+            grupos, duplicados = cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT telefone_e164, sobrevivente_id, array_agg(duplicado_id ORDER BY duplicado_id)
+                FROM mapa_duplicados
+                GROUP BY telefone_e164, sobrevivente_id
+                ORDER BY telefone_e164
+                LIMIT %s
+            ''', (amostra,))
+            exemplos = [
+                {'telefone_e164': row[0], 'sobrevivente_id': row[1], 'duplicados': row[2]}
+                for row in cursor.fetchall()
+            ]
+            
+            resultado = {
+                'grupos': grupos,
+                'duplicados': duplicados,
+                'envios_reapontados': 0,
+                'aplicado': False,
+                'exemplos': exemplos
+            }
+            if not aplicar or not duplicados:
+                return resultado
+            
+            cursor.execute('''
+                UPDATE historico_envios he
+                SET cliente_id = m.sobrevivente_id
+                FROM mapa_duplicados m
+                WHERE he.cliente_id = m.duplicado_id
+            ''')
+            resultado['envios_reapontados'] = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE clientes c
+                SET tags = ARRAY(SELECT DISTINCT unnest(c.tags || h.tags) ORDER BY 1),
+                    email = COALESCE(c.email, h.email),
+                    updated_at = CURRENT_TIMESTAMP
+                FROM (
+                    SELECT m.sobrevivente_id,
+                           COALESCE(array_agg(t.tag) FILTER (WHERE t.tag IS NOT NULL), '{}') AS tags,
+                           (array_agg(d.email ORDER BY d.id) FILTER (WHERE d.email IS NOT NULL))[1] AS email
+                    FROM mapa_duplicados m
+                    JOIN clientes d ON d.id = m.duplicado_id
+                    LEFT JOIN LATERAL unnest(d.tags) AS t(tag) ON true
+                    GROUP BY m.sobrevivente_id
+                ) h
+                WHERE c.id = h.sobrevivente_id
+            ''')
+            
+            cursor.execute('''
+                DELETE FROM clientes c
+                USING mapa_duplicados m
+                WHERE c.id = m.duplicado_id
+            ''')
+            resultado['aplicado'] = True
+            logger.info(
+                f"Deduplicação: {duplicados} clientes mesclados em {grupos} grupos, "
+                f"{resultado['envios_reapontados']} envios reapontados"
+            )
+            return resultado
+
+    def criar_indice_telefone_unico(self):
+        """Impede novos duplicados (falha se ainda houver telefones repetidos)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_clientes_telefone_e164_unico
+                ON clientes(telefone_e164) WHERE telefone_e164 IS NOT NULL
+            ''')
+
     def get_all_clientes(self) -> List[Cliente]:
         """Retorna todos os clientes"""
         with self.get_connection() as conn:
@@ -201,6 +969,119 @@ class DatabaseManager:
             cursor.execute('SELECT id, nome, digisac_contact_id, telefone, email FROM clientes')
             return [Cliente(*row) for row in cursor.fetchall()]
     
+    def iterar_clientes(self, fetch_size: int = None) -> Iterator[Cliente]:
+        """Itera todos os clientes via cursor server-side (memória constante)"""
+        for row in self.stream_query(
+            'SELECT id, nome, digisac_contact_id, telefone, email FROM clientes ORDER BY id',
+            fetch_size=fetch_size
+        ):
+            yield Cliente(*row)
+    
+    @staticmethod
+    def _filtro_audiencia(status: str = None, busca: str = None, sem_contato_dias: int = None,
+                          tag: str = None) -> Tuple[str, List[Any]]:
+        """Condições SQL (sobre o alias c de clientes) de um filtro de audiência"""
+        condicoes = ''
+        params: List[Any] = []
+        
+        if status:
+            condicoes += " AND c.status = %s"
+            params.append(status)
+        
+        if busca:
+            condicoes += " AND LOWER(UNACCENT(c.nome)) LIKE LOWER(UNACCENT(%s))"
+            params.append(f"%{busca}%")
+        
+        if tag:
+            condicoes += " AND c.tags @> ARRAY[%s]::TEXT[]"
+            params.append(tag)
+        
+        if sem_contato_dias:
+            condicoes += '''
+                AND NOT EXISTS (
+                    SELECT 1 FROM historico_envios he
+                    WHERE he.cliente_id = c.id
+                    AND he.status = 'enviado'
+                    AND he.data_envio >= CURRENT_TIMESTAMP - make_interval(days => %s)
+                )
+            '''
+            params.append(sem_contato_dias)
+        
+        return condicoes, params
+    
+    def iterar_audiencia(self, status: str = None, busca: str = None,
+                         sem_contato_dias: int = None, tag: str = None,
+                         fetch_size: int = None) -> Iterator[Cliente]:
+        """
+        Resolve um filtro de audiência no servidor e entrega os clientes via
+        cursor server-side, sem materializar a lista de IDs.
+        
+        sem_contato_dias: exclui clientes com envio bem-sucedido nos últimos N dias.
+        """
+        condicoes, params = self._filtro_audiencia(status, busca, sem_contato_dias, tag)
+        query = f'''
+            SELECT c.id, c.nome, c.digisac_contact_id, c.telefone, c.email
+            FROM clientes c
+            WHERE 1=1 {condicoes}
+            ORDER BY c.id
+        '''
+        
+        for row in self.stream_query(query, params, fetch_size=fetch_size):
+            yield Cliente(*row)
+    
+    def atualizar_clientes_em_lote(self, clientes_ids: List[int] = None, filtro: Dict[str, Any] = None,
+                                   status: str = None, adicionar_tags: List[str] = None,
+                                   remover_tags: List[str] = None, aplicar: bool = True) -> List[int]:
+        """
+        Aplica a mesma alteração (status e/ou tags) a uma lista de ids ou a um
+        filtro de audiência em um único UPDATE e retorna os ids alterados.
+        
+        Clientes que já estão no estado pedido não são regravados nem
+        retornados. Um único comando também significa uma única invalidação:
+        uma versão nova da coleção (ETag) e um evento no painel ao vivo.
+        aplicar=False retorna os ids que seriam alterados, sem gravar.
+        """
+        if clientes_ids is not None:
+            selecao, params_selecao = " AND c.id = ANY(%s)", [list(clientes_ids)]
+        else:
+            selecao, params_selecao = self._filtro_audiencia(**(filtro or {}))
+            if not selecao:
+                raise ValueError("Filtro vazio: informe ao menos um critério")
+        
+        mexe_tags = bool(adicionar_tags or remover_tags)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Tags: acrescenta e remove preservando a ordem e sem repetir
+            cursor.execute(f'''
+                UPDATE clientes c
+                SET status = n.status, tags = n.tags, updated_at = CURRENT_TIMESTAMP
+                FROM (
+                    SELECT
+                        c.id,
+                        COALESCE(%s, c.status) AS status,
+                        CASE WHEN %s THEN ARRAY(
+                            SELECT u.tag
+                            FROM unnest(c.tags || %s::TEXT[]) WITH ORDINALITY AS u(tag, ordem)
+                            WHERE u.tag <> ALL(%s::TEXT[])
+                            GROUP BY u.tag
+                            ORDER BY MIN(u.ordem)
+                        ) ELSE c.tags END AS tags
+                    FROM clientes c
+                    WHERE 1=1 {selecao}
+                ) n
+                WHERE c.id = n.id
+                  AND (c.status, c.tags) IS DISTINCT FROM (n.status, n.tags)
+                RETURNING c.id
+            ''', [status, mexe_tags, adicionar_tags or [], remover_tags or [], *params_selecao])
+            ids = sorted(row[0] for row in cursor.fetchall())
+            
+            if not aplicar:
+                conn.rollback()
+            
+            logger.info(f"Atualização em lote de clientes: {len(ids)} alterados (aplicado={aplicar})")
+            return ids
+    
     def update_cliente_status(self, cliente_id: int, status: str):
         """Atualiza status do cliente (ativo/inativo/suspenso)"""
         with self.get_connection() as conn:
@@ -235,10 +1116,7 @@ class DatabaseManager:
         """Busca um template por nome"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, nome, template_text, variaveis, ativo, tipo
-                FROM message_templates WHERE nome = %s
-            ''', (nome,))
+            self.executar_preparada(cursor, 'template_por_nome', (nome,))
             result = cursor.fetchone()
             if result:
                 return MessageTemplate(
@@ -269,34 +1147,597 @@ class DatabaseManager:
                 tipo=row[5]
             ) for row in cursor.fetchall()]
 
+    def obter_versao_template(self, template_text: str, template_id: int = None) -> int:
+        """
+        Retorna o ID da versão imutável de um texto de template, criando-a se necessário.
+        
+        template_id=None registra versões avulsas (ex.: mensagem_padrao do envio em lote).
+        """
+        hash_texto = hashlib.sha256(template_text.encode('utf-8')).hexdigest()
+        chave = (template_id or 0, hash_texto)
+        with self._versoes_lock:
+            if chave in self._versoes_cache:
+                self._versoes_cache.move_to_end(chave)
+                return self._versoes_cache[chave]
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO template_versoes (template_id, template_text, hash)
+                VALUES (%s, %s, %s)
+                ON CONFLICT ((COALESCE(template_id, 0)), hash)
+                DO UPDATE SET hash = EXCLUDED.hash
+                RETURNING id
+            ''', (template_id, template_text, hash_texto))
+            versao_id = cursor.fetchone()[0]
+        
+        with self._versoes_lock:
+            self._versoes_cache[chave] = versao_id
+            self._versoes_cache.move_to_end(chave)
+            if len(self._versoes_cache) > VERSOES_CACHE_MAX:
+                self._versoes_cache.popitem(last=False)
+        return versao_id
+
     # ========== HISTÓRICO DE ENVIOS ==========
 
     def registrar_envio(self, cliente_id: int, mensagem: str, status: str, 
                        tipo: str = 'financeira', template_usado: str = None,
-                       tentativas: int = 1, erro_detalhe: str = None) -> int:
-        """Registra um envio de mensagem no histórico"""
+                       tentativas: int = 1, erro_detalhe: str = None,
+                       digisac_message_id: str = None, template_versao_id: int = None,
+                       variaveis: Dict[str, Any] = None, lote_id: str = None,
+                       erro_classe: str = None, latencia_ms: int = None,
+                       http_status: int = None) -> int:
+        """
+        Registra um envio de mensagem no histórico.
+        
+        Com template_versao_id (modo compacto) grava apenas a versão do template e
+        as variáveis usadas; a mensagem é reconstruída na leitura.
+        latencia_ms/http_status: telemetria da chamada ao Digisac (EnvioResultado).
+        """
+        if template_versao_id is not None:
+            mensagem = None
+        
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO historico_envios 
-                (cliente_id, tipo, template_usado, mensagem, status, tentativas, erro_detalhe)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            ''', (cliente_id, tipo, template_usado, mensagem, status, tentativas, erro_detalhe))
+            self.executar_preparada(cursor, 'registrar_envio', (
+                cliente_id, tipo, template_usado, mensagem, template_versao_id,
+                Json(variaveis) if variaveis is not None else None,
+                status, tentativas, erro_detalhe,
+                digisac_message_id,
+                'enviado' if digisac_message_id else None,
+                datetime.now() if digisac_message_id else None,
+                lote_id, erro_classe,
+                latencia_ms, http_status,
+                [latencia_ms] if latencia_ms is not None else None
+            ))
             return cursor.fetchone()[0]
 
-    def get_historico_cliente(self, cliente_id: int, limit: int = 50) -> List[Dict]:
-        """Retorna histórico de envios de um cliente"""
+    def reivindicar_falhas(self, reivindicacao: str, limite: int, apos_id: int = 0,
+                           lote_id: str = None, inicio: datetime = None, fim: datetime = None,
+                           erro_classe: str = None, max_tentativas: int = 3) -> List[tuple]:
+        """
+        Marca até `limite` envios reenviáveis (status 'erro' abaixo de max_tentativas,
+        id > apos_id) como 'processando' antes do reenvio. FOR UPDATE SKIP LOCKED:
+        reenvios simultâneos nunca pegam a mesma linha. (Envios adiados pelo circuit
+        breaker continuam 'pendente' no outbox e são enviados pela retomada do lote.)
+        
+        Sem erro_classe, ficam de fora as falhas 4xx (pedido inválido, ex.: contato
+        inexistente), em que reenviar não mudaria o resultado, e as 'interrompido'
+        (envio em andamento numa queda do processo, que pode ter sido entregue).
+        
+        Linhas: (id, cliente_id, cliente_nome, digisac_contact_id, mensagem, tentativas)
+        """
+        filtros = ["status = 'erro'", "tentativas < %s", "id > %s"]
+        params: List[Any] = [max_tentativas, apos_id]
+        
+        if lote_id:
+            filtros.append("lote_id = %s")
+            params.append(lote_id)
+        if inicio:
+            filtros.append("data_envio >= %s")
+            params.append(inicio)
+        if fim:
+            filtros.append("data_envio < %s")
+            params.append(fim)
+        if erro_classe:
+            filtros.append("erro_classe = %s")
+            params.append(erro_classe)
+        else:
+            filtros.append("COALESCE(erro_classe, '') NOT IN ('http_4xx', 'interrompido')")
+        params.extend([limite, reivindicacao])
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH alvo AS (
+                    SELECT id FROM historico_envios
+                    WHERE {' AND '.join(filtros)}
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), he AS (
+                    UPDATE historico_envios h
+                    SET status = 'processando',
+                        reivindicacao = %s,
+                        reivindicado_em = CURRENT_TIMESTAMP
+                    FROM alvo
+                    WHERE h.id = alvo.id
+                    RETURNING h.id, h.cliente_id, h.mensagem, h.template_versao_id, h.variaveis, h.tentativas
+                )
+                SELECT he.id, he.cliente_id, c.nome, c.digisac_contact_id,
+                       {SQL_MENSAGEM_ENVIO}, he.tentativas
+                FROM he
+                JOIN clientes c ON c.id = he.cliente_id
+                {SQL_JOIN_VERSAO}
+                ORDER BY he.id
+            ''', params)
+            return cursor.fetchall()
+
+    def devolver_falhas(self, ids: List[int]) -> int:
+        """Devolve ao estado 'erro' falhas reivindicadas e não reenviadas (sem gastar tentativa)"""
+        if not ids:
+            return 0
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT id, tipo, template_usado, mensagem, status, 
-                       data_envio, tentativas, erro_detalhe
-                FROM historico_envios
-                WHERE cliente_id = %s
-                ORDER BY data_envio DESC
+                UPDATE historico_envios
+                SET status = 'erro', reivindicacao = NULL, reivindicado_em = NULL
+                WHERE id = ANY(%s) AND status = 'processando'
+            ''', (list(ids),))
+            return cursor.rowcount
+
+    def recuperar_reenvios(self, prefixo: str, expiradas_ha_s: int) -> int:
+        """
+        Reenvios abandonados (processo caiu): o resultado é gravado por bloco,
+        então qualquer linha da reivindicação pode ter chegado ao Digisac. Todas
+        viram 'erro' com classe 'interrompido' (fora do reenvio automático).
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE historico_envios
+                SET status = 'erro',
+                    erro_classe = 'interrompido',
+                    erro_detalhe = 'Reenvio interrompido; pode ter sido entregue',
+                    reivindicacao = NULL,
+                    reivindicado_em = NULL
+                WHERE status = 'processando'
+                AND reivindicacao LIKE %s
+                AND reivindicado_em < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            ''', (prefixo + '%', expiradas_ha_s))
+            return cursor.rowcount
+
+    def concluir_envios(self, resultados: List[Tuple[int, str, Optional[str], Optional[str], Optional[str],
+                                                     Optional[int], Optional[int]]]) -> int:
+        """
+        Aplica em lote o resultado de envios do outbox ou de reenvios,
+        incrementando tentativas e liberando a reivindicação.
+        
+        resultados: lista de (historico_id, status, erro_detalhe, erro_classe, digisac_message_id,
+        latencia_ms, http_status). A latência de cada tentativa se acumula em tentativas_ms.
+        """
+        if not resultados:
+            return 0
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            atualizados = execute_values(cursor, '''
+                UPDATE historico_envios h
+                SET status = v.status,
+                    tentativas = h.tentativas + 1,
+                    data_envio = CASE WHEN h.status = 'processando' THEN CURRENT_TIMESTAMP ELSE h.data_envio END,
+                    erro_detalhe = v.erro_detalhe,
+                    erro_classe = v.erro_classe,
+                    digisac_message_id = COALESCE(v.message_id, h.digisac_message_id),
+                    status_entrega = CASE WHEN v.message_id IS NOT NULL THEN 'enviado' ELSE h.status_entrega END,
+                    status_entrega_em = CASE WHEN v.message_id IS NOT NULL THEN CURRENT_TIMESTAMP ELSE h.status_entrega_em END,
+                    latencia_ms = v.latencia_ms,
+                    http_status = v.http_status,
+                    tentativas_ms = CASE WHEN v.latencia_ms IS NULL THEN h.tentativas_ms
+                                         ELSE COALESCE(h.tentativas_ms, '{}') || v.latencia_ms END,
+                    reivindicacao = NULL,
+                    reivindicado_em = NULL
+                FROM (VALUES %s) AS v(id, status, erro_detalhe, erro_classe, message_id, latencia_ms, http_status)
+                WHERE h.id = v.id
+                RETURNING h.id
+            ''', resultados, template="(%s, %s, %s, %s, %s, %s::INTEGER, %s::SMALLINT)",
+                page_size=len(resultados), fetch=True)
+            return len(atualizados)
+
+    def telemetria_envios(self, agrupar: str, inicio: datetime, fim: datetime,
+                          lote_id: str = None, limite: int = 100) -> Dict[str, Any]:
+        """
+        Percentis de latência do Digisac e taxa de erro por template, hora,
+        dia ou lote no intervalo [inicio, fim), mais o total do intervalo.
+        
+        Uma única passada (GROUPING SETS) pelo índice de telemetria, criado só
+        pela migration 20261019_170000 (CONCURRENTLY); só entram envios com
+        latência registrada (tentativas que chegaram a chamar a API).
+        participacao: fatia dos envios do intervalo (agregado em janela).
+        """
+        expressao, ordem = DIMENSOES_TELEMETRIA[agrupar]
+        filtro_lote = "AND he.lote_id = %s" if lote_id else ""
+        params: List[Any] = [inicio, fim] + ([lote_id] if lote_id else []) + [limite + 1]
+        
+        with self.get_connection(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT
+                    {expressao} AS grupo,
+                    GROUPING({expressao}) = 1 AS geral,
+                    COUNT(*) AS envios,
+                    COUNT(*) FILTER (WHERE he.status = 'erro') AS erros,
+                    ROUND(COUNT(*) FILTER (WHERE he.status = 'erro') * 100.0 / NULLIF(COUNT(*), 0), 2) AS taxa_erro,
+                    percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY he.latencia_ms) AS percentis,
+                    MAX(he.latencia_ms) AS latencia_max,
+                    COUNT(*) FILTER (WHERE he.http_status = 429) AS http_429,
+                    COUNT(*) FILTER (WHERE he.http_status >= 500) AS http_5xx,
+                    ROUND(COUNT(*) * 100.0 / NULLIF(SUM(COUNT(*)) OVER (PARTITION BY GROUPING({expressao})), 0), 2)
+                        AS participacao
+                FROM historico_envios he
+                WHERE he.latencia_ms IS NOT NULL
+                  AND he.data_envio >= %s AND he.data_envio < %s
+                  {filtro_lote}
+                GROUP BY GROUPING SETS (({expressao}), ())
+                ORDER BY geral DESC, {ordem}
                 LIMIT %s
-            ''', (cliente_id, limit))
+            ''', params)
+            
+            geral = None
+            grupos = []
+            for linha in cursor.fetchall():
+                grupo, eh_geral, dados = self._linha_telemetria(linha)
+                if eh_geral:
+                    geral = dados
+                else:
+                    grupos.append({'grupo': grupo, **dados})
+            
+            return {'geral': geral, 'grupos': grupos}
+
+    @staticmethod
+    def _linha_telemetria(linha: tuple) -> Tuple[Any, bool, Dict[str, Any]]:
+        """
+        (grupo, geral, métricas) de uma linha de telemetria_envios. A linha geral
+        vem mesmo sem envios no intervalo (GROUPING SETS): taxa, percentis e
+        participação chegam NULL e viram None.
+        """
+        grupo, eh_geral, envios, erros, taxa_erro, percentis, maximo, http_429, http_5xx, participacao = linha
+        p50, p95, p99 = percentis if percentis else (None, None, None)
+        return grupo, eh_geral, {
+            'envios': envios,
+            'erros': erros,
+            'taxa_erro': float(taxa_erro) if taxa_erro is not None else None,
+            'latencia_p50_ms': round(p50) if p50 is not None else None,
+            'latencia_p95_ms': round(p95) if p95 is not None else None,
+            'latencia_p99_ms': round(p99) if p99 is not None else None,
+            'latencia_max_ms': maximo,
+            'http_429': http_429,
+            'http_5xx': http_5xx,
+            'participacao': float(participacao) if participacao is not None else None
+        }
+
+    # ========== DESEMPENHO (AGREGADOS) ==========
+
+    @staticmethod
+    def _linha_desempenho(total: int, enviados: int, erros: int, erros_por_classe: Dict[str, int]) -> Dict[str, Any]:
+        concluidos = enviados + erros
+        return {
+            'total': total,
+            'enviados': enviados,
+            'erros': erros,
+            'taxa_sucesso': round(enviados * 100.0 / concluidos, 2) if concluidos else None,
+            'erros_por_classe': erros_por_classe or {}
+        }
+
+    def listar_lotes_envio(self, limite: int = 50, antes_de: datetime = None) -> List[Dict[str, Any]]:
+        """
+        Lotes mais recentes com os contadores acumulados. antes_de pagina por
+        criado_em (keyset), lendo só `limite` linhas de lotes_envio.
+        """
+        query = '''
+            SELECT lote_id, tipo, template_usado, criado_em, atualizado_em, concluido_em,
+                   total, pendentes, processando, enviados, erros, erros_por_classe
+            FROM lotes_envio
+        '''
+        params: List[Any] = []
+        if antes_de:
+            query += " WHERE criado_em < %s"
+            params.append(antes_de)
+        query += " ORDER BY criado_em DESC LIMIT %s"
+        params.append(limite)
+        
+        with self.get_connection(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [self._lote_envio_para_dict(linha) for linha in cursor.fetchall()]
+
+    def get_lote_envio(self, lote_id: str) -> Optional[Dict[str, Any]]:
+        """Contadores de um lote (None se não existir)"""
+        with self.get_connection(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT lote_id, tipo, template_usado, criado_em, atualizado_em, concluido_em,
+                       total, pendentes, processando, enviados, erros, erros_por_classe
+                FROM lotes_envio WHERE lote_id = %s
+            ''', (lote_id,))
+            linha = cursor.fetchone()
+            return self._lote_envio_para_dict(linha) if linha else None
+
+    def _lote_envio_para_dict(self, linha: tuple) -> Dict[str, Any]:
+        (lote_id, tipo, template_usado, criado_em, atualizado_em, concluido_em,
+         total, pendentes, processando, enviados, erros, erros_por_classe) = linha
+        return {
+            'lote_id': lote_id,
+            'tipo': tipo,
+            'template_usado': template_usado,
+            'criado_em': criado_em,
+            'atualizado_em': atualizado_em,
+            'concluido_em': concluido_em,
+            'pendentes': pendentes,
+            'processando': processando,
+            **self._linha_desempenho(total, enviados, erros, erros_por_classe)
+        }
+
+    def desempenho_templates(self, inicio: date, fim: date, template: str = None) -> List[Dict[str, Any]]:
+        """
+        Volume, taxa de sucesso e classes de erro por template no intervalo
+        [inicio, fim] (datas). Com template, devolve a série diária dele.
+        
+        Lê envios_template_dia (uma linha por template e dia): o custo depende
+        do número de templates e dias, não do tamanho do histórico.
+        """
+        agrupar = 'dia' if template else 'template'
+        filtro_template = "AND template = %s" if template else ""
+        params: List[Any] = [inicio, fim] + ([template] if template else [])
+        
+        with self.get_connection(somente_leitura=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH linhas AS (
+                    SELECT {agrupar} AS grupo, total, enviados, erros, erros_por_classe
+                    FROM envios_template_dia
+                    WHERE dia BETWEEN %s AND %s {filtro_template}
+                ),
+                classes AS (
+                    SELECT grupo, jsonb_object_agg(classe, quantidade) AS erros_por_classe
+                    FROM (
+                        SELECT l.grupo, c.classe, SUM(c.valor::BIGINT) AS quantidade
+                        FROM linhas l, jsonb_each_text(l.erros_por_classe) AS c(classe, valor)
+                        GROUP BY 1, 2
+                    ) por_classe
+                    GROUP BY grupo
+                )
+                SELECT t.grupo, t.total, t.enviados, t.erros, c.erros_por_classe
+                FROM (
+                    SELECT grupo, SUM(total) AS total, SUM(enviados) AS enviados, SUM(erros) AS erros
+                    FROM linhas GROUP BY grupo
+                ) t
+                LEFT JOIN classes c USING (grupo)
+                ORDER BY {'t.grupo' if template else 't.total DESC'}
+            ''', params)
+            return [
+                {agrupar: grupo, **self._linha_desempenho(int(total), int(enviados), int(erros), classes)}
+                for grupo, total, enviados, erros, classes in cursor.fetchall()
+            ]
+
+    # ========== OUTBOX (LOTES RETOMÁVEIS) ==========
+
+    def inserir_pendentes(self, linhas: List[Tuple]) -> Set[int]:
+        """
+        Grava os destinatários de um lote como 'pendente' em um único INSERT.
+        
+        linhas: (cliente_id, tipo, template_usado, mensagem, template_versao_id,
+                 variaveis, lote_id). A chave de idempotência lote_id:cliente_id
+        impede duplicatas ao repetir o mesmo lote. Retorna os cliente_ids inseridos.
+        """
+        if not linhas:
+            return set()
+        
+        valores = [
+            (cliente_id, tipo, template_usado,
+             None if versao_id is not None else mensagem,
+             versao_id, Json(variaveis) if variaveis is not None else None,
+             lote_id, f"{lote_id}:{cliente_id}")
+            for cliente_id, tipo, template_usado, mensagem, versao_id, variaveis, lote_id in linhas
+        ]
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            inseridos = execute_values(cursor, '''
+                INSERT INTO historico_envios
+                (cliente_id, tipo, template_usado, mensagem, template_versao_id, variaveis,
+                 lote_id, chave_idempotencia, status, tentativas)
+                VALUES %s
+                ON CONFLICT (chave_idempotencia) DO NOTHING
+                RETURNING cliente_id
+            ''', valores, template="(%s, %s, %s, %s, %s, %s, %s, %s, 'pendente', 0)",
+                page_size=len(valores), fetch=True)
+            return {row[0] for row in inseridos}
+
+    def reivindicar_pendentes(self, lote_id: str, limite: int, reivindicacao: str) -> List[tuple]:
+        """
+        Marca até `limite` linhas pendentes do lote como 'processando' (FOR UPDATE
+        SKIP LOCKED: vários workers podem drenar o mesmo lote sem colisão).
+        
+        Linhas: (id, cliente_id, cliente_nome, digisac_contact_id, mensagem, template_usado, tentativas)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH alvo AS (
+                    SELECT id FROM historico_envios
+                    WHERE lote_id = %s AND status = 'pendente'
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), he AS (
+                    UPDATE historico_envios h
+                    SET status = 'processando',
+                        reivindicacao = %s,
+                        reivindicado_em = CURRENT_TIMESTAMP
+                    FROM alvo
+                    WHERE h.id = alvo.id
+                    RETURNING h.id, h.cliente_id, h.template_usado, h.mensagem,
+                              h.template_versao_id, h.variaveis, h.tentativas
+                )
+                SELECT he.id, he.cliente_id, c.nome, c.digisac_contact_id,
+                       {SQL_MENSAGEM_ENVIO}, he.template_usado, he.tentativas
+                FROM he
+                JOIN clientes c ON c.id = he.cliente_id
+                {SQL_JOIN_VERSAO}
+                ORDER BY he.id
+            ''', (lote_id, limite, reivindicacao))
+            return cursor.fetchall()
+
+    def devolver_pendentes(self, ids: List[int], erro_classe: str = None, erro_detalhe: str = None) -> int:
+        """Devolve linhas reivindicadas e não enviadas ao estado 'pendente' (sem gastar tentativa)"""
+        if not ids:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE historico_envios
+                SET status = 'pendente', reivindicacao = NULL, reivindicado_em = NULL,
+                    erro_classe = %s, erro_detalhe = %s
+                WHERE id = ANY(%s) AND status = 'processando'
+            ''', (erro_classe, erro_detalhe, list(ids)))
+            return cursor.rowcount
+
+    def recuperar_reivindicacoes(self, lote_id: str, expiradas_ha_s: int) -> Dict[str, int]:
+        """
+        Recupera reivindicações abandonadas (processo caiu durante o envio).
+        
+        Cada sender envia suas linhas em ordem de id e conclui uma a uma, então em
+        cada reivindicação abandonada só a menor linha ainda 'processando' pode ter
+        chegado ao Digisac: ela vira 'erro' (classe 'interrompido', fora do reenvio
+        automático) e as demais voltam a 'pendente'. Reivindicações do reenvio
+        ficam com recuperar_reenvios.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE historico_envios h
+                SET status = CASE WHEN h.id = e.primeira THEN 'erro' ELSE 'pendente' END,
+                    erro_classe = CASE WHEN h.id = e.primeira THEN 'interrompido' ELSE h.erro_classe END,
+                    erro_detalhe = CASE WHEN h.id = e.primeira
+                        THEN 'Envio interrompido; pode ter sido entregue'
+                        ELSE h.erro_detalhe END,
+                    reivindicacao = NULL,
+                    reivindicado_em = NULL
+                FROM (
+                    SELECT id, MIN(id) OVER (PARTITION BY reivindicacao) AS primeira
+                    FROM historico_envios
+                    WHERE lote_id = %s AND status = 'processando'
+                    AND reivindicado_em < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    AND reivindicacao NOT LIKE %s
+                ) e
+                WHERE h.id = e.id AND h.status = 'processando'
+                RETURNING h.status
+            ''', (lote_id, expiradas_ha_s, PREFIXO_REIVINDICACAO_REENVIO + '%'))
+            contagem = {'interrompidos': 0, 'devolvidos': 0}
+            for (status,) in cursor.fetchall():
+                contagem['interrompidos' if status == 'erro' else 'devolvidos'] += 1
+            return contagem
+
+    def resumo_lote(self, lote_id: str) -> Dict[str, int]:
+        """Contagem de linhas do lote por status (contadores de lotes_envio, sem varrer o histórico)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT pendentes, processando, enviados, erros FROM lotes_envio
+                WHERE lote_id = %s
+            ''', (lote_id,))
+            linha = cursor.fetchone()
+            if linha is None:
+                return {}
+            return {status: total for status, total in zip(('pendente', 'processando', 'enviado', 'erro'), linha)
+                    if total}
+
+    def clientes_no_limite_frequencia(self, cliente_ids: List[int], janela_horas: int, max_envios: int,
+                                      template_usado: str = None, tipo: str = None,
+                                      ignorar_lote: str = None) -> Set[int]:
+        """
+        Retorna, em uma única consulta, os clientes que já receberam max_envios
+        mensagens (do template ou do tipo informado) nas últimas janela_horas.
+        
+        ignorar_lote: desconsidera as linhas do próprio lote (retomada do mesmo lote_id).
+        """
+        if not cliente_ids:
+            return set()
+        
+        query = '''
+            SELECT cliente_id
+            FROM historico_envios
+            WHERE cliente_id = ANY(%s)
+            AND data_envio >= CURRENT_TIMESTAMP - make_interval(hours => %s)
+            AND status IN ('enviado', 'pendente', 'processando')
+        '''
+        params: List[Any] = [list(cliente_ids), janela_horas]
+        
+        if ignorar_lote:
+            query += " AND lote_id IS DISTINCT FROM %s"
+            params.append(ignorar_lote)
+        
+        if template_usado:
+            query += " AND template_usado = %s"
+            params.append(template_usado)
+        if tipo:
+            query += " AND tipo = %s"
+            params.append(tipo)
+        
+        query += " GROUP BY cliente_id HAVING COUNT(*) >= %s"
+        params.append(max_envios)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def aplicar_status_entrega(self, eventos: List[Tuple[str, str, datetime]]) -> Set[str]:
+        """
+        Aplica em lote atualizações de status de entrega (webhook Digisac).
+        
+        eventos: lista de (digisac_message_id, status_entrega, ocorrido_em).
+        O status só avança (enviado < entregue < lido); 'falhou' prevalece.
+        Retorna os message_ids encontrados no histórico.
+        """
+        if not eventos:
+            return set()
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            encontrados = execute_values(cursor, '''
+                UPDATE historico_envios h
+                SET status_entrega = v.status_entrega,
+                    status_entrega_em = v.ocorrido_em::timestamp
+                FROM (VALUES %s) AS v(message_id, status_entrega, ocorrido_em)
+                WHERE h.digisac_message_id = v.message_id
+                  AND (
+                      h.status_entrega IS NULL
+                      OR v.status_entrega = 'falhou'
+                      OR (CASE v.status_entrega WHEN 'enviado' THEN 1 WHEN 'entregue' THEN 2 WHEN 'lido' THEN 3 ELSE 0 END)
+                       > (CASE h.status_entrega WHEN 'enviado' THEN 1 WHEN 'entregue' THEN 2 WHEN 'lido' THEN 3 ELSE 0 END)
+                  )
+                RETURNING h.digisac_message_id
+            ''', eventos, page_size=len(eventos), fetch=True)
+            atualizados = {row[0] for row in encontrados}
+            
+            # Eventos desatualizados (status já mais avançado) também contam como encontrados
+            pendentes = [e[0] for e in eventos if e[0] not in atualizados]
+            if pendentes:
+                cursor.execute('''
+                    SELECT digisac_message_id FROM historico_envios
+                    WHERE digisac_message_id = ANY(%s)
+                ''', (pendentes,))
+                atualizados.update(row[0] for row in cursor.fetchall())
+            
+            return atualizados
+
+    def get_historico_cliente(self, cliente_id: int, limit: int = 50) -> List[Dict]:
+        """Retorna histórico de envios de um cliente"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            self.executar_preparada(cursor, 'historico_cliente', (cliente_id, limit))
             
             return [{
                 'id': row[0],
@@ -306,24 +1747,52 @@ class DatabaseManager:
                 'status': row[4],
                 'data_envio': row[5],
                 'tentativas': row[6],
-                'erro_detalhe': row[7]
+                'erro_detalhe': row[7],
+                'status_entrega': row[8],
+                'status_entrega_em': row[9]
+            } for row in cursor.fetchall()]
+
+    def versao_colecao(self, cursor, colecao: str) -> int:
+        """
+        Versão de uma tabela em colecao_versoes (ETag das listagens).
+        
+        Usa o cursor da listagem, para ler a versão na mesma conexão (e réplica)
+        dos dados. Tabela não alterada desde a migration: versão 0.
+        """
+        self.executar_preparada(cursor, 'versao_colecao', (colecao,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def get_atividades_por_ids(self, ids: List[int]) -> List[Dict]:
+        """Atividades no formato de /api/dashboard/atividades-recentes (painel ao vivo)"""
+        if not ids:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT he.id, he.tipo, c.nome, he.status, he.data_envio,
+                       LEFT({SQL_MENSAGEM_ENVIO}, 100)
+                FROM historico_envios he
+                JOIN clientes c ON he.cliente_id = c.id
+                {SQL_JOIN_VERSAO}
+                WHERE he.id = ANY(%s)
+                ORDER BY he.data_envio DESC, he.id DESC
+            ''', (list(ids),))
+            
+            return [{
+                'id': row[0],
+                'tipo': row[1],
+                'cliente': row[2],
+                'status': row[3],
+                'data': row[4],
+                'preview': row[5]
             } for row in cursor.fetchall()]
 
     def get_estatisticas_envios(self, dias: int = 30) -> Dict[str, Any]:
         """Retorna estatísticas de envios dos últimos N dias"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    COUNT(CASE WHEN status = 'enviado' THEN 1 END) as enviados,
-                    COUNT(CASE WHEN status = 'erro' THEN 1 END) as erros,
-                    COUNT(CASE WHEN status = 'pendente' THEN 1 END) as pendentes,
-                    COUNT(CASE WHEN tipo = 'financeira' THEN 1 END) as financeiros,
-                    COUNT(CASE WHEN tipo = 'documento' THEN 1 END) as documentos
-                FROM historico_envios 
-                WHERE data_envio >= CURRENT_DATE - INTERVAL '%s days'
-            ''', (dias,))
+            self.executar_preparada(cursor, 'estatisticas_envios', (dias,))
             result = cursor.fetchone()
             return {
                 'total': result[0],
@@ -336,6 +1805,26 @@ class DatabaseManager:
 
     # ========== UTILIDADES ==========
 
+    def stream_query(self, query: str, params: Any = None, fetch_size: int = None,
+                     somente_leitura: bool = False) -> Iterator[tuple]:
+        """
+        Executa a query em um cursor server-side (nomeado) e entrega as linhas
+        em blocos de fetch_size, sem carregar o resultado inteiro em memória.
+        
+        somente_leitura=True permite usar uma réplica (ver get_connection).
+        """
+        from .config import EXPORT_FETCH_SIZE
+        
+        with self.get_connection(somente_leitura=somente_leitura) as conn:
+            cursor = conn.cursor(name=f'stream_{uuid.uuid4().hex}')
+            cursor.itersize = fetch_size or EXPORT_FETCH_SIZE
+            try:
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield row
+            finally:
+                cursor.close()
+
     def health_check(self) -> bool:
         """Verifica se o banco está respondendo"""
         try:
@@ -349,8 +1838,56 @@ class DatabaseManager:
 
     def close_pool(self):
         """Fecha pool de conexões"""
-        if self.pool:
-            self.pool.closeall()
+        self.pool.closeall()
+        self.replicas.closeall()
+
+
+# ========== INSTÂNCIA POR PROCESSO ==========
+
+_instancia: Optional[DatabaseManager] = None
+_instancia_pid: Optional[int] = None
+_instancia_lock = threading.Lock()
+
+def calcular_tamanho_pool(workers: int = None) -> Tuple[int, int]:
+    """
+    Tamanho do pool de cada processo worker.
+    
+    Divide (max_connections - reservadas) entre os workers, limitado por
+    DB_POOL_MAX, para que o total nunca passe do max_connections do PostgreSQL.
+    """
+    from .config import (
+        WEB_WORKERS, POSTGRES_MAX_CONNECTIONS, DB_RESERVED_CONNECTIONS,
+        DB_POOL_MIN, DB_POOL_MAX
+    )
+    workers = max(1, workers or WEB_WORKERS)
+    disponiveis = max(1, (POSTGRES_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // workers)
+    maxconn = max(1, min(DB_POOL_MAX, disponiveis))
+    return min(DB_POOL_MIN, maxconn), maxconn
+
+def get_database() -> DatabaseManager:
+    """
+    DatabaseManager compartilhado pelo processo atual.
+    
+    Criado sob demanda e recriado após fork (gunicorn com preload), de modo
+    que cada worker tem o próprio pool e nenhuma conexão é herdada do master.
+    """
+    global _instancia, _instancia_pid
+    pid = os.getpid()
+    if _instancia is None or _instancia_pid != pid:
+        with _instancia_lock:
+            if _instancia is None or _instancia_pid != pid:
+                _instancia = DatabaseManager()
+                _instancia_pid = pid
+    return _instancia
+
+def fechar_database():
+    """Fecha o pool do processo atual (shutdown do worker)"""
+    global _instancia, _instancia_pid
+    with _instancia_lock:
+        if _instancia is not None and _instancia_pid == os.getpid():
+            _instancia.close_pool()
+        _instancia = None
+        _instancia_pid = None
 
 
 # ========== EXCEÇÕES ==========
@@ -366,3 +1903,11 @@ class DatabaseConnectionError(DatabaseError):
 class DatabaseTimeoutError(DatabaseError):
     """Timeout em operação do banco"""
     pass
+
+class DatabasePoolEsgotadoError(DatabaseTimeoutError):
+    """Nenhuma conexão livre no pool dentro de DB_POOL_TIMEOUT_S"""
+    pass
+
+class ConsultaCanceladaError(DatabaseTimeoutError):
+    """Consulta interrompida porque o cliente HTTP desconectou"""
+    pass
@@ -0,0 +1,239 @@
+"""
+Pool de conexões PostgreSQL thread-safe e auto-recuperável
+
+- checkout bloqueante com timeout quando o pool está esgotado
+- validação no checkout (conexão fechada, transação pendente, ping após ociosidade)
+- descarte de conexões quebradas em vez de devolvê-las ao pool
+- tempo de vida máximo e timeout de ociosidade por conexão
+- métricas: em uso, ociosas, aguardando, criadas, descartadas
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro do timeout de checkout"""
+    pass
+
+
+class _Entrada:
+    __slots__ = ('conn', 'criada_em', 'devolvida_em')
+
+    def __init__(self, conn, agora: float):
+        self.conn = conn
+        self.criada_em = agora
+        self.devolvida_em = agora
+
+
+class PoolConexoes:
+    def __init__(self, dsn: str, minconn: int, maxconn: int,
+                 max_lifetime_s: float = 1800, idle_timeout_s: float = 300,
+                 checkout_timeout_s: float = 10, validar_apos_s: float = 30,
+                 **connect_kwargs):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime_s = max_lifetime_s
+        self.idle_timeout_s = idle_timeout_s
+        self.checkout_timeout_s = checkout_timeout_s
+        self.validar_apos_s = validar_apos_s
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition(threading.Lock())
+        self._ociosas: Deque[_Entrada] = deque()
+        self._em_uso: Dict[int, _Entrada] = {}
+        self._abrindo = 0
+        # Retiradas das ociosas e ainda em _validar (fora do lock): contam no total
+        self._validando = 0
+        self._aguardando = 0
+        self._fechado = False
+        self._contadores = {'criadas': 0, 'descartadas': 0, 'timeouts_checkout': 0}
+
+        for _ in range(minconn):
+            entrada = self._abrir()
+            with self._cond:
+                self._ociosas.append(entrada)
+
+    # ========== CHECKOUT / DEVOLUÇÃO ==========
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Retira uma conexão válida; bloqueia até `timeout` se o pool estiver esgotado"""
+        limite = time.monotonic() + (self.checkout_timeout_s if timeout is None else timeout)
+
+        while True:
+            descartar = []
+            entrada = None
+            abrir = False
+
+            with self._cond:
+                if self._fechado:
+                    raise psycopg2.InterfaceError("Pool de conexões fechado")
+
+                while True:
+                    descartar.extend(self._varrer_ociosas())
+                    if self._ociosas:
+                        # LIFO: reusa a mais recente e deixa as antigas expirarem por ociosidade
+                        entrada = self._ociosas.pop()
+                        self._validando += 1
+                        break
+                    if self._total() < self.maxconn:
+                        self._abrindo += 1
+                        abrir = True
+                        break
+
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._contadores['timeouts_checkout'] += 1
+                        raise PoolEsgotadoError(
+                            f"Pool esgotado: {self.maxconn} conexões em uso após "
+                            f"{self.checkout_timeout_s if timeout is None else timeout}s de espera"
+                        )
+                    self._aguardando += 1
+                    try:
+                        self._cond.wait(restante)
+                    finally:
+                        self._aguardando -= 1
+
+            for antiga in descartar:
+                self._fechar(antiga)
+
+            if abrir:
+                try:
+                    entrada = self._abrir()
+                finally:
+                    with self._cond:
+                        self._abrindo -= 1
+                        if entrada is None:
+                            self._cond.notify()
+                with self._cond:
+                    self._em_uso[id(entrada.conn)] = entrada
+                return entrada.conn
+
+            valida = False
+            try:
+                valida = self._validar(entrada)
+                if not valida:
+                    # Conexão quebrada/expirada: descarta e tenta de novo dentro do mesmo prazo
+                    self._fechar(entrada)
+            finally:
+                with self._cond:
+                    self._validando -= 1
+                    if valida:
+                        self._em_uso[id(entrada.conn)] = entrada
+                    else:
+                        self._cond.notify()
+            if valida:
+                return entrada.conn
+
+    def putconn(self, conn, descartar: bool = False):
+        """Devolve a conexão; conexões quebradas ou com transação pendente são descartadas"""
+        with self._cond:
+            entrada = self._em_uso.pop(id(conn), None)
+        if entrada is None:
+            conn.close()
+            return
+
+        if not descartar and not conn.closed:
+            status = conn.get_transaction_status()
+            if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    descartar = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                descartar = True
+
+        agora = time.monotonic()
+        if descartar or conn.closed or self._fechado or agora - entrada.criada_em >= self.max_lifetime_s:
+            self._fechar(entrada)
+            with self._cond:
+                self._cond.notify()
+            return
+
+        entrada.devolvida_em = agora
+        with self._cond:
+            self._ociosas.append(entrada)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._fechado = True
+            entradas = list(self._ociosas) + list(self._em_uso.values())
+            self._ociosas.clear()
+            self._em_uso.clear()
+            self._cond.notify_all()
+        for entrada in entradas:
+            try:
+                entrada.conn.close()
+            except Exception:
+                pass
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'em_uso': len(self._em_uso),
+                'ociosas': len(self._ociosas),
+                'aguardando': self._aguardando,
+                'total': self._total(),
+                'min': self.minconn,
+                'max': self.maxconn,
+                **self._contadores
+            }
+
+    # ========== INTERNOS ==========
+
+    def _total(self) -> int:
+        return len(self._ociosas) + len(self._em_uso) + self._abrindo + self._validando
+
+    def _varrer_ociosas(self):
+        """Remove (sob o lock) as ociosas expiradas, mais antigas primeiro, mantendo minconn"""
+        agora = time.monotonic()
+        expiradas = []
+        while self._ociosas and self._total() > self.minconn:
+            entrada = self._ociosas[0]
+            if (agora - entrada.devolvida_em < self.idle_timeout_s
+                    and agora - entrada.criada_em < self.max_lifetime_s):
+                break
+            expiradas.append(self._ociosas.popleft())
+        return expiradas
+
+    def _validar(self, entrada: _Entrada) -> bool:
+        conn = entrada.conn
+        agora = time.monotonic()
+        if conn.closed or agora - entrada.criada_em >= self.max_lifetime_s:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if agora - entrada.devolvida_em >= self.validar_apos_s:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1')
+                cursor.close()
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Conexão inválida descartada no checkout: {e}")
+                return False
+        return True
+
+    def _abrir(self) -> _Entrada:
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._contadores['criadas'] += 1
+        return _Entrada(conn, time.monotonic())
+
+    def _fechar(self, entrada: _Entrada):
+        with self._cond:
+            self._contadores['descartadas'] += 1
+        try:
+            entrada.conn.close()
+        except Exception:
+            pass
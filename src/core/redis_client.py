@@ -0,0 +1,73 @@
+"""
+Cliente Redis compartilhado (opcional)
+
+get_redis() devolve None quando REDIS_HOST não está configurado, o pacote
+redis não está instalado ou o servidor não responde; quem usa deve cair
+para um estado em memória local.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from .config import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB
+
+logger = logging.getLogger(__name__)
+
+# Após uma falha de conexão, espera este tempo antes de tentar de novo
+RETENTAR_APOS_S = 30
+
+_cliente = None
+_pid = None
+_falhou_em = None
+_lock = threading.Lock()
+
+
+def get_redis():
+    """Retorna o cliente Redis do processo atual, ou None se indisponível"""
+    global _cliente, _pid, _falhou_em
+
+    if not REDIS_HOST:
+        return None
+
+    pid = os.getpid()
+    if _pid == pid:
+        if _cliente is not None:
+            return _cliente
+        if _falhou_em is not None and time.monotonic() - _falhou_em < RETENTAR_APOS_S:
+            return None
+
+    with _lock:
+        if _pid == pid and _cliente is not None:
+            return _cliente
+
+        _pid = pid
+        _cliente = None
+        try:
+            import redis
+            cliente = redis.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                password=REDIS_PASSWORD,
+                db=REDIS_DB,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+            cliente.ping()
+        except Exception as e:
+            logger.warning(f"Redis indisponível, usando estado local: {e}")
+            _falhou_em = time.monotonic()
+            return None
+
+        _cliente = cliente
+        _falhou_em = None
+        return _cliente
+
+
+def descartar_redis():
+    """Descarta o cliente após erro em uso; a próxima chamada reconecta após o intervalo"""
+    global _cliente, _falhou_em
+    with _lock:
+        _cliente = None
+        _falhou_em = time.monotonic()
@@ -0,0 +1,122 @@
+"""
+Roteamento de leituras para réplicas PostgreSQL
+
+- cada réplica tem o próprio PoolConexoes
+- escolha round-robin entre as réplicas disponíveis e com atraso aceitável
+- atraso (lag) medido sob demanda, no máximo uma vez por intervalo por réplica
+- réplica que falha fica fora da rotação até a próxima verificação;
+  sem réplica elegível, quem chamou usa o primário
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extensions import parse_dsn
+
+from .pool import PoolConexoes
+
+logger = logging.getLogger(__name__)
+
+# Atraso de replay em segundos; 0 quando a réplica já aplicou tudo o que recebeu
+# (evita acusar atraso quando o primário simplesmente não teve escritas)
+SQL_LAG_REPLICA = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+class Replica:
+    def __init__(self, dsn: str, pool: PoolConexoes):
+        self.pool = pool
+        self.host = self._host(dsn)
+        self.lag_s: Optional[float] = None
+        self.disponivel = False
+        self.verificada_em = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _host(dsn: str) -> str:
+        """Identificação sem credenciais, para logs e /health"""
+        try:
+            partes = parse_dsn(dsn)
+            return f"{partes.get('host', 'localhost')}:{partes.get('port', '5432')}"
+        except Exception:
+            return 'replica'
+
+
+class RoteadorReplicas:
+    def __init__(self, dsns: List[str], criar_pool: Callable[[str], PoolConexoes],
+                 max_lag_s: float = 10, intervalo_verificacao_s: float = 5):
+        self.replicas = [Replica(dsn, criar_pool(dsn)) for dsn in dsns]
+        self.max_lag_s = max_lag_s
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self._proxima = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def escolher(self) -> Optional[Replica]:
+        """Próxima réplica elegível (round-robin), ou None para usar o primário"""
+        if not self.replicas:
+            return None
+        inicio = next(self._proxima)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(inicio + i) % len(self.replicas)]
+            self._verificar(replica)
+            if replica.disponivel and replica.lag_s is not None and replica.lag_s <= self.max_lag_s:
+                return replica
+        return None
+
+    def falhou(self, replica: Replica):
+        """Tira a réplica da rotação até a próxima verificação"""
+        with replica.lock:
+            replica.disponivel = False
+            replica.verificada_em = time.monotonic()
+
+    def info(self) -> List[Dict[str, Any]]:
+        return [{
+            'host': replica.host,
+            'disponivel': replica.disponivel,
+            'lag_s': round(replica.lag_s, 2) if replica.lag_s is not None else None,
+            'pool': replica.pool.metricas()
+        } for replica in self.replicas]
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    def _verificar(self, replica: Replica):
+        """Mede o atraso se a última medição expirou; só uma thread mede por vez"""
+        if time.monotonic() - replica.verificada_em < self.intervalo_verificacao_s:
+            return
+        if not replica.lock.acquire(blocking=False):
+            return
+        try:
+            conn = replica.pool.getconn(timeout=1)
+            descartar = True
+            try:
+                cursor = conn.cursor()
+                cursor.execute(SQL_LAG_REPLICA)
+                replica.lag_s = float(cursor.fetchone()[0])
+                cursor.close()
+                conn.rollback()
+                descartar = False
+            finally:
+                replica.pool.putconn(conn, descartar=descartar)
+
+            if not replica.disponivel or replica.lag_s > self.max_lag_s:
+                logger.info(f"Réplica {replica.host}: lag {replica.lag_s:.1f}s (máximo {self.max_lag_s}s)")
+            replica.disponivel = True
+        except Exception as e:
+            if replica.disponivel:
+                logger.warning(f"Réplica {replica.host} indisponível: {e}")
+            replica.disponivel = False
+        finally:
+            replica.verificada_em = time.monotonic()
+            replica.lock.release()
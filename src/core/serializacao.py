@@ -0,0 +1,28 @@
+"""
+Serialização JSON compartilhada (orjson quando disponível, json da stdlib caso contrário)
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def dumps(conteudo: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(conteudo, default=_default, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,53 @@
+"""
+Configuração do gunicorn para produção
+
+Uso (a partir de src/):
+    gunicorn -c gunicorn_conf.py api.main:app
+
+Variáveis:
+    WORKERS / WEB_WORKERS   número de processos (padrão: núcleos de CPU)
+    PORT                    porta HTTP (padrão: 8000)
+    GRACEFUL_TIMEOUT        segundos para concluir requisições no shutdown
+    POSTGRES_MAX_CONNECTIONS, DB_RESERVED_CONNECTIONS, DB_POOL_MAX
+                            dimensionam o pool de cada worker (core.database.calcular_tamanho_pool)
+"""
+
+import multiprocessing
+import os
+
+workers = int(os.getenv('WEB_WORKERS') or os.getenv('WORKERS') or '0') or multiprocessing.cpu_count()
+
+# Exporta o total para que cada worker calcule sua fatia de conexões
+os.environ['WEB_WORKERS'] = str(workers)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Carrega a aplicação uma vez no master; pools são criados sob demanda em cada worker
+preload_app = True
+
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Recicla workers periodicamente para conter vazamentos de memória
+max_requests = int(os.getenv('MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '1000'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    from core.database import calcular_tamanho_pool
+    minconn, maxconn = calcular_tamanho_pool(workers)
+    server.log.info(
+        f"{workers} workers, pool por worker {minconn}-{maxconn} conexões "
+        f"(total máximo {workers * maxconn})"
+    )
+
+
+def worker_exit(server, worker):
+    from core.database import fechar_database
+    fechar_database()
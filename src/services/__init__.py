@@ -1,11 +1,18 @@
-from .digisac_service import DigisacAPI
+from .digisac_service import DigisacAPI, EnvioResultado
+from .envio_lote import EnvioLoteService
 from .feriados_manager import FeriadosManager
+from .outbox import OutboxSender
+from .reenvio import ReenvioService
 from .template_engine import TemplateEngine
 from .template_manager import TemplateManager
 
 __all__ = [
     'DigisacAPI',
+    'EnvioResultado',
+    'EnvioLoteService',
     'FeriadosManager',
+    'OutboxSender',
+    'ReenvioService',
     'TemplateEngine',
     'TemplateManager'
 ]
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Cache com TTL para consultas ao Digisac (contatos)
+
+Com Redis disponível, o cache é compartilhado por todos os workers (cada
+chave expira sozinha; o limite de memória fica com a política do Redis).
+Sem Redis — ou se ele falhar — cai para um LRU em memória por processo,
+limitado a max_itens. Valores None são cache negativo (contato inexistente)
+e expiram em ttl_ausente_s.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.config import CONTATOS_CACHE_TTL_S, CONTATOS_CACHE_TTL_AUSENTE_S, CONTATOS_CACHE_MAX
+from core.redis_client import get_redis, descartar_redis
+from core.serializacao import dumps
+
+logger = logging.getLogger(__name__)
+
+# Retorno de obter() para chave fora do cache (None é um valor válido: cache negativo)
+FALTA = object()
+
+# Chaves por comando MGET / pipeline no Redis
+CHAVES_POR_COMANDO = 500
+
+
+class _CacheMemoria:
+    """LRU com expiração por item, no processo atual"""
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self.lock = threading.Lock()
+        self.itens: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.removidos = 0
+
+    def obter_muitos(self, chaves: List[str]) -> Dict[str, Any]:
+        agora = time.monotonic()
+        encontrados = {}
+        with self.lock:
+            for chave in chaves:
+                item = self.itens.get(chave)
+                if item is None:
+                    continue
+                if item[0] <= agora:
+                    del self.itens[chave]
+                    continue
+                self.itens.move_to_end(chave)
+                encontrados[chave] = item[1]
+        return encontrados
+
+    def gravar_muitos(self, itens: List[Tuple[str, Any, float]]):
+        agora = time.monotonic()
+        with self.lock:
+            for chave, valor, ttl_s in itens:
+                self.itens[chave] = (agora + ttl_s, valor)
+                self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+                self.removidos += 1
+
+    def invalidar(self, chaves: List[str]):
+        with self.lock:
+            for chave in chaves:
+                self.itens.pop(chave, None)
+
+    def tamanho(self) -> int:
+        return len(self.itens)
+
+
+class _CacheRedis:
+    """Itens no Redis como JSON com expiração (SET PX), compartilhados entre workers"""
+
+    def __init__(self, cliente, nome: str):
+        self.r = cliente
+        self.prefixo = f"cache:{nome}:"
+
+    def obter_muitos(self, chaves: List[str]) -> Dict[str, Any]:
+        encontrados = {}
+        for i in range(0, len(chaves), CHAVES_POR_COMANDO):
+            bloco = chaves[i:i + CHAVES_POR_COMANDO]
+            for chave, valor in zip(bloco, self.r.mget([self.prefixo + c for c in bloco])):
+                if valor is not None:
+                    encontrados[chave] = json.loads(valor)
+        return encontrados
+
+    def gravar_muitos(self, itens: List[Tuple[str, Any, float]]):
+        for i in range(0, len(itens), CHAVES_POR_COMANDO):
+            pipe = self.r.pipeline(transaction=False)
+            for chave, valor, ttl_s in itens[i:i + CHAVES_POR_COMANDO]:
+                pipe.set(self.prefixo + chave, dumps(valor), px=int(ttl_s * 1000))
+            pipe.execute()
+
+    def invalidar(self, chaves: List[str]):
+        for i in range(0, len(chaves), CHAVES_POR_COMANDO):
+            self.r.delete(*[self.prefixo + c for c in chaves[i:i + CHAVES_POR_COMANDO]])
+
+
+class CacheTTL:
+    """
+    Cache chave -> valor com TTL, no Redis ou em memória local.
+
+    Falhas do cache nunca quebram quem chama: no pior caso, viram falta e a
+    consulta original é feita.
+    """
+
+    def __init__(self, nome: str, ttl_s: float = CONTATOS_CACHE_TTL_S,
+                 ttl_ausente_s: float = CONTATOS_CACHE_TTL_AUSENTE_S, max_itens: int = CONTATOS_CACHE_MAX):
+        self.nome = nome
+        self.ttl_s = ttl_s
+        self.ttl_ausente_s = ttl_ausente_s
+        self._memoria = _CacheMemoria(max_itens)
+        self.metricas = {'acertos': 0, 'negativos': 0, 'faltas': 0, 'gravacoes': 0}
+
+    def obter(self, chave: str) -> Any:
+        """Valor em cache (None = sabidamente inexistente) ou FALTA"""
+        return self.obter_muitos([chave]).get(chave, FALTA)
+
+    def obter_muitos(self, chaves: Iterable[str]) -> Dict[str, Any]:
+        """Apenas as chaves presentes no cache, com uma ida ao Redis por bloco"""
+        chaves = list(dict.fromkeys(chaves))
+        if not chaves:
+            return {}
+        encontrados = self._executar('obter_muitos', {}, chaves)
+        negativos = sum(1 for valor in encontrados.values() if valor is None)
+        self.metricas['acertos'] += len(encontrados) - negativos
+        self.metricas['negativos'] += negativos
+        self.metricas['faltas'] += len(chaves) - len(encontrados)
+        return encontrados
+
+    def gravar(self, chave: str, valor: Any, ttl_s: float = None):
+        self.gravar_muitos({chave: valor}, ttl_s=ttl_s)
+
+    def gravar_muitos(self, itens: Dict[str, Any], ttl_s: float = None):
+        """Grava os itens; valores None usam o TTL do cache negativo"""
+        if not itens:
+            return
+        linhas = [
+            (chave, valor, ttl_s or (self.ttl_ausente_s if valor is None else self.ttl_s))
+            for chave, valor in itens.items()
+        ]
+        self._executar('gravar_muitos', None, linhas)
+        self.metricas['gravacoes'] += len(linhas)
+
+    def invalidar(self, *chaves: str):
+        if chaves:
+            self._executar('invalidar', None, list(chaves))
+
+    def info(self) -> Dict[str, Any]:
+        """Resumo para o /health"""
+        consultas = self.metricas['acertos'] + self.metricas['negativos'] + self.metricas['faltas']
+        redis = get_redis() is not None
+        info = {
+            'backend': 'redis' if redis else 'memoria',
+            **self.metricas,
+            'taxa_acerto': round((consultas - self.metricas['faltas']) / consultas, 3) if consultas else None
+        }
+        if not redis:
+            info['itens'] = self._memoria.tamanho()
+            info['removidos_lru'] = self._memoria.removidos
+        return info
+
+    def _executar(self, operacao: str, padrao: Any, *args):
+        """Executa no Redis, caindo para a memória local se ele falhar"""
+        cliente = get_redis()
+        if cliente is not None:
+            try:
+                return getattr(_CacheRedis(cliente, self.nome), operacao)(*args)
+            except Exception as e:
+                logger.warning(f"Cache {self.nome}: Redis falhou ({e}), usando memória local")
+                descartar_redis()
+        try:
+            return getattr(self._memoria, operacao)(*args)
+        except Exception as e:
+            logger.error(f"Cache {self.nome}: erro no cache local: {e}")
+            return padrao
+
+
+_cache_contatos: Optional[CacheTTL] = None
+
+
+def get_cache_contatos() -> CacheTTL:
+    global _cache_contatos
+    if _cache_contatos is None:
+        _cache_contatos = CacheTTL('contatos')
+    return _cache_contatos
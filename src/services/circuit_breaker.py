@@ -0,0 +1,252 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import (
+    CIRCUITO_JANELA_S, CIRCUITO_MIN_CHAMADAS, CIRCUITO_TAXA_FALHA,
+    CIRCUITO_LATENCIA_LENTA_MS, CIRCUITO_TAXA_LENTA, CIRCUITO_TEMPO_ABERTO_S,
+    DIGISAC_TIMEOUT
+)
+from core.redis_client import get_redis, descartar_redis
+
+logger = logging.getLogger(__name__)
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+MEIO_ABERTO = 'meio_aberto'
+
+# A janela deslizante é dividida neste número de baldes
+BALDES_POR_JANELA = 12
+
+
+class _EstadoMemoria:
+    """Estado do circuito no processo atual (sem Redis)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.baldes: Dict[int, List[int]] = {}
+        self.estado = FECHADO
+        self.desde = 0.0
+        self.sonda_ate = 0.0
+
+    def registrar(self, balde: int, falha: bool, lenta: bool, ttl: int):
+        with self.lock:
+            contagem = self.baldes.setdefault(balde, [0, 0, 0])
+            contagem[0] += 1
+            contagem[1] += int(falha)
+            contagem[2] += int(lenta)
+
+    def contagens(self, baldes: List[int]) -> Tuple[int, int, int]:
+        with self.lock:
+            primeiro = baldes[0]
+            for antigo in [b for b in self.baldes if b < primeiro]:
+                del self.baldes[antigo]
+            totais = [0, 0, 0]
+            for balde in baldes:
+                for i, valor in enumerate(self.baldes.get(balde, (0, 0, 0))):
+                    totais[i] += valor
+            return tuple(totais)
+
+    def obter_estado(self) -> Tuple[str, float]:
+        return self.estado, self.desde
+
+    def definir_estado(self, estado: str, desde: float, baldes: List[int]):
+        with self.lock:
+            self.estado = estado
+            self.desde = desde
+            if estado == FECHADO:
+                self.baldes.clear()
+
+    def adquirir_sonda(self, agora: float, ttl: float) -> bool:
+        with self.lock:
+            if agora < self.sonda_ate:
+                return False
+            self.sonda_ate = agora + ttl
+            return True
+
+    def liberar_sonda(self):
+        with self.lock:
+            self.sonda_ate = 0.0
+
+
+class _EstadoRedis:
+    """Estado do circuito no Redis, compartilhado por todos os workers"""
+
+    def __init__(self, cliente, nome: str):
+        self.r = cliente
+        self.prefixo = f"circuito:{nome}"
+
+    def _chave_balde(self, balde: int) -> str:
+        return f"{self.prefixo}:balde:{balde}"
+
+    def registrar(self, balde: int, falha: bool, lenta: bool, ttl: int):
+        chave = self._chave_balde(balde)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hincrby(chave, 'total', 1)
+        if falha:
+            pipe.hincrby(chave, 'falhas', 1)
+        if lenta:
+            pipe.hincrby(chave, 'lentas', 1)
+        pipe.expire(chave, ttl)
+        pipe.execute()
+
+    def contagens(self, baldes: List[int]) -> Tuple[int, int, int]:
+        pipe = self.r.pipeline(transaction=False)
+        for balde in baldes:
+            pipe.hmget(self._chave_balde(balde), 'total', 'falhas', 'lentas')
+        totais = [0, 0, 0]
+        for valores in pipe.execute():
+            for i, valor in enumerate(valores):
+                totais[i] += int(valor or 0)
+        return tuple(totais)
+
+    def obter_estado(self) -> Tuple[str, float]:
+        estado, desde = self.r.hmget(f"{self.prefixo}:estado", 'estado', 'desde')
+        if not estado:
+            return FECHADO, 0.0
+        return estado.decode(), float(desde or 0)
+
+    def definir_estado(self, estado: str, desde: float, baldes: List[int]):
+        pipe = self.r.pipeline(transaction=False)
+        pipe.hset(f"{self.prefixo}:estado", mapping={'estado': estado, 'desde': desde})
+        if estado == FECHADO:
+            pipe.delete(*[self._chave_balde(b) for b in baldes])
+        pipe.execute()
+
+    def adquirir_sonda(self, agora: float, ttl: float) -> bool:
+        return bool(self.r.set(f"{self.prefixo}:sonda", agora, nx=True, ex=max(1, int(ttl))))
+
+    def liberar_sonda(self):
+        self.r.delete(f"{self.prefixo}:sonda")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por taxa de falhas e de chamadas lentas em janela deslizante.
+
+    fechado     -> chamadas passam; abre quando, com ao menos min_chamadas na
+                   janela, a taxa de falhas ou de chamadas lentas passa do limite
+    aberto      -> chamadas são recusadas sem tocar a rede por tempo_aberto_s
+    meio_aberto -> uma única chamada de sonda (entre todos os workers) decide
+                   se o circuito fecha ou volta a abrir
+
+    O estado fica no Redis quando disponível; caso contrário, em memória.
+    """
+
+    def __init__(self, nome: str, janela_s: int = CIRCUITO_JANELA_S,
+                 min_chamadas: int = CIRCUITO_MIN_CHAMADAS, taxa_falha: float = CIRCUITO_TAXA_FALHA,
+                 latencia_lenta_ms: int = CIRCUITO_LATENCIA_LENTA_MS, taxa_lenta: float = CIRCUITO_TAXA_LENTA,
+                 tempo_aberto_s: int = CIRCUITO_TEMPO_ABERTO_S, timeout_sonda_s: float = DIGISAC_TIMEOUT):
+        self.nome = nome
+        self.janela_s = janela_s
+        self.min_chamadas = min_chamadas
+        self.taxa_falha = taxa_falha
+        self.latencia_lenta_s = latencia_lenta_ms / 1000
+        self.taxa_lenta = taxa_lenta
+        self.tempo_aberto_s = tempo_aberto_s
+        self.timeout_sonda_s = timeout_sonda_s + 1
+        self.largura_balde = max(1, janela_s // BALDES_POR_JANELA)
+        self._memoria = _EstadoMemoria()
+
+    # ========== API ==========
+
+    def permitir(self) -> bool:
+        """True se a chamada pode seguir; False para falhar rápido"""
+        agora = time.time()
+        estado, desde = self._executar('obter_estado', (FECHADO, 0.0))
+
+        if estado == FECHADO:
+            return True
+
+        if estado == ABERTO and agora - desde < self.tempo_aberto_s:
+            return False
+
+        # Aberto há tempo suficiente, ou já meio-aberto: só a sonda passa
+        if not self._executar('adquirir_sonda', False, agora, self.timeout_sonda_s):
+            return False
+        if estado == ABERTO:
+            self._executar('definir_estado', None, MEIO_ABERTO, agora, [])
+            logger.info(f"Circuito {self.nome}: meio-aberto, enviando sonda")
+        return True
+
+    def registrar(self, sucesso: bool, duracao_s: float):
+        """Registra o resultado de uma chamada que foi permitida"""
+        agora = time.time()
+        lenta = duracao_s >= self.latencia_lenta_s
+        estado, _ = self._executar('obter_estado', (FECHADO, 0.0))
+
+        if estado == MEIO_ABERTO:
+            if sucesso and not lenta:
+                self._executar('definir_estado', None, FECHADO, agora, self._baldes(agora))
+                logger.info(f"Circuito {self.nome}: sonda bem-sucedida, fechado")
+            else:
+                self._executar('definir_estado', None, ABERTO, agora, [])
+                logger.warning(f"Circuito {self.nome}: sonda falhou, aberto novamente")
+            self._executar('liberar_sonda', None)
+            return
+
+        balde = int(agora // self.largura_balde)
+        self._executar('registrar', None, balde, not sucesso, lenta, self.janela_s + self.largura_balde)
+
+        if estado != FECHADO:
+            return
+
+        total, falhas, lentas = self._executar('contagens', (0, 0, 0), self._baldes(agora))
+        if total < self.min_chamadas:
+            return
+        if falhas / total >= self.taxa_falha or lentas / total >= self.taxa_lenta:
+            self._executar('definir_estado', None, ABERTO, agora, [])
+            logger.warning(
+                f"Circuito {self.nome}: aberto ({falhas}/{total} falhas, "
+                f"{lentas}/{total} lentas em {self.janela_s}s)"
+            )
+
+    def info(self) -> Dict[str, Any]:
+        """Resumo do estado para o /health"""
+        agora = time.time()
+        estado, desde = self._executar('obter_estado', (FECHADO, 0.0))
+        total, falhas, lentas = self._executar('contagens', (0, 0, 0), self._baldes(agora))
+        info = {
+            'estado': estado,
+            'backend': 'redis' if get_redis() is not None else 'memoria',
+            'janela_s': self.janela_s,
+            'chamadas': total,
+            'falhas': falhas,
+            'lentas': lentas
+        }
+        if estado == ABERTO:
+            info['reabre_em_s'] = max(0, round(self.tempo_aberto_s - (agora - desde), 1))
+        return info
+
+    # ========== INTERNOS ==========
+
+    def _baldes(self, agora: float) -> List[int]:
+        atual = int(agora // self.largura_balde)
+        quantidade = max(1, self.janela_s // self.largura_balde)
+        return list(range(atual - quantidade + 1, atual + 1))
+
+    def _executar(self, operacao: str, padrao: Any, *args):
+        """Executa a operação no Redis, caindo para a memória local se ele falhar"""
+        cliente = get_redis()
+        if cliente is not None:
+            try:
+                return getattr(_EstadoRedis(cliente, self.nome), operacao)(*args)
+            except Exception as e:
+                logger.warning(f"Circuito {self.nome}: Redis falhou ({e}), usando estado local")
+                descartar_redis()
+        try:
+            return getattr(self._memoria, operacao)(*args)
+        except Exception as e:
+            logger.error(f"Circuito {self.nome}: erro no estado local: {e}")
+            return padrao
+
+
+_circuito_digisac: Optional[CircuitBreaker] = None
+
+
+def get_circuito_digisac() -> CircuitBreaker:
+    global _circuito_digisac
+    if _circuito_digisac is None:
+        _circuito_digisac = CircuitBreaker('digisac')
+    return _circuito_digisac
@@ -1,10 +1,49 @@
 import requests
-from typing import Optional, Dict, Any, List
-from core.config import API_BASE_URL, DIGISAC_TOKEN
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from core.config import (
+    API_BASE_URL, DIGISAC_TOKEN, DIGISAC_TIMEOUT,
+    CONTATOS_LISTA_TTL_S, CONTATOS_PREFETCH_LISTAGEM_MIN, CONTATOS_PREFETCH_PARALELO
+)
+from .cache import CacheTTL, FALTA, get_cache_contatos
+from .circuit_breaker import CircuitBreaker, get_circuito_digisac
+from .rate_limiter import LimitadorTaxa, get_limitador_digisac
+
+# Chave da listagem completa no cache de contatos (ids do Digisac não começam com ':')
+CHAVE_LISTA_CONTATOS = ':lista'
+
+
+@dataclass
+class EnvioResultado:
+    """Resultado de um envio ao Digisac"""
+    sucesso: bool
+    message_id: Optional[str] = None
+    circuito_aberto: bool = False
+    erro_classe: Optional[str] = None
+    # Telemetria da chamada: tempo de resposta do Digisac e status HTTP (None sem resposta)
+    latencia_ms: Optional[int] = None
+    http_status: Optional[int] = None
+
+
+def classificar_erro_http(status_code: int) -> str:
+    """Classe de erro usada para filtrar reenvios"""
+    if status_code == 429:
+        return 'http_429'
+    if status_code >= 500:
+        return 'http_5xx'
+    if status_code >= 400:
+        return 'http_4xx'
+    return 'resposta_inesperada'
+
 
 class DigisacAPI:
-    def __init__(self):
+    def __init__(self, circuito: CircuitBreaker = None, limitador: LimitadorTaxa = None, cache: CacheTTL = None):
         self.base_url = API_BASE_URL
+        self.circuito = circuito or get_circuito_digisac()
+        self.limitador = limitador or get_limitador_digisac()
+        self.cache = cache or get_cache_contatos()
         self.headers = {
             "Authorization": f"Bearer {DIGISAC_TOKEN}",
             "Content-Type": "application/json"
@@ -14,20 +53,79 @@ class DigisacAPI:
 
     def enviar_mensagem(self, contact_id: str, mensagem: str) -> bool:
         """Envia mensagem para contato com retry simples"""
+        return self.enviar(contact_id, mensagem).sucesso
+
+    def enviar(self, contact_id: str, mensagem: str) -> EnvioResultado:
+        """
+        Envia mensagem e captura o ID da mensagem no Digisac.
+        
+        Respeita RATE_LIMIT_PER_MINUTE. Com o circuito aberto, falha imediatamente
+        (circuito_aberto=True) sem chamar a API; quem chama deve adiar o envio em
+        vez de registrá-lo como erro.
+        """
+        if not self.circuito.permitir():
+            return EnvioResultado(sucesso=False, circuito_aberto=True, erro_classe='circuito_aberto')
+        
+        self.limitador.aguardar()
         payload = {"contactId": contact_id, "text": mensagem}
+        inicio = time.perf_counter()
         
         try:
             response = self.session.post(
                 f"{self.base_url}/messages",
                 json=payload,
-                timeout=10
+                timeout=DIGISAC_TIMEOUT
             )
-            return response.status_code == 200
-        except (requests.exceptions.RequestException, requests.exceptions.Timeout):
-            return False
+        except requests.exceptions.Timeout:
+            duracao = time.perf_counter() - inicio
+            self.circuito.registrar(False, duracao)
+            return EnvioResultado(sucesso=False, erro_classe='timeout', latencia_ms=round(duracao * 1000))
+        except requests.exceptions.RequestException:
+            duracao = time.perf_counter() - inicio
+            self.circuito.registrar(False, duracao)
+            return EnvioResultado(sucesso=False, erro_classe='conexao', latencia_ms=round(duracao * 1000))
+        
+        duracao = time.perf_counter() - inicio
+        latencia_ms = round(duracao * 1000)
+        # Erros 4xx são do pedido (contato inválido etc.), não indisponibilidade do Digisac
+        self.circuito.registrar(response.status_code < 500, duracao)
+        
+        if response.status_code != 200:
+            return EnvioResultado(sucesso=False, erro_classe=classificar_erro_http(response.status_code),
+                                  latencia_ms=latencia_ms, http_status=response.status_code)
+        
+        try:
+            message_id = response.json().get('id')
+        except ValueError:
+            message_id = None
+        
+        return EnvioResultado(
+            sucesso=True,
+            message_id=str(message_id) if message_id else None,
+            latencia_ms=latencia_ms,
+            http_status=response.status_code
+        )
 
-    def listar_contatos(self) -> List[Dict[str, Any]]:
-        """Lista todos os contatos com paginação otimizada"""
+    def listar_contatos(self, usar_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Lista todos os contatos com paginação otimizada.
+        
+        A listagem completa fica em cache por CONTATOS_LISTA_TTL_S e aquece o
+        cache de cada contato (get_contact_info e prefetch_contatos).
+        """
+        if usar_cache:
+            contatos = self.cache.obter(CHAVE_LISTA_CONTATOS)
+            if contatos is not FALTA and contatos is not None:
+                return contatos
+        
+        contatos, completa = self._listar_paginas()
+        self.cache.gravar_muitos({str(c['id']): c for c in contatos if c.get('id') is not None})
+        if completa:
+            self.cache.gravar(CHAVE_LISTA_CONTATOS, contatos, ttl_s=CONTATOS_LISTA_TTL_S)
+        return contatos
+
+    def _listar_paginas(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Todas as páginas de /contacts; completa=False se alguma página falhou"""
         all_contatos = []
         page = 1
         
@@ -40,7 +138,7 @@ class DigisacAPI:
                 )
                 
                 if response.status_code != 200:
-                    break
+                    return all_contatos, False
                     
                 data = response.json()
                 contatos = data.get('data', [])
@@ -55,10 +153,10 @@ class DigisacAPI:
                     
                 page += 1
                 
-        except (requests.exceptions.RequestException, requests.exceptions.Timeout):
-            pass
+        except (requests.exceptions.RequestException, ValueError):
+            return all_contatos, False
             
-        return all_contatos
+        return all_contatos, True
 
     def _make_request(self, method: str, endpoint: str, payload: Optional[Dict] = None) -> requests.Response:
         """Método genérico para requests com tratamento de erro"""
@@ -83,13 +181,69 @@ class DigisacAPI:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Erro {method} para {url}: {str(e)}")
 
-    def get_contact_info(self, contact_id: str) -> Optional[Dict[str, Any]]:
-        """Busca informações específicas de um contato"""
+    def get_contact_info(self, contact_id: str, usar_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Busca informações específicas de um contato (None se não existir ou a consulta falhar)"""
+        contact_id = str(contact_id)
+        if usar_cache:
+            contato = self.cache.obter(contact_id)
+            if contato is not FALTA:
+                return contato
+        
+        contato, definitivo = self._buscar_contato(contact_id)
+        if definitivo:
+            self.cache.gravar(contact_id, contato)
+        return contato
+
+    def prefetch_contatos(self, contact_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Resolve vários contatos de uma vez: uma leitura em lote do cache e, para
+        os que faltam, uma listagem paginada (muitos) ou consultas paralelas
+        (poucos). Retorna {contact_id: contato ou None se inexistente}; ids cuja
+        consulta falhou (timeout, 5xx) ficam de fora, sem cache negativo.
+        """
+        ids = list(dict.fromkeys(str(c) for c in contact_ids if c))
+        resolvidos = self.cache.obter_muitos(ids)
+        faltando = [contact_id for contact_id in ids if contact_id not in resolvidos]
+        if not faltando:
+            return resolvidos
+        
+        if len(faltando) >= CONTATOS_PREFETCH_LISTAGEM_MIN:
+            contatos, completa = self._listar_paginas()
+            por_id = {str(c['id']): c for c in contatos if c.get('id') is not None}
+            self.cache.gravar_muitos(por_id)
+            if completa:
+                self.cache.gravar(CHAVE_LISTA_CONTATOS, contatos, ttl_s=CONTATOS_LISTA_TTL_S)
+            # Só uma listagem completa prova que um contato não existe
+            novos = {contact_id: por_id.get(contact_id) for contact_id in faltando
+                     if contact_id in por_id or completa}
+            self.cache.gravar_muitos({contact_id: None for contact_id, c in novos.items() if c is None})
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, CONTATOS_PREFETCH_PARALELO)) as executor:
+                buscas = list(executor.map(self._buscar_contato, faltando))
+            novos = {contact_id: contato for contact_id, (contato, definitivo) in zip(faltando, buscas) if definitivo}
+            self.cache.gravar_muitos(novos)
+        
+        resolvidos.update(novos)
+        return resolvidos
+
+    def _buscar_contato(self, contact_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """(contato, definitivo): 404 é definitivo (cache negativo); timeout e 5xx não"""
+        try:
+            response = self.session.get(f"{self.base_url}/contacts/{contact_id}", timeout=DIGISAC_TIMEOUT)
+        except requests.exceptions.RequestException:
+            return None, False
+        if response.status_code == 404:
+            return None, True
+        if response.status_code != 200:
+            return None, False
         try:
-            response = self._make_request('GET', f'/contacts/{contact_id}')
-            return response.json()
-        except Exception:
-            return None
+            return response.json(), True
+        except ValueError:
+            return None, False
+
+    def invalidar_contatos(self, *contact_ids: str):
+        """Descarta contatos do cache (ex.: cliente recriado com um contato antes inexistente)"""
+        self.cache.invalidar(*[str(c) for c in contact_ids if c], CHAVE_LISTA_CONTATOS)
 
     def close(self):
         """Fecha a sessão HTTP"""
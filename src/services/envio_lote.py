@@ -0,0 +1,218 @@
+import logging
+import uuid
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from core.config import (
+    HISTORICO_COMPACTO, FREQ_CAP_MAX_ENVIOS, FREQ_CAP_JANELA_HORAS, FREQ_CAP_ESCOPO
+)
+from models.models import Cliente
+from .digisac_service import DigisacAPI
+from .outbox import OutboxSender
+from .template_manager import TemplateManager
+
+logger = logging.getLogger(__name__)
+
+# Clientes consultados por vez no limite de frequência (uma query por bloco)
+CLIENTES_POR_BLOCO = 1000
+
+
+class EnvioLoteService:
+    """
+    Pipeline de envio em lote em duas fases (outbox):
+
+    1. Enfileira: renderiza as mensagens e grava todos os destinatários como
+       'pendente' em INSERTs em bloco, com chave de idempotência lote_id:cliente_id.
+    2. Envia: o OutboxSender reivindica e conclui as linhas pendentes.
+
+    Recebe qualquer iterável de clientes — a lista validada de IDs ou o cursor
+    server-side de uma audiência. Se o processo cair no meio, o lote é retomado
+    pelo lote_id (OutboxSender.retomar) sem recalcular a audiência.
+    """
+
+    def __init__(self, db, request, digisac: DigisacAPI = None):
+        self.db = db
+        self.request = request
+        self.lote_id = request.lote_id or uuid.uuid4().hex
+        self.digisac = digisac or DigisacAPI()
+        self.template_manager = TemplateManager(db)
+        self.variaveis_extras = request.variaveis_extras or {}
+        self.customizadas = request.mensagens_customizadas or {}
+
+        # Texto-base carregado uma única vez para o lote (não por cliente)
+        self.texto_base = None
+        template_id = None
+        if request.template_name:
+            template = db.get_template_by_name(request.template_name)
+            if template:
+                self.texto_base = template.template_text
+                template_id = template.id
+        elif request.mensagem_padrao:
+            self.texto_base = request.mensagem_padrao
+
+        self.versao_id = None
+        if HISTORICO_COMPACTO and self.texto_base:
+            self.versao_id = db.obter_versao_template(self.texto_base, template_id)
+
+    def executar(self, clientes: Iterable[Cliente]) -> Dict[str, Any]:
+        """Enfileira e envia o lote; retorna o resumo no formato de BatchSendResponse"""
+        resultados = self.enfileirar(clientes)
+        erros_preparo = sum(1 for r in resultados if r['status'] == 'erro')
+        ignorados = sum(1 for r in resultados if r['status'] == 'ignorado')
+
+        envio = {'detalhes': [], 'enviados': 0, 'erros': 0, 'adiados': 0}
+        if self.request.enviar_agora:
+            envio = OutboxSender(self.db, self.digisac).processar_lote(self.lote_id)
+        resultados.extend(envio['detalhes'])
+
+        return {
+            'lote_id': self.lote_id,
+            'total_clientes': len(resultados) + envio['adiados'],
+            'enviados': envio['enviados'],
+            'erros': envio['erros'] + erros_preparo,
+            'ignorados': ignorados,
+            'adiados': envio['adiados'],
+            'detalhes': resultados
+        }
+
+    def enfileirar(self, clientes: Iterable[Cliente]) -> List[Dict[str, Any]]:
+        """
+        Grava os destinatários como 'pendente'. Retorna os resultados que já são
+        finais nesta fase: ignorados, erros de renderização e, quando o envio
+        não é imediato, os agendados.
+        """
+        resultados: List[Dict[str, Any]] = []
+
+        for bloco in self._blocos(clientes):
+            bloqueados = self._bloqueados_por_frequencia(bloco)
+            sem_contato = self._sem_contato_digisac(bloco)
+            linhas = []
+            previas = {}
+            for cliente in bloco:
+                if cliente.id in bloqueados:
+                    resultados.append(self._ignorado(cliente))
+                    continue
+                if cliente.id in sem_contato:
+                    logger.warning(f"❌ {cliente.nome}: contato não encontrado no Digisac")
+                    resultados.append(self._resultado(cliente, "erro", erro="Contato não encontrado no Digisac"))
+                    continue
+                try:
+                    mensagem, variaveis, fonte = self._mensagem(cliente)
+                except Exception as e:
+                    logger.error(f"❌ Erro ao processar {cliente.nome}: {e}")
+                    resultados.append(self._resultado(cliente, "erro", erro=str(e)))
+                    continue
+
+                linhas.append((
+                    cliente.id, self.request.tipo, self._template_label(fonte),
+                    mensagem, self.versao_id if variaveis is not None else None,
+                    variaveis, self.lote_id
+                ))
+                previas[cliente.id] = (cliente, mensagem, fonte)
+
+            inseridos = self.db.inserir_pendentes(linhas)
+
+            if not self.request.enviar_agora:
+                # Apenas agendar: as linhas ficam pendentes até a retomada do lote
+                for cliente_id in inseridos:
+                    cliente, mensagem, fonte = previas[cliente_id]
+                    resultados.append(self._resultado(cliente, "agendado", mensagem, fonte))
+
+        return resultados
+
+    @staticmethod
+    def _blocos(clientes: Iterable[Cliente]) -> Iterator[List[Cliente]]:
+        iterador = iter(clientes)
+        while True:
+            bloco = list(islice(iterador, CLIENTES_POR_BLOCO))
+            if not bloco:
+                return
+            yield bloco
+
+    def _bloqueados_por_frequencia(self, bloco: List[Cliente]) -> Set[int]:
+        """Clientes do bloco que já atingiram o limite de frequência (uma consulta)"""
+        if FREQ_CAP_MAX_ENVIOS <= 0 or self.request.ignorar_limite_frequencia:
+            return set()
+
+        # Escopo 'template' só se aplica a envios por template; os demais limitam por tipo
+        if FREQ_CAP_ESCOPO == 'template' and self.request.template_name:
+            filtro = {'template_usado': self.request.template_name}
+        else:
+            filtro = {'tipo': self.request.tipo}
+
+        return self.db.clientes_no_limite_frequencia(
+            [cliente.id for cliente in bloco],
+            janela_horas=FREQ_CAP_JANELA_HORAS,
+            max_envios=FREQ_CAP_MAX_ENVIOS,
+            ignorar_lote=self.lote_id,
+            **filtro
+        )
+
+    def _sem_contato_digisac(self, bloco: List[Cliente]) -> Set[int]:
+        """
+        Clientes do bloco cujo contato não existe no Digisac (validar_contatos).
+        Um prefetch por bloco, servido pelo cache de contatos; contatos cuja
+        consulta falhou não bloqueiam o envio.
+        """
+        if not self.request.validar_contatos:
+            return set()
+
+        contatos = self.digisac.prefetch_contatos(cliente.digisac_contact_id for cliente in bloco)
+        return {
+            cliente.id for cliente in bloco
+            if not cliente.digisac_contact_id
+            or contatos.get(str(cliente.digisac_contact_id), True) is None
+        }
+
+    def _template_label(self, fonte: str) -> str:
+        """Define template_usado baseado na fonte da mensagem"""
+        if self.request.template_name:
+            return self.request.template_name
+        if fonte == "customizada":
+            return "Customizada"
+        return "Padrão"
+
+    @staticmethod
+    def _ignorado(cliente: Cliente) -> Dict[str, Any]:
+        logger.info(f"⏭️ {cliente.nome}: limite de frequência atingido")
+        return EnvioLoteService._resultado(
+            cliente, "ignorado",
+            erro=f"Limite de frequência: {FREQ_CAP_MAX_ENVIOS} envio(s) a cada {FREQ_CAP_JANELA_HORAS}h"
+        )
+
+    @staticmethod
+    def _resultado(cliente: Cliente, status: str, mensagem: Optional[str] = None,
+                   fonte: Optional[str] = None, erro: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "cliente_id": cliente.id,
+            "cliente_nome": cliente.nome,
+            "status": status,
+            "mensagem": mensagem[:100] + "..." if mensagem and len(mensagem) > 100 else mensagem,
+            "fonte_mensagem": fonte,
+            "erro": erro
+        }
+
+    def _mensagem(self, cliente: Cliente):
+        """Retorna (mensagem, variaveis_referenciadas, fonte)"""
+        request = self.request
+
+        # 1. Prioridade: mensagem customizada
+        if cliente.id in self.customizadas:
+            mensagem, variaveis, fonte = self.customizadas[cliente.id], None, "customizada"
+
+        # 2. Template ou 3. mensagem padrão
+        elif self.texto_base is not None:
+            context = {'nome': cliente.nome, **self.variaveis_extras}
+            mensagem, variaveis = self.template_manager.engine.render_text(self.texto_base, context)
+            fonte = f"template:{request.template_name}" if request.template_name else "padrao"
+
+        elif request.template_name:
+            raise ValueError(f"Template '{request.template_name}' não encontrado")
+
+        else:
+            raise ValueError("Nenhuma mensagem fornecida")
+
+        if not mensagem:
+            raise ValueError("Mensagem vazia após renderização")
+
+        return mensagem, variaveis, fonte
@@ -0,0 +1,171 @@
+import csv
+import io
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from core.database import SQL_JOIN_VERSAO, SQL_MENSAGEM_ENVIO
+from core.serializacao import dumps
+
+# Linhas acumuladas antes de entregar um bloco ao cliente HTTP / arquivo
+LINHAS_POR_BLOCO = 1000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+COLUNAS_HISTORICO = [
+    'id', 'cliente_id', 'cliente_nome', 'cliente_telefone', 'tipo', 'template_usado',
+    'mensagem', 'status', 'data_envio', 'tentativas', 'erro_detalhe',
+    'digisac_message_id', 'status_entrega', 'status_entrega_em'
+]
+
+COLUNAS_CLIENTES = [
+    'id', 'nome', 'digisac_contact_id', 'telefone', 'email', 'status', 'created_at', 'updated_at'
+]
+
+
+class Exportador:
+    """Exportação em streaming de histórico de envios e clientes"""
+
+    def __init__(self, db, fetch_size: int = None):
+        self.db = db
+        self.fetch_size = fetch_size
+
+    # ========== CONSULTAS ==========
+
+    def linhas_historico(self, inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                         status: Optional[str] = None, tipo: Optional[str] = None) -> Iterator[tuple]:
+        query = f'''
+            SELECT he.id, he.cliente_id, c.nome, c.telefone, he.tipo, he.template_usado,
+                   {SQL_MENSAGEM_ENVIO}, he.status, he.data_envio, he.tentativas, he.erro_detalhe,
+                   he.digisac_message_id, he.status_entrega, he.status_entrega_em
+            FROM historico_envios he
+            JOIN clientes c ON c.id = he.cliente_id
+            {SQL_JOIN_VERSAO}
+            WHERE 1=1
+        '''
+        params: List[Any] = []
+
+        if inicio:
+            query += " AND he.data_envio >= %s"
+            params.append(inicio)
+        if fim:
+            query += " AND he.data_envio < %s"
+            params.append(fim)
+        if status:
+            query += " AND he.status = %s"
+            params.append(status)
+        if tipo:
+            query += " AND he.tipo = %s"
+            params.append(tipo)
+
+        query += " ORDER BY he.data_envio, he.id"
+        return self.db.stream_query(query, params, fetch_size=self.fetch_size, somente_leitura=True)
+
+    def linhas_clientes(self, status: Optional[str] = None) -> Iterator[tuple]:
+        query = f"SELECT {', '.join(COLUNAS_CLIENTES)} FROM clientes"
+        params: List[Any] = []
+
+        if status:
+            query += " WHERE status = %s"
+            params.append(status)
+
+        query += " ORDER BY id"
+        return self.db.stream_query(query, params, fetch_size=self.fetch_size, somente_leitura=True)
+
+    # ========== FORMATOS ==========
+
+    @staticmethod
+    def para_csv(colunas: Sequence[str], linhas: Iterator[tuple]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(colunas)
+
+        for i, linha in enumerate(linhas, 1):
+            writer.writerow(
+                v.isoformat() if isinstance(v, datetime) else v for v in linha
+            )
+            if i % LINHAS_POR_BLOCO == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def para_ndjson(colunas: Sequence[str], linhas: Iterator[tuple]) -> Iterator[bytes]:
+        bloco: List[bytes] = []
+        for linha in linhas:
+            bloco.append(dumps(dict(zip(colunas, linha))))
+            if len(bloco) >= LINHAS_POR_BLOCO:
+                yield b'\n'.join(bloco) + b'\n'
+                bloco = []
+        if bloco:
+            yield b'\n'.join(bloco) + b'\n'
+
+    def gerar(self, recurso: str, formato: str, **filtros) -> Iterator[bytes]:
+        colunas, linhas = self._fonte(recurso, **filtros)
+        if formato == 'csv':
+            return self.para_csv(colunas, linhas)
+        if formato == 'ndjson':
+            return self.para_ndjson(colunas, linhas)
+        raise ValueError(f"Formato não suportado: {formato}")
+
+    def parquet(self, recurso: str, caminho: str, **filtros) -> int:
+        """Grava arquivo Parquet em lotes de fetch_size (requer pyarrow)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportação Parquet requer pyarrow (pip install pyarrow)")
+
+        colunas, linhas = self._fonte(recurso, **filtros)
+        tamanho_lote = self.fetch_size or LINHAS_POR_BLOCO * 5
+        writer = None
+        total = 0
+
+        try:
+            lote: List[tuple] = []
+            for linha in linhas:
+                lote.append(linha)
+                if len(lote) >= tamanho_lote:
+                    writer = self._escrever_lote_parquet(pa, pq, writer, caminho, colunas, lote)
+                    total += len(lote)
+                    lote = []
+            if lote or writer is None:
+                writer = self._escrever_lote_parquet(pa, pq, writer, caminho, colunas, lote)
+                total += len(lote)
+        finally:
+            if writer:
+                writer.close()
+
+        return total
+
+    @staticmethod
+    def _escrever_lote_parquet(pa, pq, writer, caminho, colunas, lote):
+        tipos = {
+            'id': pa.int64(), 'cliente_id': pa.int64(), 'tentativas': pa.int32(),
+            'data_envio': pa.timestamp('us'), 'status_entrega_em': pa.timestamp('us'),
+            'created_at': pa.timestamp('us'), 'updated_at': pa.timestamp('us')
+        }
+        schema = pa.schema([(coluna, tipos.get(coluna, pa.string())) for coluna in colunas])
+        tabela = pa.Table.from_pydict({
+            coluna: [linha[i] for linha in lote] for i, coluna in enumerate(colunas)
+        }, schema=schema)
+        if writer is None:
+            writer = pq.ParquetWriter(caminho, schema)
+        writer.write_table(tabela)
+        return writer
+
+    def _fonte(self, recurso: str, **filtros) -> Tuple[List[str], Iterator[tuple]]:
+        if recurso == 'historico':
+            return COLUNAS_HISTORICO, self.linhas_historico(**filtros)
+        if recurso == 'clientes':
+            return COLUNAS_CLIENTES, self.linhas_clientes(**filtros)
+        raise ValueError(f"Recurso não suportado: {recurso}")
+
+
+def nome_arquivo(recurso: str, formato: str) -> str:
+    return f"{recurso}_{datetime.now():%Y%m%d_%H%M%S}.{formato}"
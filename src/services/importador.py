@@ -0,0 +1,267 @@
+"""
+Importação em massa de clientes a partir de CSV
+
+O arquivo vai direto para uma tabela temporária via COPY (lido em blocos,
+memória constante), a validação e a normalização acontecem em SQL e os
+clientes válidos entram com um único INSERT ... ON CONFLICT. As linhas
+rejeitadas voltam em um relatório com o número da linha e o motivo.
+
+Colunas reconhecidas (ordem livre, separador ',' ou ';'):
+    nome, digisac_contact_id (ou contact_id), telefone, email,
+    status (ativo, inativo, suspenso) ou ativo (s/n), tags (separadas por '|')
+
+Sem digisac_contact_id, a linha atualiza o cliente com o mesmo telefone
+(E.164); cliente novo exige o digisac_contact_id. Campos vazios preservam
+o valor atual do cliente.
+"""
+
+import csv
+import logging
+import time
+from typing import IO, Any, Dict, List, Optional
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_CONHECIDAS = ['nome', 'digisac_contact_id', 'telefone', 'email', 'status', 'ativo', 'tags']
+APELIDOS = {'contact_id': 'digisac_contact_id'}
+
+# Linhas com erro devolvidas na resposta (o total vem sempre em 'erros')
+MAX_ERROS_RELATORIO = 1000
+
+SQL_VALIDAR = '''
+    CREATE TEMP TABLE importacao_validada ON COMMIT DROP AS
+    WITH normalizada AS (
+        SELECT
+            linha,
+            NULLIF(btrim(nome), '') AS nome,
+            NULLIF(btrim(digisac_contact_id), '') AS digisac_contact_id,
+            NULLIF(btrim(telefone), '') AS telefone,
+            NULLIF(lower(btrim(email)), '') AS email,
+            COALESCE(
+                NULLIF(lower(btrim(status)), ''),
+                CASE
+                    WHEN NULLIF(btrim(ativo), '') IS NULL THEN NULL
+                    WHEN lower(btrim(ativo)) IN ('s', 'sim', 'true', '1', 'ativo') THEN 'ativo'
+                    ELSE 'inativo'
+                END
+            ) AS status,
+            CASE WHEN NULLIF(btrim(tags), '') IS NOT NULL THEN
+                ARRAY(SELECT DISTINCT btrim(t) FROM unnest(string_to_array(tags, '|')) t WHERE btrim(t) <> '')
+            END AS tags
+        FROM importacao_clientes
+    )
+    SELECT
+        n.linha,
+        COALESCE(n.nome, c.nome) AS nome,
+        r.digisac_contact_id,
+        COALESCE(n.telefone, c.telefone) AS telefone,
+        COALESCE(n.email, c.email) AS email,
+        COALESCE(n.status, c.status, 'ativo') AS status,
+        COALESCE(n.tags, c.tags, '{}') AS tags,
+        CASE
+            WHEN r.ambiguo THEN 'telefone corresponde a mais de um cliente; informe digisac_contact_id'
+            WHEN r.digisac_contact_id IS NULL THEN 'digisac_contact_id obrigatório para cliente novo'
+            WHEN COALESCE(n.nome, c.nome) IS NULL THEN 'nome obrigatório'
+            WHEN n.telefone IS NOT NULL AND normalizar_telefone(n.telefone) IS NULL THEN 'telefone inválido'
+            WHEN n.email IS NOT NULL AND n.email !~ '^[^@[:space:]]+@[^@[:space:]]+\\.[^@[:space:]]+$'
+                THEN 'email inválido'
+            WHEN n.status IS NOT NULL AND n.status NOT IN ('ativo', 'inativo', 'suspenso')
+                THEN 'status inválido (ativo, inativo ou suspenso)'
+            WHEN %(telefone_unico)s AND EXISTS (
+                SELECT 1 FROM clientes o
+                WHERE o.telefone_e164 = normalizar_telefone(n.telefone)
+                  AND o.digisac_contact_id <> r.digisac_contact_id
+            ) THEN 'telefone já cadastrado em outro cliente'
+        END AS erro
+    FROM normalizada n
+    -- Sem contact id: resolve pelo telefone (índice em telefone_e164)
+    CROSS JOIN LATERAL (
+        SELECT
+            COALESCE(n.digisac_contact_id, MIN(t.digisac_contact_id)) AS digisac_contact_id,
+            n.digisac_contact_id IS NULL AND COUNT(t.id) > 1 AS ambiguo
+        FROM clientes t
+        WHERE n.digisac_contact_id IS NULL
+          AND t.telefone_e164 = normalizar_telefone(n.telefone)
+    ) r
+    LEFT JOIN clientes c ON c.digisac_contact_id = r.digisac_contact_id
+'''
+
+# O mesmo cliente repetido no arquivo: vale a última linha (ON CONFLICT não
+# atualiza a mesma linha duas vezes no mesmo comando)
+SQL_REPETIDOS = '''
+    UPDATE importacao_validada v
+    SET erro = 'cliente repetido no arquivo (vale a linha ' || (d.ultima + 1) || ')'
+    FROM (
+        SELECT linha, MAX(linha) OVER (PARTITION BY digisac_contact_id) AS ultima
+        FROM importacao_validada
+        WHERE erro IS NULL
+    ) d
+    WHERE v.linha = d.linha AND d.linha <> d.ultima
+'''
+
+SQL_TELEFONES_REPETIDOS = '''
+    UPDATE importacao_validada v
+    SET erro = 'telefone repetido no arquivo (vale a linha ' || (d.ultima + 1) || ')'
+    FROM (
+        SELECT linha, MAX(linha) OVER (PARTITION BY normalizar_telefone(telefone)) AS ultima
+        FROM importacao_validada
+        WHERE erro IS NULL AND normalizar_telefone(telefone) IS NOT NULL
+    ) d
+    WHERE v.linha = d.linha AND d.linha <> d.ultima
+'''
+
+# Linhas idênticas ao cadastro atual não são regravadas (reimportar o mesmo
+# arquivo não gera escrita nem tuplas mortas)
+SQL_UPSERT = '''
+    WITH gravados AS (
+        INSERT INTO clientes (nome, digisac_contact_id, telefone, email, status, tags)
+        SELECT nome, digisac_contact_id, telefone, email, status, tags
+        FROM importacao_validada
+        WHERE erro IS NULL
+        ORDER BY linha
+        ON CONFLICT (digisac_contact_id) DO UPDATE SET
+            nome = EXCLUDED.nome,
+            telefone = EXCLUDED.telefone,
+            email = EXCLUDED.email,
+            status = EXCLUDED.status,
+            tags = EXCLUDED.tags,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE (clientes.nome, clientes.telefone, clientes.email, clientes.status, clientes.tags)
+              IS DISTINCT FROM (EXCLUDED.nome, EXCLUDED.telefone, EXCLUDED.email, EXCLUDED.status, EXCLUDED.tags)
+        RETURNING (xmax = 0) AS inserido
+    )
+    SELECT COUNT(*) FILTER (WHERE inserido), COUNT(*) FILTER (WHERE NOT inserido)
+    FROM gravados
+'''
+
+# Número da linha no arquivo: o cabeçalho é a linha 1
+SQL_RELATORIO = '''
+    SELECT v.linha + 1, i.digisac_contact_id, i.nome, i.telefone, v.erro
+    FROM importacao_validada v
+    JOIN importacao_clientes i USING (linha)
+    WHERE v.erro IS NOT NULL
+    ORDER BY v.linha
+'''
+
+COLUNAS_RELATORIO = ['linha', 'digisac_contact_id', 'nome', 'telefone', 'erro']
+
+
+class ImportacaoInvalidaError(ValueError):
+    """Arquivo ilegível (cabeçalho, codificação ou CSV malformado)"""
+
+
+class ImportadorClientes:
+    """Importa clientes de CSV via COPY + validação em SQL + upsert único"""
+
+    def __init__(self, db, max_erros_relatorio: int = MAX_ERROS_RELATORIO):
+        self.db = db
+        self.max_erros_relatorio = max_erros_relatorio
+
+    @staticmethod
+    def _ler_cabecalho(arquivo: IO[bytes]) -> tuple:
+        """Lê a primeira linha e devolve (colunas da staging na ordem do arquivo, separador, ignoradas)"""
+        primeira = arquivo.readline()
+        if not primeira.strip():
+            raise ImportacaoInvalidaError("Arquivo vazio ou sem cabeçalho")
+        try:
+            cabecalho = primeira.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportacaoInvalidaError("O arquivo deve estar em UTF-8")
+
+        separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+        nomes = next(csv.reader([cabecalho], delimiter=separador))
+
+        colunas, ignoradas, vistas = [], [], set()
+        for i, nome in enumerate(nomes):
+            coluna = nome.strip().lower()
+            coluna = APELIDOS.get(coluna, coluna)
+            if coluna in COLUNAS_CONHECIDAS and coluna not in vistas:
+                colunas.append(coluna)
+                vistas.add(coluna)
+            else:
+                colunas.append(f'ignorada_{i}')
+                ignoradas.append(nome.strip())
+
+        if not vistas & {'digisac_contact_id', 'telefone'}:
+            raise ImportacaoInvalidaError("O cabeçalho precisa de digisac_contact_id ou telefone")
+        return colunas, separador, ignoradas
+
+    def importar(self, arquivo: IO[bytes], aplicar: bool = True,
+                 relatorio_saida: Optional[IO[str]] = None) -> Dict[str, Any]:
+        """
+        Importa o CSV (arquivo binário, posicionado no início).
+
+        aplicar=False só valida: nada é gravado. relatorio_saida recebe o
+        relatório completo de erros em CSV (a resposta traz só os primeiros).
+        """
+        inicio = time.monotonic()
+        colunas, separador, ignoradas = self._ler_cabecalho(arquivo)
+        colunas_staging = COLUNAS_CONHECIDAS + [c for c in colunas if c.startswith('ignorada_')]
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Staging sem WAL, descartada no COMMIT; a identidade numera as linhas na ordem do COPY
+            cursor.execute(f'''
+                CREATE TEMP TABLE importacao_clientes (
+                    linha BIGINT GENERATED ALWAYS AS IDENTITY,
+                    {', '.join(f'{c} TEXT' for c in colunas_staging)}
+                ) ON COMMIT DROP
+            ''')
+            try:
+                cursor.copy_expert(
+                    f"COPY importacao_clientes ({', '.join(colunas)}) FROM STDIN "
+                    f"WITH (FORMAT csv, DELIMITER '{separador}', ENCODING 'UTF8')",
+                    arquivo
+                )
+            except psycopg2.DataError as e:
+                # Linha com colunas a mais/menos, aspas abertas, bytes inválidos
+                raise ImportacaoInvalidaError(f"CSV inválido: {str(e).strip()}")
+
+            cursor.execute('SELECT COUNT(*) FROM importacao_clientes')
+            linhas = cursor.fetchone()[0]
+
+            cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx_clientes_telefone_e164_unico')
+            ''')
+            telefone_unico = cursor.fetchone()[0]
+
+            cursor.execute(SQL_VALIDAR, {'telefone_unico': telefone_unico})
+            cursor.execute(SQL_REPETIDOS)
+            if telefone_unico:
+                cursor.execute(SQL_TELEFONES_REPETIDOS)
+
+            cursor.execute('SELECT COUNT(*) FROM importacao_validada WHERE erro IS NOT NULL')
+            erros = cursor.fetchone()[0]
+
+            cursor.execute(SQL_RELATORIO + ' LIMIT %s', (self.max_erros_relatorio,))
+            relatorio: List[Dict[str, Any]] = [dict(zip(COLUNAS_RELATORIO, row)) for row in cursor.fetchall()]
+
+            if relatorio_saida is not None and erros:
+                cursor.copy_expert(f"COPY ({SQL_RELATORIO}) TO STDOUT WITH (FORMAT csv, HEADER)", relatorio_saida)
+
+            inseridos = atualizados = 0
+            if aplicar:
+                cursor.execute(SQL_UPSERT)
+                inseridos, atualizados = cursor.fetchone()
+            else:
+                conn.rollback()
+
+        resultado = {
+            'linhas': linhas,
+            'inseridos': inseridos,
+            'atualizados': atualizados,
+            'inalterados': linhas - erros - inseridos - atualizados if aplicar else 0,
+            'erros': erros,
+            'aplicado': aplicar,
+            'colunas_ignoradas': ignoradas,
+            'relatorio': relatorio,
+            'duracao_ms': round((time.monotonic() - inicio) * 1000)
+        }
+        logger.info(
+            f"Importação de clientes: {linhas} linhas, {inseridos} inseridos, "
+            f"{atualizados} atualizados, {erros} com erro ({resultado['duracao_ms']} ms)"
+        )
+        return resultado
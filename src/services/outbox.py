@@ -0,0 +1,88 @@
+import logging
+import uuid
+from typing import Any, Dict, List
+
+from core.config import OUTBOX_REIVINDICACAO, OUTBOX_EXPIRACAO_S
+from .digisac_service import DigisacAPI
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxSender:
+    """
+    Drena as linhas 'pendente' de um lote do historico_envios.
+
+    Reivindica blocos com FOR UPDATE SKIP LOCKED e conclui cada linha logo
+    após o envio, de modo que uma queda do processo deixa no máximo uma
+    mensagem em dúvida por reivindicação (ver recuperar_reivindicacoes).
+    """
+
+    def __init__(self, db, digisac: DigisacAPI = None, tamanho_bloco: int = OUTBOX_REIVINDICACAO):
+        self.db = db
+        self.digisac = digisac or DigisacAPI()
+        self.tamanho_bloco = tamanho_bloco
+
+    def processar_lote(self, lote_id: str) -> Dict[str, Any]:
+        """Envia todas as linhas pendentes do lote; retorna detalhes e contadores"""
+        detalhes: List[Dict[str, Any]] = []
+        contagem = {'enviados': 0, 'erros': 0, 'adiados': 0}
+
+        while True:
+            reivindicacao = uuid.uuid4().hex
+            linhas = self.db.reivindicar_pendentes(lote_id, self.tamanho_bloco, reivindicacao)
+            if not linhas:
+                break
+
+            for i, (historico_id, cliente_id, nome, contact_id, mensagem, template_usado, tentativas) in enumerate(linhas):
+                envio = self.digisac.enviar(contact_id, mensagem)
+
+                if envio.circuito_aberto:
+                    # Digisac fora do ar: devolve o restante do bloco e para; o lote fica retomável
+                    restantes = [linha[0] for linha in linhas[i:]]
+                    self.db.devolver_pendentes(
+                        restantes, erro_classe='circuito_aberto',
+                        erro_detalhe="Digisac indisponível (circuito aberto); envio adiado"
+                    )
+                    contagem['adiados'] = self.db.resumo_lote(lote_id).get('pendente', 0)
+                    logger.warning(f"Lote {lote_id}: circuito aberto, {contagem['adiados']} envios adiados")
+                    return {'detalhes': detalhes, **contagem}
+
+                if envio.sucesso:
+                    status, erro_msg = 'enviado', None
+                else:
+                    status, erro_msg = 'erro', "Falha no envio via API Digisac"
+
+                self.db.concluir_envios([(historico_id, status, erro_msg, envio.erro_classe, envio.message_id,
+                                          envio.latencia_ms, envio.http_status)])
+                contagem['enviados' if envio.sucesso else 'erros'] += 1
+
+                logger.info(f"{'✅' if envio.sucesso else '❌'} {nome}: {status}")
+                detalhes.append({
+                    "cliente_id": cliente_id,
+                    "cliente_nome": nome,
+                    "status": status,
+                    "mensagem": mensagem[:100] + "..." if len(mensagem) > 100 else mensagem,
+                    "fonte_mensagem": template_usado,
+                    "erro": erro_msg
+                })
+
+        return {'detalhes': detalhes, **contagem}
+
+    def retomar(self, lote_id: str, forcar: bool = False) -> Dict[str, Any]:
+        """
+        Retoma um lote interrompido: recupera reivindicações abandonadas e
+        envia o que ainda está pendente, sem recalcular a audiência.
+
+        forcar=True considera abandonadas todas as reivindicações em aberto
+        (use apenas quando nenhum outro processo estiver enviando o lote).
+        """
+        recuperadas = self.db.recuperar_reivindicacoes(lote_id, 0 if forcar else OUTBOX_EXPIRACAO_S)
+        if recuperadas['interrompidos'] or recuperadas['devolvidos']:
+            logger.warning(
+                f"Lote {lote_id}: {recuperadas['devolvidos']} envios devolvidos à fila, "
+                f"{recuperadas['interrompidos']} interrompidos durante o envio"
+            )
+
+        resultado = self.processar_lote(lote_id)
+        resultado['interrompidos'] = recuperadas['interrompidos']
+        return resultado
@@ -0,0 +1,187 @@
+"""
+Painel ao vivo: deltas das estatísticas e novas atividades via Server-Sent Events
+
+Triggers por comando em historico_envios e clientes publicam um NOTIFY no
+canal 'painel' a cada escrita confirmada. Cada worker mantém uma única
+conexão LISTEN, agrupa as notificações de uma janela curta, busca as
+atividades alteradas com uma consulta e distribui o evento para todos os
+painéis conectados. N painéis abertos custam um feed, não N polling.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+
+from core.config import PAINEL_LISTEN_DSN, PAINEL_AGRUPAR_MS, PAINEL_FILA_MAX
+from core.database import CANAL_PAINEL
+from core.serializacao import dumps
+
+logger = logging.getLogger(__name__)
+
+# Enviado quando eventos podem ter sido perdidos (reconexão do LISTEN, fila cheia):
+# o painel recarrega as estatísticas completas
+EVENTO_RECARREGAR = dumps({'tipo': 'recarregar'})
+
+MAX_ATIVIDADES_EVENTO = 50
+
+
+class PainelAoVivo:
+    """Uma conexão LISTEN por processo, distribuída para filas asyncio (uma por painel)"""
+
+    def __init__(self, dsn: str = PAINEL_LISTEN_DSN, agrupar_ms: int = PAINEL_AGRUPAR_MS,
+                 fila_max: int = PAINEL_FILA_MAX):
+        self.dsn = dsn
+        self.agrupar_s = agrupar_ms / 1000
+        self.fila_max = fila_max
+        self._assinantes: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._db = None
+        self.metricas = {'notificacoes': 0, 'eventos': 0, 'descartados': 0, 'reconexoes': 0}
+
+    def assinar(self) -> asyncio.Queue:
+        """Registra um painel (chamar no event loop); inicia o LISTEN no primeiro"""
+        fila: asyncio.Queue = asyncio.Queue(maxsize=self.fila_max)
+        with self._lock:
+            self._assinantes[fila] = asyncio.get_running_loop()
+            self._iniciar()
+        return fila
+
+    def cancelar(self, fila: asyncio.Queue):
+        with self._lock:
+            self._assinantes.pop(fila, None)
+
+    def parar(self, timeout: float = 5):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.metricas,
+            'assinantes': len(self._assinantes),
+            'ativo': bool(self._thread and self._thread.is_alive())
+        }
+
+    def _iniciar(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._escutar, name='painel-listen', daemon=True)
+        self._thread.start()
+        logger.info("Painel ao vivo: LISTEN iniciado")
+
+    def _get_db(self):
+        if self._db is None:
+            from core.database import get_database
+            self._db = get_database()
+        return self._db
+
+    # ---------- distribuição ----------
+
+    def _publicar(self, dados: bytes):
+        with self._lock:
+            assinantes = list(self._assinantes.items())
+        for fila, loop in assinantes:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, dados)
+            except RuntimeError:
+                # Loop encerrado sem cancelar a assinatura
+                self.cancelar(fila)
+
+    def _entregar(self, fila: asyncio.Queue, dados: bytes):
+        try:
+            fila.put_nowait(dados)
+        except asyncio.QueueFull:
+            # Painel lento: descarta o acumulado e pede recarga completa
+            self.metricas['descartados'] += fila.qsize()
+            while not fila.empty():
+                fila.get_nowait()
+            fila.put_nowait(EVENTO_RECARREGAR)
+
+    # ---------- LISTEN ----------
+
+    def _escutar(self):
+        espera = 1
+        primeira = True
+        while not self._parar.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn, connect_timeout=10)
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN {CANAL_PAINEL}')
+                if not primeira:
+                    # Notificações durante a queda se perderam
+                    self._publicar(EVENTO_RECARREGAR)
+                primeira = False
+                espera = 1
+
+                while not self._parar.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    # Agrupa a rajada (ex.: envio em lote) em um único evento
+                    time.sleep(self.agrupar_s)
+                    conn.poll()
+                    notificacoes = [n.payload for n in conn.notifies]
+                    conn.notifies.clear()
+                    self._processar(notificacoes)
+            except Exception as e:
+                if self._parar.is_set():
+                    break
+                self.metricas['reconexoes'] += 1
+                logger.warning(f"Painel ao vivo: LISTEN interrompido ({e}); nova tentativa em {espera}s")
+                self._parar.wait(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _processar(self, payloads: List[str]):
+        self.metricas['notificacoes'] += len(payloads)
+        delta: Dict[str, int] = {}
+        ids = set()
+        for payload in payloads:
+            try:
+                notificacao = json.loads(payload)
+            except ValueError:
+                continue
+            for campo, valor in (notificacao.get('delta') or {}).items():
+                delta[campo] = delta.get(campo, 0) + int(valor)
+            ids.update(notificacao.get('ids') or ())
+
+        delta = {campo: valor for campo, valor in delta.items() if valor}
+        if delta:
+            self._publicar(dumps({'tipo': 'stats', 'delta': delta}))
+            self.metricas['eventos'] += 1
+
+        if ids:
+            # Sem assinantes, nenhuma consulta
+            if not self._assinantes:
+                return
+            try:
+                atividades = self._get_db().get_atividades_por_ids(
+                    sorted(ids, reverse=True)[:MAX_ATIVIDADES_EVENTO]
+                )
+            except Exception as e:
+                logger.warning(f"Painel ao vivo: erro ao buscar atividades: {e}")
+                self._publicar(EVENTO_RECARREGAR)
+                return
+            if atividades:
+                self._publicar(dumps({'tipo': 'atividades', 'itens': atividades}))
+                self.metricas['eventos'] += 1
+
+
+painel_ao_vivo = PainelAoVivo()
@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from core.config import RATE_LIMIT_PER_MINUTE
+from core.redis_client import get_redis, descartar_redis
+
+logger = logging.getLogger(__name__)
+
+# Reserva o próximo horário livre e devolve o horário reservado (atômico no Redis)
+_RESERVAR_LUA = """
+local agora = tonumber(ARGV[1])
+local intervalo = tonumber(ARGV[2])
+local proximo = tonumber(redis.call('GET', KEYS[1]) or '0')
+local inicio = math.max(agora, proximo)
+redis.call('SET', KEYS[1], tostring(inicio + intervalo), 'PX', math.ceil(intervalo * 1000) + 60000)
+return tostring(inicio)
+"""
+
+
+class LimitadorTaxa:
+    """
+    Espaça as chamadas para no máximo por_minuto, somando todos os workers.
+
+    Cada chamada reserva o próximo horário livre (agora ou o fim da última
+    reserva) e dorme até ele. O horário fica no Redis quando disponível;
+    sem Redis, o limite vale por processo.
+    """
+
+    def __init__(self, nome: str, por_minuto: int = RATE_LIMIT_PER_MINUTE):
+        self.chave = f"taxa:{nome}"
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self._lock = threading.Lock()
+        self._proximo = 0.0
+        self._script = None
+
+    def aguardar(self):
+        """Bloqueia até o horário reservado para esta chamada"""
+        if not self.intervalo:
+            return
+        espera = self._reservar(time.time()) - time.time()
+        if espera > 0:
+            time.sleep(espera)
+
+    def _reservar(self, agora: float) -> float:
+        cliente = get_redis()
+        if cliente is not None:
+            try:
+                if self._script is None:
+                    self._script = cliente.register_script(_RESERVAR_LUA)
+                return float(self._script(keys=[self.chave], args=[agora, self.intervalo], client=cliente))
+            except Exception as e:
+                logger.warning(f"Limitador {self.chave}: Redis falhou ({e}), usando limite local")
+                self._script = None
+                descartar_redis()
+
+        with self._lock:
+            inicio = max(agora, self._proximo)
+            self._proximo = inicio + self.intervalo
+            return inicio
+
+
+_limitador_digisac: Optional[LimitadorTaxa] = None
+
+
+def get_limitador_digisac() -> LimitadorTaxa:
+    global _limitador_digisac
+    if _limitador_digisac is None:
+        _limitador_digisac = LimitadorTaxa('digisac')
+    return _limitador_digisac
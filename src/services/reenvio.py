@@ -0,0 +1,86 @@
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import REENVIO_MAX_TENTATIVAS, OUTBOX_REIVINDICACAO, OUTBOX_EXPIRACAO_S
+from core.database import PREFIXO_REIVINDICACAO_REENVIO
+from .digisac_service import DigisacAPI
+
+logger = logging.getLogger(__name__)
+
+
+class ReenvioService:
+    """
+    Reenvio em massa de envios com falha do historico_envios.
+
+    Reivindica blocos de falhas ('processando', FOR UPDATE SKIP LOCKED) antes de
+    enviar, de modo que reenvios simultâneos não repetem mensagens. Reaproveita
+    a mensagem gravada (inclusive a reconstruída do histórico compacto), envia
+    pelo mesmo DigisacAPI com limite de taxa e circuit breaker, e grava o
+    resultado de cada bloco em um UPDATE — também quando o bloco é interrompido
+    por exceção.
+    """
+
+    def __init__(self, db, digisac: DigisacAPI = None, tamanho_bloco: int = OUTBOX_REIVINDICACAO):
+        self.db = db
+        self.digisac = digisac or DigisacAPI()
+        self.tamanho_bloco = tamanho_bloco
+
+    def reenviar(self, lote_id: Optional[str] = None, inicio: Optional[datetime] = None,
+                 fim: Optional[datetime] = None, erro_classe: Optional[str] = None,
+                 max_tentativas: Optional[int] = None) -> Dict[str, Any]:
+        interrompidos = self.db.recuperar_reenvios(PREFIXO_REIVINDICACAO_REENVIO, OUTBOX_EXPIRACAO_S)
+        if interrompidos:
+            logger.warning(f"Reenvio: {interrompidos} envios de reenvios abandonados marcados como interrompidos")
+
+        filtros = {
+            'lote_id': lote_id, 'inicio': inicio, 'fim': fim, 'erro_classe': erro_classe,
+            'max_tentativas': max_tentativas or REENVIO_MAX_TENTATIVAS
+        }
+        selecionados = enviados = erros = 0
+        interrompido = False
+        # Keyset: uma falha que falha de novo não é reivindicada outra vez na mesma execução
+        ultimo_id = 0
+
+        while not interrompido:
+            reivindicacao = f"{PREFIXO_REIVINDICACAO_REENVIO}{uuid.uuid4().hex}"
+            falhas = self.db.reivindicar_falhas(reivindicacao, self.tamanho_bloco, apos_id=ultimo_id, **filtros)
+            if not falhas:
+                break
+            ultimo_id = falhas[-1][0]
+
+            pendentes: List[Tuple[int, str, Optional[str], Optional[str], Optional[str], Optional[int], Optional[int]]] = []
+            try:
+                for historico_id, cliente_id, cliente_nome, contact_id, mensagem, tentativas in falhas:
+                    envio = self.digisac.enviar(contact_id, mensagem)
+
+                    if envio.circuito_aberto:
+                        # Digisac fora do ar: as linhas restantes voltam a 'erro', sem gastar tentativa
+                        logger.warning(f"Reenvio interrompido: circuito Digisac aberto ({selecionados} processados)")
+                        interrompido = True
+                        break
+
+                    selecionados += 1
+                    if envio.sucesso:
+                        enviados += 1
+                        pendentes.append((historico_id, 'enviado', None, None, envio.message_id,
+                                          envio.latencia_ms, envio.http_status))
+                    else:
+                        erros += 1
+                        pendentes.append((historico_id, 'erro', f"Reenvio falhou (tentativa {tentativas + 1})",
+                                          envio.erro_classe, None, envio.latencia_ms, envio.http_status))
+            finally:
+                # Grava o que já foi enviado mesmo após exceção: sem isso, a próxima
+                # execução reenviaria mensagens já entregues
+                self.db.concluir_envios(pendentes)
+                concluidos = {resultado[0] for resultado in pendentes}
+                self.db.devolver_falhas([linha[0] for linha in falhas if linha[0] not in concluidos])
+
+        logger.info(f"Reenvio: {selecionados} selecionados, {enviados} enviados, {erros} erros")
+        return {
+            'selecionados': selecionados,
+            'enviados': enviados,
+            'erros': erros,
+            'interrompido': interrompido
+        }
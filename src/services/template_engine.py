@@ -31,6 +31,21 @@ class TemplateEngine:
         
         return self._render_text(template_text, full_context)
     
+    def render_text(self, text: str, context: Dict = None) -> Tuple[str, Dict[str, str]]:
+        """
+        Renderiza um texto com as variáveis padrão + contexto.
+        
+        Retorna também apenas as variáveis referenciadas no texto, que é o que
+        o histórico compacto precisa guardar para reconstruir a mensagem.
+        """
+        full_context = {**self.default_variables, **(context or {})}
+        referenciadas = {
+            var: str(full_context[var])
+            for var in set(re.findall(r'\$\{(\w+)\}', text))
+            if var in full_context
+        }
+        return self._render_text(text, referenciadas), referenciadas
+    
     def _render_text(self, text: str, context: Dict) -> str:
         rendered = text
         for key, value in context.items():
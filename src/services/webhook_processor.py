@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from core.config import WEBHOOK_BATCH_SIZE, WEBHOOK_FLUSH_MS, WEBHOOK_QUEUE_MAX
+
+logger = logging.getLogger(__name__)
+
+# Ordem de avanço do status de entrega; 'falhou' sempre prevalece
+ORDEM_STATUS = {'enviado': 1, 'entregue': 2, 'lido': 3, 'falhou': 4}
+
+# ACKs do WhatsApp repassados pelo Digisac
+ACK_STATUS = {-1: 'falhou', 0: 'enviado', 1: 'enviado', 2: 'entregue', 3: 'lido', 4: 'lido'}
+
+STATUS_TEXTO = {
+    'sent': 'enviado', 'delivered': 'entregue', 'read': 'lido', 'played': 'lido',
+    'failed': 'falhou', 'error': 'falhou',
+    'enviado': 'enviado', 'entregue': 'entregue', 'lido': 'lido', 'falhou': 'falhou'
+}
+
+# Eventos que chegam antes do envio ser registrado são tentados de novo por este tempo
+JANELA_REPROCESSAMENTO_S = 60
+
+
+def extrair_evento(payload: Dict[str, Any]) -> Optional[Tuple[str, str, datetime]]:
+    """Converte um evento do webhook em (message_id, status_entrega, ocorrido_em)"""
+    dados = payload.get('data') if isinstance(payload.get('data'), dict) else payload
+    message_id = dados.get('id') or dados.get('messageId')
+    if not message_id:
+        return None
+
+    status = None
+    detalhes = dados.get('data') if isinstance(dados.get('data'), dict) else {}
+    ack = detalhes.get('ack', dados.get('ack'))
+    if ack is not None:
+        try:
+            status = ACK_STATUS.get(int(ack))
+        except (TypeError, ValueError):
+            status = None
+    if status is None:
+        texto = str(dados.get('status') or detalhes.get('status') or '').lower()
+        status = STATUS_TEXTO.get(texto)
+    if status is None:
+        return None
+
+    return str(message_id), status, datetime.now()
+
+
+class ProcessadorStatusEntrega:
+    """
+    Fila de eventos de entrega do webhook Digisac.
+
+    O endpoint apenas enfileira; uma thread consolida os eventos por
+    message_id e aplica em lote no historico_envios.
+    """
+
+    def __init__(self, batch_size: int = WEBHOOK_BATCH_SIZE, flush_ms: int = WEBHOOK_FLUSH_MS,
+                 max_fila: int = WEBHOOK_QUEUE_MAX):
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000
+        self.fila: queue.Queue = queue.Queue(maxsize=max_fila)
+        self._reprocessar: List[Tuple[Tuple[str, str, datetime], float]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._db = None
+        self.metricas = {'recebidos': 0, 'aplicados': 0, 'descartados': 0, 'lotes': 0, 'falhas': 0}
+
+    def iniciar(self, db=None):
+        if self._thread and self._thread.is_alive():
+            return
+        self._db = db
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='webhook-status', daemon=True)
+        self._thread.start()
+        logger.info("Processador de status de entrega iniciado")
+
+    def parar(self, timeout: float = 10):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enfileirar(self, eventos: List[Tuple[str, str, datetime]]) -> bool:
+        """Enfileira sem bloquear; retorna False se a fila estiver cheia"""
+        for evento in eventos:
+            try:
+                self.fila.put_nowait(evento)
+            except queue.Full:
+                self.metricas['descartados'] += 1
+                return False
+            self.metricas['recebidos'] += 1
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.metricas,
+            'fila': self.fila.qsize(),
+            'aguardando_envio': len(self._reprocessar),
+            'ativo': bool(self._thread and self._thread.is_alive())
+        }
+
+    def _get_db(self):
+        if self._db is None:
+            from core.database import get_database
+            self._db = get_database()
+        return self._db
+
+    def _coletar_lote(self) -> Tuple[List[Tuple[str, str, datetime]], Dict[str, float]]:
+        lote = []
+        limite = time.monotonic() + self.flush_s
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+
+        agora = time.monotonic()
+        prontos = [(e, t) for e, t in self._reprocessar if agora - t < JANELA_REPROCESSAMENTO_S]
+        self.metricas['descartados'] += len(self._reprocessar) - len(prontos)
+        self._reprocessar = []
+        return lote + [e for e, _ in prontos], {e[0]: t for e, t in prontos}
+
+    @staticmethod
+    def _consolidar(eventos: List[Tuple[str, str, datetime]]) -> List[Tuple[str, str, datetime]]:
+        """Mantém apenas o status mais avançado por message_id"""
+        por_id: Dict[str, Tuple[str, str, datetime]] = {}
+        for evento in eventos:
+            atual = por_id.get(evento[0])
+            if atual is None or ORDEM_STATUS[evento[1]] >= ORDEM_STATUS[atual[1]]:
+                por_id[evento[0]] = evento
+        return list(por_id.values())
+
+    def _loop(self):
+        while not (self._parar.is_set() and self.fila.empty()):
+            eventos, primeiras_tentativas = self._coletar_lote()
+            if not eventos:
+                continue
+
+            consolidados = self._consolidar(eventos)
+            try:
+                encontrados = self._get_db().aplicar_status_entrega(consolidados)
+            except Exception as e:
+                logger.error(f"Erro ao aplicar status de entrega: {e}")
+                self.metricas['falhas'] += 1
+                encontrados = set()
+
+            self.metricas['lotes'] += 1
+            self.metricas['aplicados'] += len(encontrados)
+
+            agora = time.monotonic()
+            for evento in consolidados:
+                if evento[0] not in encontrados:
+                    self._reprocessar.append((evento, primeiras_tentativas.get(evento[0], agora)))
+
+            if self._reprocessar and self.fila.empty():
+                # Evita laço apertado enquanto só restam eventos aguardando o registro do envio
+                self._parar.wait(self.flush_s)
+
+
+processador_status = ProcessadorStatusEntrega()
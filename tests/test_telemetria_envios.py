@@ -0,0 +1,77 @@
+"""
+Telemetria de envios em intervalo sem envios com latência (ex.: logo após o deploy)
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.database import DatabaseManager
+
+
+class _CursorFalso:
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.linhas
+
+
+class _ConexaoFalsa:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def _db_com_linhas(linhas):
+    db = DatabaseManager.__new__(DatabaseManager)
+    cursor = _CursorFalso(linhas)
+
+    @contextmanager
+    def get_connection(somente_leitura=False):
+        yield _ConexaoFalsa(cursor)
+
+    db.get_connection = get_connection
+    return db
+
+
+def test_janela_vazia_devolve_geral_sem_metricas():
+    # Linha geral do GROUPING SETS sem nenhum envio: COUNT(*) = 0 e agregados NULL
+    db = _db_com_linhas([(None, True, 0, 0, None, None, None, 0, 0, None)])
+
+    resultado = db.telemetria_envios('template', datetime(2026, 10, 1), datetime(2026, 10, 8))
+
+    assert resultado['grupos'] == []
+    assert resultado['geral'] == {
+        'envios': 0,
+        'erros': 0,
+        'taxa_erro': None,
+        'latencia_p50_ms': None,
+        'latencia_p95_ms': None,
+        'latencia_p99_ms': None,
+        'latencia_max_ms': None,
+        'http_429': 0,
+        'http_5xx': 0,
+        'participacao': None
+    }
+
+
+def test_janela_com_envios():
+    db = _db_com_linhas([
+        (None, True, 4, 1, 25.0, [120.0, 480.4, 499.9], 500, 1, 0, 100.0),
+        ('cobranca', False, 4, 1, 25.0, [120.0, 480.4, 499.9], 500, 1, 0, 100.0),
+    ])
+
+    resultado = db.telemetria_envios('template', datetime(2026, 10, 1), datetime(2026, 10, 8))
+
+    assert resultado['geral']['latencia_p95_ms'] == 480
+    assert resultado['grupos'][0]['grupo'] == 'cobranca'
+    assert resultado['grupos'][0]['taxa_erro'] == 25.0